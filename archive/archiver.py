@@ -0,0 +1,142 @@
+"""
+Move soft-deleted rows out of the hot tables into ArchivedRecord.
+
+Each model is processed in primary-key order in small transactions: copy a
+batch into the archive, then delete it from its table. A run can be stopped
+at any point and simply started again; rows already moved are gone from the
+source and the archive ignores duplicates. The batch size adapts so a single
+transaction stays around target_seconds, keeping locks short on a live
+database.
+"""
+import time
+from datetime import timedelta
+
+from django.core import serializers
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from expenses.models import Expenses, Category, PaymentMethod
+from groups.models import GroupExpense, ExpenseSplit, ExpensePayment, ExpenseRowHistory
+from .models import ArchivedRecord
+
+
+class ArchiveSpec:
+    def __init__(self, model, condition, owner=None, group=None, related=(), flag_deleted=False):
+        self.model = model
+        self.condition = condition          # cutoff -> Q
+        self.owner = owner                  # attribute path to the owning user id
+        self.group = group                  # attribute path to the group id
+        self.related = related
+        # Rows with ledger signal handlers are flagged deleted before removal
+        # so the handlers know there is no live balance to take back.
+        self.flag_deleted = flag_deleted
+
+    @property
+    def label(self):
+        return self.model._meta.label_lower
+
+
+def _ledger_row_condition(cutoff):
+    return Q(deleted=True, deleted_at__lt=cutoff) | Q(expense__deleted=True, expense__deleted_at__lt=cutoff)
+
+
+def _no_expense_uses(field):
+    return ~Exists(Expenses._base_manager.filter(**{field: OuterRef('pk')}))
+
+
+# Children before parents, so nothing is ever lost to a cascade.
+# Retention counts from deleted_at (see project/softdelete.py); Category and
+# PaymentMethod also wait until no expense refers to them.
+SPECS = [
+    ArchiveSpec(ExpenseRowHistory, lambda cutoff: Q(expense__deleted=True, expense__deleted_at__lt=cutoff),
+                owner='user_id', group='expense.group_id', related=('expense',)),
+    ArchiveSpec(ExpenseSplit, _ledger_row_condition,
+                owner='user_id', group='expense.group_id', related=('expense',), flag_deleted=True),
+    ArchiveSpec(ExpensePayment, _ledger_row_condition,
+                owner='user_id', group='expense.group_id', related=('expense',), flag_deleted=True),
+    ArchiveSpec(GroupExpense, lambda cutoff: Q(deleted=True, deleted_at__lt=cutoff)
+                & ~Exists(ExpenseSplit._base_manager.filter(expense=OuterRef('pk')))
+                & ~Exists(ExpensePayment._base_manager.filter(expense=OuterRef('pk')))
+                & ~Exists(ExpenseRowHistory._base_manager.filter(expense=OuterRef('pk'))),
+                owner='paid_by_id', group='group_id'),
+    ArchiveSpec(Expenses, lambda cutoff: Q(deleted=True, deleted_at__lt=cutoff), owner='user_id'),
+    ArchiveSpec(Category, lambda cutoff: Q(deleted=True, deleted_at__lt=cutoff) & _no_expense_uses('category'),
+                owner='user_id'),
+    ArchiveSpec(PaymentMethod, lambda cutoff: Q(deleted=True, deleted_at__lt=cutoff) & _no_expense_uses('payment_method'),
+                owner='user_id'),
+]
+
+
+def _resolve(obj, path):
+    if path is None:
+        return None
+    for attr in path.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _archive_batch(spec, ids):
+    manager = spec.model._base_manager
+    with transaction.atomic():
+        rows = list(manager.filter(pk__in=ids).select_related(*spec.related))
+        payloads = serializers.serialize('python', rows)
+        ArchivedRecord.objects.bulk_create([
+            ArchivedRecord(
+                model=spec.label,
+                original_id=row.pk,
+                owner_id=_resolve(row, spec.owner),
+                group_id=_resolve(row, spec.group),
+                data=payload['fields'],
+            )
+            for row, payload in zip(rows, payloads)
+        ], ignore_conflicts=True)
+        batch = manager.filter(pk__in=ids)
+        if spec.flag_deleted:
+            batch.update(deleted=True)
+        batch.delete()
+    return len(rows)
+
+
+def archive_model(spec, cutoff, batch_size=500, max_batch_size=5000, target_seconds=0.5,
+                  pause=0.0, dry_run=False, log=None):
+    """Archive every row of one spec older than cutoff. Returns the number of rows moved."""
+    manager = spec.model._base_manager
+    candidates = manager.filter(spec.condition(cutoff)).order_by('pk')
+    min_batch_size = max(1, batch_size // 10)
+    last_pk = 0
+    total = 0
+    while True:
+        ids = list(candidates.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        last_pk = ids[-1]
+        if dry_run:
+            total += len(ids)
+            continue
+
+        start = time.monotonic()
+        total += _archive_batch(spec, ids)
+        elapsed = time.monotonic() - start
+        if log:
+            log(f"{spec.label}: moved {len(ids)} rows up to id {last_pk} in {elapsed:.2f}s")
+
+        # Throttle: halve the batch when a transaction runs long, grow it back when cheap
+        if elapsed > target_seconds:
+            batch_size = max(min_batch_size, batch_size // 2)
+        elif elapsed < target_seconds / 2:
+            batch_size = min(max_batch_size, batch_size * 2)
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+def archive_deleted_rows(days, labels=None, **options):
+    """Run every spec (or the ones in labels). Returns {label: rows}."""
+    cutoff = timezone.now() - timedelta(days=days)
+    results = {}
+    for spec in SPECS:
+        if labels and spec.label not in labels:
+            continue
+        results[spec.label] = archive_model(spec, cutoff, **options)
+    return results
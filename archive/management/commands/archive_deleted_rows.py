@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from archive.archiver import SPECS, archive_deleted_rows
+
+
+class Command(BaseCommand):
+    help = "Move soft-deleted rows older than the retention window into the archive table, in throttled batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365,
+                            help="Retention window: only rows older than this are archived (default 365).")
+        parser.add_argument('--model', action='append', dest='labels',
+                            help="Only archive this model, e.g. groups.expensesplit (can be repeated).")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--max-batch-size', type=int, default=5000)
+        parser.add_argument('--target-seconds', type=float, default=0.5,
+                            help="Shrink the batch when one transaction takes longer than this.")
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help="Seconds to sleep between batches.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only count the rows that would be archived. Expenses are only counted "
+                                 "once their splits and payments have actually been archived.")
+
+    def handle(self, *args, **options):
+        known = {spec.label for spec in SPECS}
+        unknown = set(options['labels'] or []) - known
+        if unknown:
+            raise CommandError(f"Unknown model(s): {', '.join(sorted(unknown))}. Choose from: {', '.join(sorted(known))}")
+
+        results = archive_deleted_rows(
+            options['days'],
+            labels=options['labels'],
+            batch_size=options['batch_size'],
+            max_batch_size=options['max_batch_size'],
+            target_seconds=options['target_seconds'],
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+
+        verb = "Would archive" if options['dry_run'] else "Archived"
+        for label, count in results.items():
+            self.stdout.write(f"{verb} {count} {label} row(s).")
+        self.stdout.write(self.style.SUCCESS(f"{verb} {sum(results.values())} row(s) in total."))
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:15
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('original_id', models.BigIntegerField()),
+                ('owner_id', models.BigIntegerField(blank=True, null=True)),
+                ('group_id', models.BigIntegerField(blank=True, null=True)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model', 'group_id'], name='archive_model_group_idx'), models.Index(fields=['model', 'owner_id'], name='archive_model_owner_idx')],
+                'constraints': [models.UniqueConstraint(fields=('model', 'original_id'), name='unique_archived_record')],
+            },
+        ),
+    ]
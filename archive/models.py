@@ -0,0 +1,24 @@
+from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+
+class ArchivedRecord(models.Model):
+    # A soft-deleted row moved out of its hot table by `manage.py archive_deleted_rows`.
+    # owner_id/group_id are copied out of the payload so audit screens can filter on them.
+    model = models.CharField(max_length=100)  # e.g. 'groups.groupexpense'
+    original_id = models.BigIntegerField()
+    owner_id = models.BigIntegerField(null=True, blank=True)
+    group_id = models.BigIntegerField(null=True, blank=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'original_id'], name='unique_archived_record'),
+        ]
+        indexes = [
+            models.Index(fields=['model', 'group_id'], name='archive_model_group_idx'),
+            models.Index(fields=['model', 'owner_id'], name='archive_model_owner_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} #{self.original_id}"
@@ -0,0 +1,19 @@
+"""
+Read access to archived rows for audit screens.
+
+Archived rows come back as plain dicts (the model fields plus 'id') because
+their foreign keys may point at rows that have been archived too.
+"""
+from .models import ArchivedRecord
+
+
+def archived_rows(model, group_id=None, owner_id=None):
+    records = ArchivedRecord.objects.filter(model=model._meta.label_lower)
+    if group_id is not None:
+        records = records.filter(group_id=group_id)
+    if owner_id is not None:
+        records = records.filter(owner_id=owner_id)
+    return [
+        dict(record.data, id=record.original_id, archived_at=record.archived_at)
+        for record in records.order_by('-original_id')
+    ]
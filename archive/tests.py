@@ -0,0 +1,117 @@
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from expenses.models import Expenses, Category
+from groups.models import groups, GroupExpense, ExpenseSplit, ExpensePayment, GroupBalance
+from .models import ArchivedRecord
+from .reader import archived_rows
+
+class ArchiveDeletedRowsTests(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='user1', password='password')
+        self.user2 = User.objects.create_user(username='user2', password='password')
+        self.group = groups.objects.create(name="Archive Group")
+        self.group.users.add(self.user1, self.user2)
+        self.old = timezone.now() - timedelta(days=400)
+
+        self.live = self.make_expense('Live', deleted=False)
+        self.old_deleted = self.make_expense('Old deleted', deleted=True)
+        self.recent_deleted = self.make_expense('Recent deleted', deleted=True, old=False)
+        # Leftover soft-deleted split on a live, old expense
+        ExpenseSplit.objects.create(expense=self.live, user=self.user1, amount_owed=Decimal('9.00'), deleted=True)
+        ExpenseSplit.all_objects.filter(deleted=True).update(deleted_at=self.old)
+
+        self.category = Category.objects.create(user=self.user1, name='Gone', deleted=True)
+        self.used_category = Category.objects.create(user=self.user1, name='Still used', deleted=True)
+        Category.all_objects.update(deleted_at=self.old)
+        Expenses.objects.create(user=self.user1, item='Kept', price=5, category=self.used_category)
+        self.old_personal = Expenses.objects.create(user=self.user1, item='Old', price=5, deleted=True)
+        Expenses.all_objects.filter(pk=self.old_personal.pk).update(deleted_at=self.old)
+
+    def make_expense(self, description, deleted, old=True):
+        expense = GroupExpense.objects.create(group=self.group, description=description, amount=Decimal('100.00'), paid_by=self.user1)
+        ExpensePayment.objects.create(expense=expense, user=self.user1, amount=Decimal('100.00'))
+        ExpenseSplit.objects.create(expense=expense, user=self.user1, amount_owed=Decimal('50.00'))
+        ExpenseSplit.objects.create(expense=expense, user=self.user2, amount_owed=Decimal('50.00'))
+        if deleted:
+            expense.deleted = True
+            expense.save()
+        if old:
+            GroupExpense.all_objects.filter(pk=expense.pk).update(created_at=self.old)
+            if deleted:
+                GroupExpense.all_objects.filter(pk=expense.pk).update(deleted_at=self.old)
+        return expense
+
+    def test_moves_only_old_soft_deleted_rows(self):
+        balances_before = list(GroupBalance.objects.values_list('user', 'amount').order_by('user'))
+        call_command('archive_deleted_rows', '--days', '365', '--batch-size', '1', stdout=StringIO())
+
+        self.assertFalse(GroupExpense.all_objects.filter(pk=self.old_deleted.pk).exists())
+        self.assertFalse(ExpenseSplit.all_objects.filter(expense_id=self.old_deleted.pk).exists())
+        self.assertTrue(GroupExpense.all_objects.filter(pk=self.recent_deleted.pk).exists())
+        self.assertEqual(ExpenseSplit.objects.filter(expense=self.live).count(), 2)
+        self.assertFalse(ExpenseSplit.all_objects.filter(deleted=True).exists())
+
+        self.assertFalse(Category.all_objects.filter(pk=self.category.pk).exists())
+        self.assertTrue(Category.all_objects.filter(pk=self.used_category.pk).exists())
+        self.assertFalse(Expenses.all_objects.filter(pk=self.old_personal.pk).exists())
+
+        archived = archived_rows(GroupExpense, group_id=self.group.id)
+        self.assertEqual([row['description'] for row in archived], ['Old deleted'])
+        self.assertTrue(archived[0]['deleted'])
+        self.assertEqual(
+            list(GroupBalance.objects.values_list('user', 'amount').order_by('user')), balances_before
+        )
+
+    def test_retention_counts_from_deletion(self):
+        # Created long ago but deleted just now: kept, along with its rows
+        old_expense = self.make_expense('Old, deleted today', deleted=False)
+        old_expense.deleted = True
+        old_expense.save()
+        old_personal = Expenses.objects.create(user=self.user1, item='Old, deleted today', price=5)
+        Expenses.all_objects.filter(pk=old_personal.pk).update(created_at=self.old, updated_at=self.old)
+        client = Client()
+        client.login(username='user1', password='password')
+        client.post(reverse('expense_delete', args=[old_personal.pk]))
+        old_personal.refresh_from_db()
+        self.assertTrue(old_personal.deleted)
+        self.assertIsNotNone(old_personal.deleted_at)
+        self.assertEqual(old_personal.updated_at, self.old)
+
+        call_command('archive_deleted_rows', '--days', '365', stdout=StringIO())
+        self.assertTrue(GroupExpense.all_objects.filter(pk=old_expense.pk).exists())
+        self.assertEqual(ExpenseSplit.all_objects.filter(expense=old_expense).count(), 2)
+        self.assertTrue(Expenses.all_objects.filter(pk=old_personal.pk).exists())
+
+        # Restoring clears the stamp
+        old_expense.deleted = False
+        old_expense.save()
+        self.assertIsNone(old_expense.deleted_at)
+
+    def test_rerun_is_idempotent(self):
+        call_command('archive_deleted_rows', stdout=StringIO())
+        count = ArchivedRecord.objects.count()
+        out = StringIO()
+        call_command('archive_deleted_rows', stdout=out)
+        self.assertEqual(ArchivedRecord.objects.count(), count)
+        self.assertIn('Archived 0 row(s) in total.', out.getvalue())
+
+    def test_dry_run_counts_without_moving(self):
+        out = StringIO()
+        call_command('archive_deleted_rows', '--dry-run', stdout=out)
+        # Two splits and the payment of the deleted expense, plus the leftover split
+        self.assertIn('Would archive 3 groups.expensesplit row(s).', out.getvalue())
+        self.assertFalse(ArchivedRecord.objects.exists())
+
+    def test_audit_view_reads_archive(self):
+        call_command('archive_deleted_rows', stdout=StringIO())
+        client = Client()
+        client.login(username='user1', password='password')
+        response = client.get(reverse('group_audit', args=[self.group.id]))
+        self.assertContains(response, 'Old deleted')
+        self.assertContains(response, 'Recent deleted')
@@ -0,0 +1,10 @@
+"""
+Benchmarks for the group ledger hot paths.
+
+Run against a throwaway SQLite database:
+
+    python -m benchmarks.run --scales small medium --output bench_results.json
+
+See benchmarks/datagen.py for the synthetic data and benchmarks/run.py for
+what is measured.
+"""
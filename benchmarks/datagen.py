@@ -0,0 +1,82 @@
+"""
+Synthetic group ledger data for benchmarks.
+
+generate() builds N groups of M members with K expenses each, spread over
+several currencies, with a share of soft-deleted expenses, payments and
+splits. Everything is written with bulk_create, so the materialized balances
+are rebuilt once at the end.
+"""
+import random
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from groups.models import groups, GroupExpense, ExpenseSplit, ExpensePayment
+from groups import ledger
+
+CURRENCIES = ['USD', 'EUR', 'INR', 'GBP']
+
+
+@transaction.atomic
+def generate(n_groups, members, expenses, currencies=3, deleted_ratio=0.1, seed=0):
+    """
+    Returns {'users': [User], 'groups': [groups]}. The first user is a
+    member of every group and is the one the benchmarks log in as.
+    """
+    rng = random.Random(seed)
+    currencies = CURRENCIES[:currencies]
+
+    users = User.objects.bulk_create([
+        User(username=f'bench{i}', password='!') for i in range(max(members, 2) * n_groups)
+    ])
+    owner = users[0]
+
+    group_list = groups.objects.bulk_create([groups(name=f'Bench group {g}') for g in range(n_groups)])
+    memberships = []
+    group_members = {}
+    for g, group in enumerate(group_list):
+        chosen = [owner] + users[1 + g * (members - 1):1 + (g + 1) * (members - 1)]
+        group_members[group.id] = chosen
+        memberships.extend(groups.users.through(groups_id=group.id, user_id=u.id) for u in chosen)
+    groups.users.through.objects.bulk_create(memberships)
+
+    now = timezone.now()
+    expense_rows = []
+    for group in group_list:
+        for _ in range(expenses):
+            expense = GroupExpense(
+                group=group,
+                description='Bench expense',
+                amount=Decimal(rng.randint(100, 100000)).scaleb(-2),
+                currency=rng.choice(currencies),
+                paid_by=rng.choice(group_members[group.id]),
+                deleted=rng.random() < deleted_ratio,
+            )
+            # bulk_create skips SoftDeleteModel.save(), which would stamp this
+            expense.deleted_at = now if expense.deleted else None
+            expense_rows.append(expense)
+    expense_rows = GroupExpense.objects.bulk_create(expense_rows, batch_size=1000)
+
+    payments = []
+    splits = []
+    for expense in expense_rows:
+        chosen = group_members[expense.group_id]
+        payments.append(ExpensePayment(expense=expense, user=expense.paid_by, amount=expense.amount))
+        share = (expense.amount / len(chosen)).quantize(ledger.CENT)
+        for member in chosen:
+            splits.append(ExpenseSplit(expense=expense, user=member, amount_owed=share))
+        # Soft-deleted leftovers from earlier edits
+        if rng.random() < deleted_ratio:
+            payments.append(ExpensePayment(expense=expense, user=expense.paid_by, amount=expense.amount,
+                                           deleted=True, deleted_at=now))
+            splits.extend(
+                ExpenseSplit(expense=expense, user=member, amount_owed=share, deleted=True, deleted_at=now)
+                for member in chosen
+            )
+    ExpensePayment.objects.bulk_create(payments, batch_size=2000)
+    ExpenseSplit.objects.bulk_create(splits, batch_size=2000)
+
+    ledger.rebuild()
+    return {'users': users, 'groups': group_list}
@@ -0,0 +1,72 @@
+"""
+Measure the throughput of the personal expense CSV import.
+
+Generates a CSV of --rows expenses (a few categories and payment methods,
+created on the fly by the import) in a fresh benchmark database and reports
+rows per second for each --batch-size. With --min-rate the run exits with
+status 1 when any batch size is slower, for use as a CI performance check.
+
+    python -m benchmarks.imports --rows 40000 --batch-size 2000 5000 --min-rate 20000
+"""
+import argparse
+import io
+import json
+import statistics
+import sys
+import time
+
+from benchmarks.run import reset_database, setup_django
+
+
+def make_csv(rows):
+    return "date,item,price,category,payment_method\n" + "".join(
+        f"2025-01-{i % 28 + 1:02d},Item {i},{i % 500}.25,Cat {i % 20},Method {i % 3}\n" for i in range(rows)
+    )
+
+
+def bench(rows, batch_size, repeat):
+    from django.contrib.auth.models import User
+    from expenses import importer
+
+    text = make_csv(rows)
+    times = []
+    for run in range(repeat):
+        reset_database()
+        user = User.objects.create(username=f'bench{run}')
+        start = time.perf_counter()
+        result = importer.import_expenses(user, io.StringIO(text), batch_size=batch_size)
+        times.append(time.perf_counter() - start)
+        if result.created != rows:
+            raise RuntimeError(f"Imported {result.created} of {rows} rows: {result.errors[:5]}")
+    median = statistics.median(times)
+    return {'median_ms': round(median * 1000, 3), 'rows_per_second': round(rows / median)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=40000)
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[2000, 5000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--min-rate', type=float, help="Fail when fewer rows per second are imported.")
+    parser.add_argument('--output', help="Write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    results = {}
+    for batch_size in args.batch_size:
+        results[batch_size] = stats = bench(args.rows, batch_size, args.repeat)
+        print(f"batch {batch_size:6} {stats['median_ms']:10.2f} ms {stats['rows_per_second']:10} rows/s")
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump({'rows': args.rows, 'batches': results}, fh, indent=2)
+        print(f"Results written to {args.output}")
+    slow = [size for size, stats in results.items() if args.min_rate and stats['rows_per_second'] < args.min_rate]
+    if slow:
+        print(f"Below {args.min_rate:.0f} rows/s with batch size(s) {', '.join(map(str, slow))}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
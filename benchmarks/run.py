@@ -0,0 +1,198 @@
+"""
+Measure the group ledger views at several data scales.
+
+For every scale the database is recreated, filled by benchmarks.datagen and
+each view is requested a few times through the test client. We report the
+median wall time, the number of SQL queries and the peak Python memory
+(tracemalloc) per view, and write everything to a JSON file so runs can be
+compared between releases.
+
+    python -m benchmarks.run --scales small medium --repeat 5 --output bench_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+SCALES = {
+    # name: (groups, members per group, expenses per group)
+    'small': (5, 5, 50),
+    'medium': (20, 15, 300),
+    'large': (50, 30, 1000),
+}
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    django.setup()
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+
+
+def reset_database():
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+
+    connection.close()
+    name = settings.DATABASES['default']['NAME']
+    if os.path.exists(name):
+        os.remove(name)
+    call_command('migrate', verbosity=0, interactive=False)
+
+
+def measure(client, method, url, data=None, trace_memory=False):
+    """Run one request, returning (seconds, queries, peak_bytes, status)."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    # tracemalloc slows everything down, so memory is sampled on separate runs
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with CaptureQueriesContext(connection) as ctx:
+        response = getattr(client, method)(url, data or {})
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, len(ctx.captured_queries), peak, response.status_code
+
+
+def summarize(samples, memory_sample):
+    times = [s[0] for s in samples]
+    return {
+        'median_ms': round(statistics.median(times) * 1000, 3),
+        'min_ms': round(min(times) * 1000, 3),
+        'max_ms': round(max(times) * 1000, 3),
+        'queries': max(s[1] for s in samples),
+        'peak_memory_kb': round(memory_sample[2] / 1024, 1),
+        'status': samples[-1][3],
+    }
+
+
+def run_view(client, method, url, repeat, data=None):
+    samples = [measure(client, method, url, data) for _ in range(repeat)]
+    return summarize(samples, measure(client, method, url, data, trace_memory=True))
+
+
+def debt_for(user, group):
+    """A (creditor, currency) the user currently owes in the group, if any."""
+    from groups import balances
+    from groups.simplify import simplify_debts
+
+    for currency, net_balances in balances.group_balances(group).items():
+        for debt in simplify_debts(net_balances):
+            if debt['debtor'] == user:
+                return debt['creditor'], currency
+    return None
+
+
+def bench_scale(name, repeat):
+    from django.test import Client
+    from django.urls import reverse
+    from benchmarks.datagen import generate
+
+    n_groups, members, expenses = SCALES[name]
+    reset_database()
+    start = time.perf_counter()
+    data = generate(n_groups, members, expenses)
+    setup_seconds = time.perf_counter() - start
+
+    group = data['groups'][0]
+    group_members = list(group.users.all())
+    results = {}
+
+    owner = Client()
+    owner.force_login(data['users'][0])
+
+    results['group_list'] = run_view(owner, 'get', reverse('groups'), repeat)
+    results['group_detail'] = run_view(owner, 'get', reverse('group_detail', args=[group.id]), repeat)
+
+    expense_data = {
+        'description': 'Bench add', 'amount': '90.00', 'currency': 'USD',
+        'paid_by': group_members[0].id, 'split_type': 'EQUAL', 'payment_type': 'SINGLE',
+    }
+    results['add_group_expense'] = run_view(
+        owner, 'post', reverse('add_group_expense', args=[group.id]), repeat, expense_data
+    )
+
+    # Every settle_up clears the debt it pays, so look up a fresh one each time
+    samples = []
+    for run in range(repeat + 1):
+        debtor = next((m for m in group_members if debt_for(m, group)), None)
+        if debtor is None:
+            break
+        client = Client()
+        client.force_login(debtor)
+        creditor, currency = debt_for(debtor, group)
+        url = reverse('settle_up', args=[group.id, creditor.id, currency])
+        samples.append(measure(client, 'get', url, trace_memory=(run == repeat)))
+    if len(samples) > 1:
+        results['settle_up'] = summarize(samples[:-1], samples[-1])
+
+    return {
+        'groups': n_groups,
+        'members': members,
+        'expenses_per_group': expenses,
+        'setup_seconds': round(setup_seconds, 2),
+        'views': results,
+    }
+
+
+def compare(report, path):
+    with open(path) as fh:
+        previous = json.load(fh)
+    print(f"Compared with {path} ({previous.get('started_at', '?')}):")
+    for name, scale in report['scales'].items():
+        before = previous.get('scales', {}).get(name, {}).get('views', {})
+        for view, stats in scale['views'].items():
+            if view not in before:
+                continue
+            old = before[view]
+            change = (stats['median_ms'] - old['median_ms']) / old['median_ms'] * 100 if old['median_ms'] else 0
+            print(f"{name:8} {view:18} {change:+8.1f}% time {stats['queries'] - old['queries']:+6} queries")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', nargs='+', choices=sorted(SCALES), default=['small', 'medium'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', metavar='JSON', help="Earlier results file to compare against.")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    import django
+
+    report = {
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'repeat': args.repeat,
+        'scales': {},
+    }
+    for name in args.scales:
+        report['scales'][name] = bench_scale(name, args.repeat)
+        for view, stats in report['scales'][name]['views'].items():
+            print(f"{name:8} {view:18} {stats['median_ms']:10.2f} ms {stats['queries']:6} queries "
+                  f"{stats['peak_memory_kb']:10.1f} KiB")
+
+    if args.compare:
+        compare(report, args.compare)
+
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,17 @@
+import os
+import tempfile
+
+from project.settings import *  # noqa: F401,F403
+
+# Benchmarks always run on a local SQLite file, never on the configured MySQL
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('BENCH_DB', os.path.join(tempfile.gettempdir(), 'payment_tracker_bench.sqlite3')),
+    }
+}
+
+DEBUG = False
+
+# Creating thousands of users with the default hasher would dominate setup time
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
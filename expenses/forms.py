@@ -49,8 +49,8 @@ class ExpenseForm(forms.ModelForm):
         user = kwargs.pop("user", None)
         super().__init__(*args, **kwargs)
         if user:
-            self.fields['category'].queryset = Category.objects.filter(user=user, deleted=0)
-            self.fields['payment_method'].queryset = PaymentMethod.objects.filter(user=user, deleted=0)
+            self.fields['category'].queryset = Category.objects.filter(user=user)
+            self.fields['payment_method'].queryset = PaymentMethod.objects.filter(user=user)
 
         if 'created_at' in self.fields:
             self.fields['created_at'].label = 'Expense Date' 
@@ -94,3 +94,8 @@ class SpendingForm(forms.Form):
 
     selected_category = forms.ModelChoiceField(queryset=None, widget=forms.Select(attrs={'class': 'form-control'}))
     selected_payment_method = forms.ModelChoiceField(queryset=None, widget=forms.Select(attrs={'class': 'form-control'}))
+
+
+class ExpenseImportForm(forms.Form):
+    file = forms.FileField(label="CSV file", help_text="Columns: date, item, price, category, payment_method (item and price are required).",
+                           widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'}))
@@ -0,0 +1,232 @@
+"""
+Bulk import of personal expenses from CSV.
+
+The file is read row by row (never loaded whole), columns are matched by
+header name, category and payment method names are resolved through a
+per-import dict (creating the missing ones once), and valid rows are
+inserted in batches of EXPENSE_IMPORT_BATCH_SIZE, all in one transaction.
+Rows that don't validate, or that the csv module can't read (a field over
+csv.field_size_limit(), say), are skipped and reported with their line
+number.
+The columns written by the export (date,item,price,category,payment_method)
+import as-is.
+"""
+import csv
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Category, Expenses, PaymentMethod
+from . import rollups
+
+# Accepted header names (lower case) for each field
+COLUMNS = {
+    'created_at': ('date', 'created_at', 'expense date'),
+    'item': ('item', 'description'),
+    'price': ('price', 'amount'),
+    'category': ('category',),
+    'payment_method': ('payment_method', 'payment method'),
+}
+REQUIRED = ('item', 'price')
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y')
+MAX_PRICE = Decimal('10') ** 7  # Expenses.price is max_digits=10, decimal_places=3
+PRICE_PLACES = Decimal('0.001')
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.skipped = 0
+        self.errors = []  # [(line number, message)], the first max_errors of them
+
+
+def _columns(header):
+    names = [name.strip().lower() for name in header]
+    found = {}
+    for field, aliases in COLUMNS.items():
+        for index, name in enumerate(names):
+            if name in aliases:
+                found[field] = index
+                break
+    return found
+
+
+class _Dates:
+    """
+    Parse expense dates, remembering each distinct value: an import has far
+    fewer distinct dates than rows. Gives (db value, local day).
+    """
+
+    def __init__(self):
+        self.field = Expenses._meta.get_field('created_at')
+        self.parsed = {}
+
+    def get(self, value):
+        value = value.strip()
+        if value not in self.parsed:
+            moment = self._parse(value)
+            self.parsed[value] = (self.field.get_db_prep_save(moment, connection), timezone.localdate(moment))
+        return self.parsed[value]
+
+    def _parse(self, value):
+        if not value:
+            return timezone.now()
+        parsed = parse_datetime(value)
+        if parsed is None:
+            for fmt in DATE_FORMATS:
+                try:
+                    parsed = datetime.strptime(value, fmt)
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise ValueError(f"Unrecognised date '{value}'.")
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+
+def _parse_price(value):
+    try:
+        price = Decimal(value.strip()).quantize(PRICE_PLACES)
+    except InvalidOperation:
+        price = None
+    if price is None or not price.is_finite():
+        raise ValueError(f"Price '{value}' is not a number.")
+    if price < 0 or price >= MAX_PRICE:
+        raise ValueError(f"Price '{value}' is out of range.")
+    return price
+
+
+class _Lookup:
+    """name -> id for one user's categories or payment methods, creating missing names on first use."""
+
+    def __init__(self, model, user):
+        self.model = model
+        self.user = user
+        self.max_length = model._meta.get_field('name').max_length
+        self.ids = {}
+        for pk, name in model.objects.filter(user=user).order_by('-pk').values_list('pk', 'name'):
+            self.ids[name] = pk  # Oldest wins if a name is duplicated
+
+    def get(self, name):
+        name = name.strip()
+        if not name:
+            return None
+        if name not in self.ids:
+            if len(name) > self.max_length:
+                raise ValueError(
+                    f"{self.model._meta.verbose_name.capitalize()} is longer than {self.max_length} characters."
+                )
+            self.ids[name] = self.model.objects.create(user=self.user, name=name).pk
+        return self.ids[name]
+
+
+def _records(reader):
+    """(row, None) per CSV record, or (None, csv.Error) for one that can't be read; reading goes on after it."""
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as error:
+            yield None, error
+        else:
+            yield row, None
+
+
+INSERT_FIELDS = ('user', 'created_at', 'updated_at', 'item', 'price', 'category', 'payment_method', 'deleted')
+
+
+def _insert(rows):
+    """
+    Insert prepared rows (values in INSERT_FIELDS order) with one executemany.
+    bulk_create would spend most of an import preparing the same few
+    values field by field; these are prepared once up front instead.
+    """
+    qn = connection.ops.quote_name
+    columns = [Expenses._meta.get_field(name).column for name in INSERT_FIELDS]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        qn(Expenses._meta.db_table), ', '.join(qn(column) for column in columns), ', '.join(['%s'] * len(columns))
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def import_expenses(user, lines, batch_size=None, max_errors=1000):
+    """
+    Import CSV text lines (any iterable of str, e.g. an open text file) as
+    expenses of user. Returns an ImportResult.
+    """
+    batch_size = batch_size or getattr(settings, 'EXPENSE_IMPORT_BATCH_SIZE', 2000)
+    result = ImportResult()
+    reader = _records(csv.reader(lines))
+    header, error = next(reader, (None, None))
+    if error is not None:
+        result.errors.append((1, f"Unreadable header: {error}."))
+        return result
+    columns = _columns(header or [])
+    missing = [field for field in REQUIRED if field not in columns]
+    if missing:
+        result.errors.append((1, f"Missing column(s): {', '.join(missing)}."))
+        return result
+
+    def cell(row, field):
+        index = columns.get(field)
+        return row[index] if index is not None and index < len(row) else ''
+
+    categories = _Lookup(Category, user)
+    payment_methods = _Lookup(PaymentMethod, user)
+    dates = _Dates()
+    price_field = Expenses._meta.get_field('price')
+    now = Expenses._meta.get_field('updated_at').get_db_prep_save(timezone.now(), connection)
+    batch = []
+    # The import bypasses the signals that keep the spending rollups current, so
+    # it collects the rollup changes and applies them once at the end
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+
+    def flush():
+        _insert(batch)
+        result.created += len(batch)
+        batch.clear()
+
+    with transaction.atomic():
+        for line, (row, error) in enumerate(reader, start=2):
+            if error is None and not any(value.strip() for value in row):
+                continue
+            try:
+                if error is not None:
+                    raise ValueError(f"Unreadable row: {error}.")
+                # Python before 3.11 refuses NUL bytes, and PostgreSQL text can't hold them
+                if any('\x00' in value for value in row):
+                    raise ValueError("Row contains a NUL byte.")
+                item = cell(row, 'item').strip()
+                if not item:
+                    raise ValueError("Item is empty.")
+                if len(item) > 255:
+                    raise ValueError("Item is longer than 255 characters.")
+                price = _parse_price(cell(row, 'price'))
+                created_at, day = dates.get(cell(row, 'created_at'))
+                category_id = categories.get(cell(row, 'category'))
+                payment_method_id = payment_methods.get(cell(row, 'payment_method'))
+            except ValueError as error:
+                result.skipped += 1
+                if len(result.errors) < max_errors:
+                    result.errors.append((line, str(error)))
+                continue
+            batch.append((user.pk, created_at, now, item, price_field.get_db_prep_save(price, connection),
+                          category_id, payment_method_id, False))
+            delta = deltas[(user.pk, day, category_id, payment_method_id)]
+            delta[0] += price
+            delta[1] += 1
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        rollups.apply_deltas(deltas)
+    return result
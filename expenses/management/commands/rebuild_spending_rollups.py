@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from expenses import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily spending rollups from the raw expenses and report any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Only rebuild this user id (can be repeated).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report drift without fixing it.")
+
+    def handle(self, *args, **options):
+        drift = rollups.rebuild(options['user_ids'], dry_run=options['dry_run'])
+
+        for (user_id, day, category_id, payment_method_id), stored, expected in drift:
+            self.stdout.write(
+                f"user={user_id} day={day} category={category_id} payment_method={payment_method_id}: "
+                f"stored {stored[0]} ({stored[1]}), expected {expected[0]} ({expected[1]})"
+            )
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("No drift found."))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} rollup(s) drifted."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} drifted rollup(s)."))
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0011_alter_expenses_created_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['user', 'deleted', 'name'], name='category_user_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expenses',
+            index=models.Index(fields=['user', 'deleted', '-created_at'], name='expenses_user_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expenses',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['user', '-created_at'], name='expenses_live_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentmethod',
+            index=models.Index(fields=['user', 'deleted', 'name'], name='paymethod_user_deleted_idx'),
+        ),
+    ]
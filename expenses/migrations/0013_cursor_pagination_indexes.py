@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0012_live_row_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='expenses',
+            name='expenses_live_user_idx',
+        ),
+        migrations.AddIndex(
+            model_name='expenses',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['user', '-created_at', '-id'], name='expenses_live_user_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_rollups(apps, schema_editor):
+    Expenses = apps.get_model('expenses', 'Expenses')
+    DailySpending = apps.get_model('expenses', 'DailySpending')
+    rows = (
+        Expenses.objects.filter(deleted=False)
+        .annotate(day=TruncDate('created_at'))
+        .values('user', 'day', 'category', 'payment_method')
+        .annotate(total=Sum('price'), count=Count('id'))
+        .order_by()
+    )
+    DailySpending.objects.bulk_create([
+        DailySpending(user_id=row['user'], day=row['day'], category_id=row['category'],
+                      payment_method_id=row['payment_method'], total=row['total'], count=row['count'])
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0013_cursor_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySpending',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total', models.DecimalField(decimal_places=3, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='expenses.category')),
+                ('payment_method', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='expenses.paymentmethod')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_spending', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'day', 'category', 'payment_method'), name='unique_daily_spending')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:19
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def merge_duplicates(apps, schema_editor):
+    # The old constraint let rows without a category or payment method repeat
+    DailySpending = apps.get_model('expenses', 'DailySpending')
+    kept = {}
+    duplicates = []
+    for row in DailySpending.objects.filter(
+        models.Q(category__isnull=True) | models.Q(payment_method__isnull=True)
+    ).order_by('pk'):
+        key = (row.user_id, row.day, row.category_id, row.payment_method_id)
+        if key in kept:
+            DailySpending.objects.filter(pk=kept[key]).update(total=F('total') + row.total, count=F('count') + row.count)
+            duplicates.append(row.pk)
+        else:
+            kept[key] = row.pk
+    DailySpending.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0015_deleted_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='dailyspending',
+            name='unique_daily_spending',
+        ),
+        migrations.AlterField(
+            model_name='dailyspending',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='expenses.category'),
+        ),
+        migrations.AlterField(
+            model_name='dailyspending',
+            name='payment_method',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='expenses.paymentmethod'),
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyspending',
+            constraint=models.UniqueConstraint(models.F('user'), models.F('day'), django.db.models.functions.comparison.Coalesce('category', models.Value(0)), django.db.models.functions.comparison.Coalesce('payment_method', models.Value(0)), name='unique_daily_spending'),
+        ),
+    ]
@@ -1,26 +1,38 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.utils import timezone
+from project.softdelete import SoftDeleteModel
 
 # Create your models here.
 
-class Category(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)  # Each category belongs to a user
+class Category(SoftDeleteModel):
+    # Each category belongs to a user; category_user_deleted_idx starts with user, so the key needs no index of its own
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     name = models.CharField(max_length=255)
-    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted', 'name'], name='category_user_deleted_idx'),
+        ]
     
     def __str__(self):
         return self.name
     
-class PaymentMethod(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)  # Each payment method belongs to a user
+class PaymentMethod(SoftDeleteModel):
+    # Each payment method belongs to a user; paymethod_user_deleted_idx starts with user, so the key needs no index of its own
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     name = models.CharField(max_length=255)
-    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted', 'name'], name='paymethod_user_deleted_idx'),
+        ]
 
     def __str__(self):
         return self.name
     
-class Expenses(models.Model):
+class Expenses(SoftDeleteModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE)  # Each transaction belongs to a user
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now_add=True)
@@ -28,7 +40,44 @@ class Expenses(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=3)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
     payment_method = models.ForeignKey(PaymentMethod, on_delete=models.SET_NULL, null=True, blank=True)
-    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # expense_list / spending: a user's live expenses, newest first or by date range
+            models.Index(fields=['user', 'deleted', '-created_at'], name='expenses_user_deleted_idx'),
+            # Same, for backends with partial indexes (not MySQL): only live rows are indexed
+            models.Index(fields=['user', '-created_at', '-id'], condition=models.Q(deleted=False), name='expenses_live_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item} - {self.price}"
+
+
+class DailySpending(models.Model):
+    # Sum of a user's live expenses per (day, category, payment method), so
+    # spending reports read a few hundred rows instead of every expense.
+    # Maintained by expenses/rollups.py, rebuild with `manage.py rebuild_spending_rollups`.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_spending')
+    day = models.DateField()
+    # Only categories and payment methods no expense refers to are ever removed (see
+    # archive/archiver.py), and their rows are empty; SET_NULL could collide with the
+    # row that already holds the same day's expenses without one.
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    payment_method = models.ForeignKey(PaymentMethod, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    total = models.DecimalField(max_digits=14, decimal_places=3, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # NULLs never conflict in a plain unique constraint (nulls_distinct=False is
+            # PostgreSQL 15+ only), so NULL category / payment method are indexed as 0
+            models.UniqueConstraint(
+                'user', 'day',
+                Coalesce('category', models.Value(0)),
+                Coalesce('payment_method', models.Value(0)),
+                name='unique_daily_spending',
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.item} - {self.price}"
\ No newline at end of file
+        return f"{self.user.username} {self.day}: {self.total}"
@@ -0,0 +1,176 @@
+"""
+Daily spending rollups.
+
+DailySpending stores the total and number of a user's live expenses per
+(day, category, payment method). Single-row saves and deletes are picked
+up by the signal handlers in expenses/signals.py; bulk writes that bypass
+signals must call apply_deltas() themselves.
+
+Days are local dates in settings.TIME_ZONE, the same ones TruncDate gives.
+"""
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailySpending, Expenses
+
+
+def version_key(user_id):
+    return f'spending:version:{user_id}'
+
+
+def data_version(user_id):
+    """Changes whenever the user's rollups do; part of every cached report key."""
+    # Seeded from the clock so an evicted version never reuses an old number
+    return cache.get_or_set(version_key(user_id), time.time_ns(), None)
+
+
+def bump_versions(user_ids):
+    for user_id in set(user_ids):
+        try:
+            cache.incr(version_key(user_id))
+        except ValueError:
+            # Not cached yet: nothing cached under the old version can exist either
+            pass
+
+
+def expense_key(expense):
+    return (expense.user_id, timezone.localdate(expense.created_at), expense.category_id, expense.payment_method_id)
+
+
+def expense_deltas(expenses, sign=1):
+    """{key: [total, count]} contribution of live expenses."""
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for expense in expenses:
+        if not expense.deleted:
+            delta = deltas[expense_key(expense)]
+            delta[0] += sign * Decimal(str(expense.price))
+            delta[1] += sign
+    return deltas
+
+
+def apply_deltas(deltas):
+    """
+    Add {(user_id, day, category_id, payment_method_id): [total, count]} to
+    the rollups with a fixed handful of statements, like groups.ledger.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+    if not deltas:
+        return
+    with transaction.atomic():
+        rows = _rollup_rows(deltas)
+        # Only new expenses create rows; a removal that finds nothing (say during a
+        # user's cascade delete) has nothing left to subtract from.
+        missing = [key for key in deltas if key not in rows and deltas[key][1] > 0]
+        if missing:
+            DailySpending.objects.bulk_create([
+                DailySpending(user_id=user_id, day=day, category_id=category_id, payment_method_id=payment_method_id)
+                for user_id, day, category_id, payment_method_id in missing
+            ], ignore_conflicts=True)
+            rows = _rollup_rows(deltas)
+        for key, row in rows.items():
+            row.total = F('total') + deltas[key][0]
+            row.count = F('count') + deltas[key][1]
+        DailySpending.objects.bulk_update(rows.values(), ['total', 'count'], batch_size=500)
+    bump_versions(key[0] for key in deltas)
+
+
+def _rollup_rows(keys):
+    # NULL category/payment method can't go through __in, so match the keys here
+    candidates = DailySpending.objects.filter(
+        user_id__in={key[0] for key in keys}, day__in={key[1] for key in keys}
+    ).only('id', 'user_id', 'day', 'category_id', 'payment_method_id')
+    rows = {}
+    for row in candidates:
+        key = (row.user_id, row.day, row.category_id, row.payment_method_id)
+        if key in keys:
+            rows[key] = row
+    return rows
+
+
+def compute_rollups(user_ids=None):
+    """Recompute {key: (total, count)} from the raw expenses."""
+    expenses = Expenses.objects.all()
+    if user_ids is not None:
+        expenses = expenses.filter(user__in=user_ids)
+    rows = (
+        expenses.annotate(day=TruncDate('created_at'))
+        .values('user', 'day', 'category', 'payment_method')
+        .annotate(total=Sum('price'), count=Count('id'))
+        .order_by()
+    )
+    return {
+        (row['user'], row['day'], row['category'], row['payment_method']): (Decimal(str(row['total'])), row['count'])
+        for row in rows
+    }
+
+
+def rebuild(user_ids=None, dry_run=False):
+    """
+    Compare the rollups with the raw expenses and fix any drift.
+    Returns a list of (key, stored, expected) with (total, count) pairs.
+    """
+    expected = compute_rollups(user_ids)
+    stored_rows = DailySpending.objects.all()
+    if user_ids is not None:
+        stored_rows = stored_rows.filter(user__in=user_ids)
+    stored = defaultdict(lambda: (Decimal('0'), 0))
+    for row in stored_rows.values('user', 'day', 'category', 'payment_method', 'total', 'count'):
+        key = (row['user'], row['day'], row['category'], row['payment_method'])
+        total, count = stored[key]
+        stored[key] = (total + row['total'], count + row['count'])
+
+    empty = (Decimal('0'), 0)
+    drift = []
+    for key in set(expected) | set(stored):
+        have = stored.get(key, empty)
+        want = expected.get(key, empty)
+        if have != want:
+            drift.append((key, have, want))
+    drift.sort(key=lambda item: tuple(-1 if part is None else part for part in item[0]))
+
+    if not dry_run:
+        with transaction.atomic():
+            # Emptied rows are dropped along with the drifted ones
+            stored_rows.filter(count=0, total=0).delete()
+            for (user_id, day, category_id, payment_method_id), _, (total, count) in drift:
+                DailySpending.objects.filter(
+                    user_id=user_id, day=day, category_id=category_id, payment_method_id=payment_method_id
+                ).delete()
+                if count:
+                    DailySpending.objects.create(
+                        user_id=user_id, day=day, category_id=category_id, payment_method_id=payment_method_id,
+                        total=total, count=count,
+                    )
+        bump_versions(key[0] for key, _, _ in drift)
+    return drift
+
+
+def spending_summary(user, start=None, end=None):
+    """
+    Totals of a user's spending between two dates (inclusive), read from
+    the rollups: {'total', 'by_category', 'by_payment_method'}.
+    """
+    rows = DailySpending.objects.filter(user=user, count__gt=0)
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lte=end)
+    total = Decimal('0')
+    by_category = defaultdict(Decimal)
+    by_payment_method = defaultdict(Decimal)
+    for category, payment_method, amount in (
+        rows.values('category__name', 'payment_method__name')
+        .annotate(amount=Sum('total')).order_by()
+        .values_list('category__name', 'payment_method__name', 'amount')
+    ):
+        total += amount
+        by_category[category] += amount
+        by_payment_method[payment_method] += amount
+    return {'total': total, 'by_category': dict(by_category), 'by_payment_method': dict(by_payment_method)}
@@ -0,0 +1,157 @@
+"""
+Spending over time for charts, bucketed by the database.
+
+Reads the DailySpending rollups, truncates days to weeks, months or years
+in SQL and returns one series per category or payment method (or a single
+total series). Long ranges are downsampled by merging neighbouring buckets
+so a response never has more than max_points points; merged sums keep the
+totals exact. Buckets without spending are included as zeros. Results are
+cached per user under rollups.data_version(), which changes whenever that
+user's expenses, categories or payment methods do.
+"""
+import hashlib
+import math
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth, TruncWeek, TruncYear
+
+from .models import DailySpending
+from . import rollups
+
+BUCKETS = {
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
+GROUP_BY = {
+    'category': 'category__name',
+    'payment_method': 'payment_method__name',
+    'total': None,
+}
+
+def _bucket_start(day, bucket):
+    """The first day of day's bucket, as the database truncates it (weeks start on Monday)."""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+
+def _next_bucket(day, bucket):
+    """The bucket after day's, or None past the last date Python can represent."""
+    try:
+        if bucket == 'week':
+            return day + timedelta(days=7)
+        if bucket == 'month':
+            return day.replace(year=day.year + day.month // 12, month=day.month % 12 + 1)
+        return day.replace(year=day.year + 1)
+    except (ValueError, OverflowError):
+        return None
+
+
+def _bucket_count(first, last, bucket):
+    if bucket == 'week':
+        return (last - first).days // 7 + 1
+    if bucket == 'month':
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    return last.year - first.year + 1
+
+
+def _calendar(first, last, bucket):
+    """
+    Every bucket from first to last, including the ones without spending.
+    Raises ValueError for more than SPENDING_SERIES_MAX_PERIODS buckets.
+    """
+    limit = getattr(settings, 'SPENDING_SERIES_MAX_PERIODS', 10000)
+    if _bucket_count(first, last, bucket) > limit:
+        raise ValueError(f"The date range spans more than {limit} {bucket}s; pick a shorter range or a larger bucket.")
+    periods = []
+    period = first
+    while period is not None and period <= last:
+        periods.append(period)
+        period = _next_bucket(period, bucket)
+    return periods
+
+
+UNSET = {
+    'category': 'Category Not Selected',
+    'payment_method': 'Payment Method Not Selected',
+    'total': 'Total',
+}
+
+
+def spending_series(user, bucket='month', group_by='category', start=None, end=None,
+                    category_id=None, payment_method_id=None, max_points=None):
+    max_points = max_points or getattr(settings, 'SPENDING_SERIES_MAX_POINTS', 120)
+    params = f'{bucket}|{group_by}|{start}|{end}|{category_id}|{payment_method_id}|{max_points}'
+    key = 'spending:series:{}:{}:{}'.format(
+        user.pk, rollups.data_version(user.pk), hashlib.md5(params.encode()).hexdigest()
+    )
+    result = cache.get(key)
+    if result is None:
+        result = _build(user, bucket, group_by, start, end, category_id, payment_method_id, max_points)
+        cache.set(key, result, getattr(settings, 'SPENDING_SERIES_CACHE_TIMEOUT', 3600))
+    return result
+
+
+def _build(user, bucket, group_by, start, end, category_id, payment_method_id, max_points):
+    rows = DailySpending.objects.filter(user=user, count__gt=0)
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lte=end)
+    if category_id:
+        rows = rows.filter(category_id=category_id)
+    if payment_method_id:
+        rows = rows.filter(payment_method_id=payment_method_id)
+
+    name_field = GROUP_BY[group_by]
+    fields = ['period', name_field] if name_field else ['period']
+    rows = (
+        rows.annotate(period=BUCKETS[bucket]('day'))
+        .values(*fields)
+        .annotate(amount=Sum('total'))
+        .order_by('period')
+    )
+
+    series = {}
+    seen = []
+    for row in rows:
+        period = row['period']
+        if not seen or seen[-1] != period:
+            seen.append(period)
+        name = (row[name_field] if name_field else None) or UNSET[group_by]
+        series.setdefault(name, {})[period] = row['amount']
+
+    # The whole calendar run, so buckets without spending show as 0 and
+    # every merged point below covers the same span of time
+    first = _bucket_start(start, bucket) if start else (seen[0] if seen else None)
+    last = _bucket_start(end, bucket) if end else (seen[-1] if seen else None)
+    periods = _calendar(first, last, bucket) if first and last else []
+
+    # Merge every `step` neighbouring buckets into the first one's label
+    step = max(1, math.ceil(len(periods) / max_points))
+    labels = periods[::step]
+    data = {}
+    for name, amounts in series.items():
+        points = [Decimal('0')] * len(labels)
+        for index, period in enumerate(periods):
+            if period in amounts:
+                points[index // step] += amounts[period]
+        data[name] = points
+    totals = [sum(column) for column in zip(*data.values())]
+
+    return {
+        'bucket': bucket,
+        'group_by': group_by,
+        'step': step,
+        'labels': [label.isoformat() for label in labels],
+        'series': [{'name': name, 'data': [float(p) for p in points]} for name, points in sorted(data.items())],
+        'totals': [float(total) for total in totals],
+    }
@@ -0,0 +1,42 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Category, Expenses, PaymentMethod
+from . import rollups
+
+# Keep DailySpending in step with single-row writes to Expenses. Queryset
+# .update(), bulk_create() and bulk_update() skip these handlers and must go
+# through expenses.rollups instead.
+
+
+@receiver(pre_save, sender=Expenses)
+def remember_previous_expense(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None
+    if instance.pk and not raw:
+        instance._rollup_previous = sender.all_objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Expenses)
+def update_rollup_for_expense(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = rollups.expense_deltas([instance])
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous is not None:
+        for key, (total, count) in rollups.expense_deltas([previous], sign=-1).items():
+            deltas[key][0] += total
+            deltas[key][1] += count
+    rollups.apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=Expenses)
+def remove_rollup_for_expense(sender, instance, **kwargs):
+    rollups.apply_deltas(rollups.expense_deltas([instance], sign=-1))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=PaymentMethod)
+def bump_version_for_name(sender, instance, raw=False, **kwargs):
+    # Cached spending series show category and payment method names
+    if not raw:
+        rollups.bump_versions([instance.user_id])
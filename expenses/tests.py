@@ -1,7 +1,24 @@
-from django.test import TestCase
+from unittest import skipUnless
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
-from .models import Category, PaymentMethod, Expenses
+from django.db import connection, IntegrityError, transaction
+from django.urls import reverse
+from django.db.models import Sum
+from django.core.management import call_command
+from io import StringIO
+import io
+from django.core.files.uploadedfile import SimpleUploadedFile
+import csv
+import gzip
+import json
+from .models import Category, PaymentMethod, Expenses, DailySpending
+from . import importer, rollups, series
 from django.utils import timezone
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from project.pagination import paginate, encode_cursor
 
 class ExpensesModelTest(TestCase):
     def setUp(self):
@@ -36,4 +53,418 @@ class ExpensesModelTest(TestCase):
     def test_soft_delete(self):
         self.category.deleted = True
         self.category.save()
-        self.assertTrue(Category.objects.get(id=self.category.id).deleted)
+        self.assertTrue(Category.all_objects.get(id=self.category.id).deleted)
+        self.assertFalse(Category.objects.filter(id=self.category.id).exists())
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN output is backend specific")
+class ExpenseIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+
+    def test_expense_list_uses_live_index(self):
+        # User filter and newest-first order both come from the index: no sort step
+        plan = Expenses.objects.filter(user=self.user).order_by('-created_at', '-id').explain()
+        self.assertIn('expenses_live_user_idx', plan)
+        self.assertNotIn('ORDER BY', plan)
+
+    def test_spending_date_range_uses_live_index(self):
+        start = timezone.now() - timedelta(days=30)
+        plan = (
+            Expenses.objects.filter(user=self.user, created_at__gte=start, created_at__lte=timezone.now())
+            .values('category__name').annotate(total=Sum('price')).explain()
+        )
+        self.assertIn('expenses_live_user_idx', plan)
+
+    def test_category_lookup_uses_index(self):
+        plan = Category.objects.filter(user=self.user, name='Food').explain()
+        self.assertIn('category_user_deleted_idx', plan)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        now = timezone.now()
+        # Pairs of expenses share a timestamp so the id tie-break matters
+        Expenses.objects.bulk_create([
+            Expenses(user=self.user, item=f'Item {i}', price=i, created_at=now - timedelta(minutes=i // 2))
+            for i in range(25)
+        ])
+        self.expected = list(Expenses.objects.filter(user=self.user).order_by('-created_at', '-id'))
+        self.client = Client()
+        self.client.login(username='testuser', password='password')
+
+    def test_walks_forward_and_back_without_gaps(self):
+        queryset = Expenses.objects.filter(user=self.user)
+        pages = [paginate(queryset, per_page=10)]
+        while pages[-1].has_next:
+            pages.append(paginate(queryset, after=pages[-1].next_cursor, per_page=10))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([e for page in pages for e in page], self.expected)
+        self.assertFalse(pages[0].has_previous)
+
+        back = paginate(queryset, before=pages[2].previous_cursor, per_page=10)
+        self.assertEqual(back.items, pages[1].items)
+        first = paginate(queryset, before=back.previous_cursor, per_page=10)
+        self.assertEqual(first.items, pages[0].items)
+        self.assertFalse(first.has_previous)
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        page = paginate(Expenses.objects.filter(user=self.user), after='not-a-cursor', per_page=10)
+        self.assertEqual(page.items, self.expected[:10])
+
+    def test_deep_page_costs_the_same_as_first(self):
+        def queries(**params):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('expenses'), params)
+            self.assertEqual(response.status_code, 200)
+            return [q['sql'] for q in ctx.captured_queries]
+
+        queries() # Warm the cached navbar notification count
+        first = queries()
+        deep = queries(after=encode_cursor(self.expected[19]))
+        self.assertEqual(len(first), len(deep))
+        self.assertFalse(any('OFFSET' in sql or 'COUNT(' in sql for sql in first + deep))
+
+
+class ExpenseListScaleTests(TestCase):
+    ROWS = 100_000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='heavy', password='password')
+        cls.food = Category.objects.create(user=cls.user, name='Food')
+        cls.travel = Category.objects.create(user=cls.user, name='Travel')
+        cls.cash = PaymentMethod.objects.create(user=cls.user, name='Cash')
+        now = timezone.now()
+        Expenses.objects.bulk_create((
+            Expenses(user=cls.user, item=f'Item {i}', price=1, created_at=now - timedelta(minutes=i),
+                     category=cls.food if i % 4 else cls.travel, payment_method=cls.cash)
+            for i in range(cls.ROWS)
+        ), batch_size=5000)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.login(username='heavy', password='password')
+        self.client.get(reverse('expenses')) # Warm the cached navbar notification count
+
+    def test_totals_come_from_the_database(self):
+        response = self.client.get(reverse('expenses'))
+        self.assertEqual(response.context['total_expense'], self.ROWS)
+        response = self.client.get(reverse('expenses'), {'category': self.travel.id})
+        self.assertEqual(response.context['total_expense'], self.ROWS // 4)
+        self.assertContains(response, f'<option value="{self.travel.id}" selected>')
+
+    def test_query_count_is_constant(self):
+        # session, user, total, page, categories, payment methods, form choices (2)
+        with self.assertNumQueries(8):
+            response = self.client.get(reverse('expenses'), {'category': self.food.id, 'payment_method': self.cash.id})
+        self.assertContains(response, 'Food')
+
+    def test_memory_does_not_grow_with_rows(self):
+        import tracemalloc
+        tracemalloc.start()
+        try:
+            self.client.get(reverse('expenses'))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        # Loading the 100k rows would take well over 50 MB
+        self.assertLess(peak, 5 * 1024 * 1024)
+
+
+class SpendingRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.food = Category.objects.create(user=self.user, name='Food')
+        self.cash = PaymentMethod.objects.create(user=self.user, name='Cash')
+        self.client = Client()
+        self.client.login(username='testuser', password='password')
+
+    def assertInSync(self):
+        self.assertEqual(rollups.rebuild(dry_run=True), [])
+
+    def test_rollups_follow_expense_changes(self):
+        lunch = Expenses.objects.create(user=self.user, item='Lunch', price=12, category=self.food, payment_method=self.cash)
+        Expenses.objects.create(user=self.user, item='Taxi', price=30)
+        self.assertInSync()
+        self.assertEqual(DailySpending.objects.get(category=self.food).total, 12)
+
+        lunch.price = 15
+        lunch.category = None
+        lunch.created_at -= timedelta(days=3)
+        lunch.save()
+        self.assertInSync()
+
+        self.client.get(reverse('expense_delete', args=[lunch.id]))
+        self.client.post(reverse('expense_delete', args=[lunch.id]))
+        self.assertInSync()
+        self.assertEqual(rollups.spending_summary(self.user)['total'], 30)
+
+        Expenses.objects.get(item='Taxi').delete()
+        self.assertInSync()
+
+    def test_spending_reads_rollups(self):
+        for day in range(20):
+            Expenses.objects.create(user=self.user, item='Coffee', price=2, category=self.food,
+                                    created_at=timezone.now() - timedelta(days=day))
+        # session, user, rollups (the navbar count is cached after the first request)
+        self.client.get(reverse('spendings'))
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('spendings'))
+        self.assertEqual(response.context['total_expense'], 40)
+        self.assertEqual(response.context['total_expense_category'], {'Food': 40})
+        self.assertEqual(response.context['total_expense_payment_method'], {'Payment Method Not Selected': 40})
+
+        start = (timezone.localdate() - timedelta(days=4)).isoformat()
+        response = self.client.get(reverse('spendings'), {'start_date': start, 'end_date': timezone.localdate().isoformat()})
+        # Four days: the end date itself is excluded, as it was before the rollups
+        self.assertEqual(response.context['total_expense'], 8)
+
+    def test_missing_category_and_payment_method_share_a_row(self):
+        for _ in range(2):
+            rollups.apply_deltas({(self.user.pk, timezone.localdate(), None, None): [Decimal('5'), 1]})
+        row = DailySpending.objects.get(user=self.user, category=None, payment_method=None)
+        self.assertEqual((row.total, row.count), (Decimal('10'), 2))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DailySpending.objects.create(user=self.user, day=row.day)
+
+    def test_rebuild_command_repairs_bulk_writes(self):
+        # bulk_create skips the signals
+        Expenses.objects.bulk_create([Expenses(user=self.user, item='Bulk', price=5, category=self.food)] * 3)
+        out = StringIO()
+        call_command('rebuild_spending_rollups', '--dry-run', stdout=out)
+        self.assertIn('1 rollup(s) drifted.', out.getvalue())
+        call_command('rebuild_spending_rollups', stdout=StringIO())
+        self.assertInSync()
+        self.assertEqual(rollups.spending_summary(self.user)['total'], 15)
+
+
+class SpendingSeriesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.food = Category.objects.create(user=self.user, name='Food')
+        self.travel = Category.objects.create(user=self.user, name='Travel')
+        for month in range(1, 7):
+            self.add(month, 10, self.food)
+            self.add(month, 100, self.travel)
+        self.client = Client()
+        self.client.login(username='testuser', password='password')
+
+    def add(self, month, price, category):
+        return Expenses.objects.create(user=self.user, item='Item', price=price, category=category,
+                                       created_at=timezone.make_aware(datetime(2025, month, 15)))
+
+    def get(self, **params):
+        return self.client.get(reverse('spending_series'), params)
+
+    def test_monthly_series_by_category(self):
+        data = self.get(bucket='month', start_date='2025-02-01', end_date='2025-04-30').json()
+        self.assertEqual(data['labels'], ['2025-02-01', '2025-03-01', '2025-04-01'])
+        self.assertEqual(data['series'], [
+            {'name': 'Food', 'data': [10.0, 10.0, 10.0]},
+            {'name': 'Travel', 'data': [100.0, 100.0, 100.0]},
+        ])
+        self.assertEqual(data['totals'], [110.0, 110.0, 110.0])
+
+    def test_filters_and_yearly_total(self):
+        data = self.get(bucket='year', group_by='total', category=self.food.id).json()
+        self.assertEqual(data['labels'], ['2025-01-01'])
+        self.assertEqual(data['series'], [{'name': 'Total', 'data': [60.0]}])
+
+    def test_downsampling_keeps_totals(self):
+        data = self.get(bucket='month', group_by='total', max_points=4).json()
+        self.assertEqual(data['step'], 2)
+        self.assertEqual(data['labels'], ['2025-01-01', '2025-03-01', '2025-05-01'])
+        self.assertEqual(data['totals'], [220.0, 220.0, 220.0])
+
+    def test_empty_buckets_are_zero_and_windows_fixed_width(self):
+        self.add(10, 1, self.food)  # Nothing from July to September
+        data = self.get(bucket='month', group_by='total', start_date='2025-05-01', end_date='2025-12-31').json()
+        self.assertEqual(data['labels'], ['2025-05-01', '2025-06-01', '2025-07-01', '2025-08-01',
+                                          '2025-09-01', '2025-10-01', '2025-11-01', '2025-12-01'])
+        self.assertEqual(data['totals'], [110.0, 110.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0])
+
+        # Every merged point spans three months, gaps or not
+        data = self.get(bucket='month', group_by='total', max_points=4).json()
+        self.assertEqual(data['step'], 3)
+        self.assertEqual(data['labels'], ['2025-01-01', '2025-04-01', '2025-07-01', '2025-10-01'])
+        self.assertEqual(data['totals'], [330.0, 330.0, 0.0, 1.0])
+
+        data = self.get(bucket='week', group_by='total', start_date='2025-01-13', end_date='2025-02-02').json()
+        self.assertEqual(data['labels'], ['2025-01-13', '2025-01-20', '2025-01-27'])
+        self.assertEqual(data['totals'], [110.0, 0.0, 0.0])
+
+    def test_renaming_a_category_invalidates_the_cache(self):
+        series.spending_series(self.user, 'month', 'category')
+        self.food.name = 'Groceries'
+        self.food.save()
+        names = [s['name'] for s in series.spending_series(self.user, 'month', 'category')['series']]
+        self.assertEqual(names, ['Groceries', 'Travel'])
+
+    def test_cached_until_expenses_change(self):
+        series.spending_series(self.user, 'month', 'total')
+        with self.assertNumQueries(0):
+            cached = series.spending_series(self.user, 'month', 'total')
+        self.assertEqual(cached['totals'][0], 110.0)
+        self.add(1, 5, self.food)
+        self.assertEqual(series.spending_series(self.user, 'month', 'total')['totals'][0], 115.0)
+
+    def test_extreme_date_ranges(self):
+        data = self.get(bucket='year', group_by='total', start_date='0001-01-01', end_date='9999-12-31').json()
+        self.assertEqual(data['labels'][0], '0001-01-01')
+        self.assertEqual(sum(data['totals']), 660.0)
+        for bucket in ('week', 'month'):
+            response = self.get(bucket=bucket, start_date='0001-01-01', end_date='9999-12-31')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('more than 10000', response.json()['error'])
+        # Up to the last representable day, without running off the calendar
+        data = self.get(bucket='week', group_by='total', start_date='9999-12-01', end_date='9999-12-31').json()
+        self.assertEqual(data['labels'], ['9999-11-29', '9999-12-06', '9999-12-13', '9999-12-20', '9999-12-27'])
+        data = self.get(bucket='month', group_by='total', start_date='9999-11-01', end_date='9999-12-31').json()
+        self.assertEqual(data['labels'], ['9999-11-01', '9999-12-01'])
+        self.assertEqual(self.get(start_date='2025-05-01', end_date='2025-04-01').status_code, 400)
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.get(bucket='decade').status_code, 400)
+        self.assertEqual(self.get(start_date='01/02/2025').status_code, 400)
+        self.assertEqual(self.get(max_points=0).status_code, 400)
+
+
+class ExpenseExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.food = Category.objects.create(user=self.user, name='Food')
+        self.client = Client()
+        self.client.login(username='testuser', password='password')
+
+    def export(self, **params):
+        response = self.client.get(reverse('expense_export'), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_csv_and_jsonl(self):
+        Expenses.objects.create(user=self.user, item='Lunch', price=12, category=self.food)
+        Expenses.objects.create(user=self.user, item='Old', price=3, deleted=True)
+        body = b''.join(self.export(format='csv').streaming_content).decode()
+        self.assertEqual(body.splitlines()[0], 'date,item,price,category,payment_method')
+        self.assertIn(',Lunch,12.000,Food,', body)
+        self.assertNotIn('Old', body)
+
+        lines = b''.join(self.export(format='jsonl').streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(lines[0])['category'], 'Food')
+        self.assertEqual(self.client.get(reverse('expense_export'), {'format': 'xml'}).status_code, 400)
+
+    def test_memory_stays_flat(self):
+        import tracemalloc
+        def add(count):
+            Expenses.objects.bulk_create((
+                Expenses(user=self.user, item=f'Item {i}', price=i, category=self.food) for i in range(count)
+            ), batch_size=5000)
+        def peak():
+            response = self.export(format='csv')
+            tracemalloc.start()
+            try:
+                size = sum(len(chunk) for chunk in response.streaming_content)
+                return size, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        add(5000)
+        small_size, small_peak = peak()
+        add(35000)
+        large_size, large_peak = peak()
+        # Eight times the output, about the same memory: only a batch is held at a time
+        self.assertGreater(large_size, 7 * small_size)
+        self.assertLess(large_peak, small_peak * 1.3)
+        self.assertLess(large_peak, large_size)
+
+        body = gzip.decompress(b''.join(self.export(format='csv', gzip='1').streaming_content))
+        self.assertEqual(len(body.splitlines()), 40001)
+
+
+class ExpenseImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.food = Category.objects.create(user=self.user, name='Food')
+        self.client = Client()
+        self.client.login(username='testuser', password='password')
+
+    def upload(self, text):
+        return self.client.post(reverse('expense_import'), {'file': SimpleUploadedFile('expenses.csv', text.encode())})
+
+    def test_import_maps_columns_and_reports_errors(self):
+        response = self.upload(
+            "Item,Amount,Date,Category,Payment Method\n"
+            "Lunch,12.50,2025-03-01,Food,Cash\n"
+            "Train,30,01-03-2025,Travel,Card\n"
+            ",5,2025-03-01,,\n"
+            "Snack,abc,2025-03-01,,\n"
+            "Cake,4,31/02/2025,Food,\n"
+        )
+        self.assertEqual(response.status_code, 200)
+        result = response.context['result']
+        self.assertEqual(result.created, 2)
+        self.assertEqual([line for line, _ in result.errors], [4, 5, 6])
+        self.assertContains(response, "Price &#x27;abc&#x27; is not a number.")
+
+        self.assertEqual(Expenses.objects.get(item='Lunch').category, self.food)
+        self.assertEqual(Category.objects.filter(user=self.user).count(), 2) # Travel created once
+        self.assertTrue(PaymentMethod.objects.filter(user=self.user, name='Card').exists())
+        self.assertEqual(rollups.rebuild(dry_run=True), [])
+
+    def test_overlong_category_is_a_row_error(self):
+        result = importer.import_expenses(self.user, io.StringIO(
+            "item,price,category,payment_method\n"
+            f"Lunch,12,{'x' * 256},Cash\n"
+            f"Dinner,20,Food,{'y' * 256}\n"
+            "Snack,3,Food,Cash\n"
+        ))
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.errors, [(2, "Category is longer than 255 characters."),
+                                         (3, "Payment method is longer than 255 characters.")])
+        self.assertFalse(Category.objects.filter(name__startswith='xxx').exists())
+
+    def test_unreadable_rows_are_row_errors(self):
+        limit = csv.field_size_limit()
+        response = self.upload(
+            "item,price\n"
+            f"\"{'x' * (limit + 1)}\",5\n"
+            "Nul\x00,3\n"
+            "Snack,3\n"
+        )
+        self.assertEqual(response.status_code, 200)
+        result = response.context['result']
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.errors, [(2, f"Unreadable row: field larger than field limit ({limit})."),
+                                         (3, "Row contains a NUL byte.")])
+
+        result = importer.import_expenses(self.user, io.StringIO(f"{'x' * (limit + 1)},price\nLunch,1\n"))
+        self.assertEqual(result.created, 0)
+        self.assertEqual(result.errors, [(1, f"Unreadable header: field larger than field limit ({limit}).")])
+
+    def test_missing_columns(self):
+        result = importer.import_expenses(self.user, io.StringIO("date,category\n2025-01-01,Food\n"))
+        self.assertEqual(result.created, 0)
+        self.assertEqual(result.errors, [(1, "Missing column(s): item, price.")])
+
+    def test_export_round_trip(self):
+        Expenses.objects.create(user=self.user, item='Lunch', price=12, category=self.food)
+        exported = b''.join(self.client.get(reverse('expense_export')).streaming_content).decode()
+        result = importer.import_expenses(self.user, io.StringIO(exported))
+        self.assertEqual((result.created, result.errors), (1, []))
+        self.assertEqual(Expenses.objects.filter(item='Lunch', category=self.food).count(), 2)
+
+    def test_large_import_is_batched(self):
+        # Throughput is measured by benchmarks/imports.py, not here
+        rows = 40000
+        text = "date,item,price,category,payment_method\n" + "".join(
+            f"2025-01-{i % 28 + 1:02d},Item {i},{i % 500}.25,Cat {i % 20},Method {i % 3}\n" for i in range(rows)
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            result = importer.import_expenses(self.user, io.StringIO(text), batch_size=5000)
+        self.assertEqual(result.created, rows)
+        # A few statements per batch of 5000, not per row
+        self.assertLess(len(ctx.captured_queries), 10 * rows // 5000)
+        self.assertEqual(rollups.spending_summary(self.user)['total'], sum(Decimal(f'{i % 500}.25') for i in range(rows)))
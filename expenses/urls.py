@@ -16,4 +16,7 @@ urlpatterns = [
     path('payment-method/update/<int:payment_method_id>/', views.payment_method_update, name='payment_method_update'),
     path('payment-method/delete/<int:payment_method_id>/', views.payment_method_delete, name='payment_method_delete'),
     path('spending/', views.spending, name='spendings'),
+    path('spending/series/', views.spending_series, name='spending_series'),
+    path('export/', views.expense_export, name='expense_export'),
+    path('import/', views.expense_import, name='expense_import'),
 ]
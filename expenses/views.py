@@ -4,11 +4,16 @@ from django.contrib.auth import login
 from .models import Expenses, Category, PaymentMethod
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404, redirect
-from .forms import ExpenseForm, CategoryForm, PaymentMethodForm, SpendingForm, LoginForm
-from django.core.paginator import Paginator
+from .forms import ExpenseForm, CategoryForm, PaymentMethodForm, SpendingForm, LoginForm, ExpenseImportForm
+from project.pagination import paginate_request
+from project.streaming import batched, export_response
+from . import importer, rollups, series
 from django.contrib import messages
-from datetime import datetime
+from django.http import JsonResponse, HttpResponseBadRequest
+import io
+from datetime import datetime, timedelta
 from django.utils import timezone
+from django.db.models import Sum
 
 
 def investments(request):
@@ -23,9 +28,9 @@ def login_view(request):
 
 @login_required
 def expense_list(request):
-    expenses = Expenses.objects.filter(user=request.user, deleted=0).order_by('-created_at')
+    expenses = Expenses.objects.filter(user=request.user)
 
-    # Retrieve filter values
+    # Retrieve filter values (category and payment method by id)
     start_date = request.GET.get('start_date', '')
     end_date = request.GET.get('end_date', '')
     category_filter = request.GET.get('category', '')
@@ -36,24 +41,23 @@ def expense_list(request):
         expenses = expenses.filter(created_at__gte=start_date)
     if end_date:
         expenses = expenses.filter(created_at__lte=end_date)
-    if category_filter:
-        expenses = expenses.filter(category__name=category_filter)
-    if payment_method:
-        expenses = expenses.filter(payment_method__name=payment_method)
+    if category_filter.isdigit():
+        expenses = expenses.filter(category_id=category_filter)
+    if payment_method.isdigit():
+        expenses = expenses.filter(payment_method_id=payment_method)
 
-    # Calculate total expense before pagination (so it includes all filtered results)
-    total_expense = 0
-    for expense in expenses:
-        total_expense += expense.price
+    # Total of all filtered results, summed by the database
+    total_expense = expenses.aggregate(total=Sum('price'))['total'] or 0
 
-    # Pagination
-    paginator = Paginator(expenses, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination: no COUNT/OFFSET, so deep pages cost the same as the first.
+    # Only the columns the table shows, with the related names joined in.
+    page_obj = paginate_request(request, expenses.select_related('category', 'payment_method').only(
+        'created_at', 'item', 'price', 'category__name', 'payment_method__name',
+    ), per_page=10)
 
     # Fetch categories & payment methods
-    categories = Category.objects.filter(user=request.user, deleted=0)
-    payment_methods = PaymentMethod.objects.filter(user=request.user, deleted=0)
+    categories = Category.objects.filter(user=request.user).only('name')
+    payment_methods = PaymentMethod.objects.filter(user=request.user).only('name')
 
     if request.method == 'POST':
         form2 = ExpenseForm(request.POST, user=request.user)
@@ -96,7 +100,7 @@ def expense_add(request):
             form2 = CategoryForm(request.POST)
             category_name = form2['name'].value()
             print(category_name)
-            if Category.objects.filter(name=category_name, user=request.user, deleted=0).exists():
+            if Category.objects.filter(name=category_name, user=request.user).exists():
                 messages.error(request, "This category already exists.")
                 return redirect('expense_add')
             else:
@@ -109,7 +113,7 @@ def expense_add(request):
             form3 = PaymentMethodForm(request.POST)
             payment_method_name = form3['name'].value()
             print(payment_method_name)
-            if PaymentMethod.objects.filter(name=payment_method_name, user=request.user, deleted=0).exists():
+            if PaymentMethod.objects.filter(name=payment_method_name, user=request.user).exists():
                 messages.error(request, "This payment method already exists.")
                 return redirect('expense_add')
             else:
@@ -126,7 +130,7 @@ def expense_add(request):
 
 @login_required
 def expense_update(request, expense_id):
-    expense = get_object_or_404(Expenses, pk=expense_id, user=request.user, deleted=0)
+    expense = get_object_or_404(Expenses, pk=expense_id, user=request.user)
     expense_created_time = expense.created_at
     if request.method == 'POST':
         form = ExpenseForm(request.POST, instance=expense, user=request.user)
@@ -143,7 +147,7 @@ def expense_update(request, expense_id):
 
 @login_required
 def expense_delete(request, expense_id):
-    expense = get_object_or_404(Expenses, pk=expense_id, user=request.user, deleted=0)
+    expense = get_object_or_404(Expenses, pk=expense_id, user=request.user)
     if request.method == 'POST':
         expense.deleted = True
         # expense.delete()
@@ -153,14 +157,14 @@ def expense_delete(request, expense_id):
 
 @login_required
 def category_list(request):
-    categories = Category.objects.filter(user=request.user, deleted=0)
+    categories = Category.objects.filter(user=request.user)
     if request.method == 'POST':
         form_type = request.POST.get('form_type')
         if form_type == "category":
                 form = CategoryForm(request.POST)
                 category_name = form['name'].value()
                 print(category_name)
-                if Category.objects.filter(name=category_name, user=request.user, deleted=0).exists():
+                if Category.objects.filter(name=category_name, user=request.user).exists():
                     messages.error(request, "This category already exists.")
                     return redirect('category_list')
                 else:
@@ -180,7 +184,7 @@ def category_add(request):
         if form.is_valid():
             category_name = form.cleaned_data['name']
             user = request.user
-            if Category.objects.filter(name=category_name, user=user, deleted=0).exists():
+            if Category.objects.filter(name=category_name, user=user).exists():
                 messages.error(request, "This category already exists.")
                 return redirect('category_update')
             else:
@@ -194,12 +198,12 @@ def category_add(request):
 
 @login_required
 def category_update(request, category_id):
-    category = get_object_or_404(Category, pk=category_id, user=request.user, deleted=0)
+    category = get_object_or_404(Category, pk=category_id, user=request.user)
     if request.method == 'POST':
         form = CategoryForm(request.POST, instance=category)
         if form.is_valid():
             edited_category = form.save(commit=False)
-            if Category.objects.filter(name=edited_category.name, user=request.user, deleted=0).exists():
+            if Category.objects.filter(name=edited_category.name, user=request.user).exists():
                 messages.error(request, "This category already exists. Try different name.")
                 return redirect('category_update', category_id=category_id)
             else:
@@ -212,7 +216,7 @@ def category_update(request, category_id):
 
 @login_required
 def category_delete(request, category_id):
-    category = get_object_or_404(Category, pk=category_id, user=request.user, deleted=0)
+    category = get_object_or_404(Category, pk=category_id, user=request.user)
     if request.method == 'POST':
         category.deleted = True
         category.save()
@@ -222,14 +226,14 @@ def category_delete(request, category_id):
 
 @login_required
 def payment_method_list(request):
-    payment_methods = PaymentMethod.objects.filter(user=request.user, deleted=0)
+    payment_methods = PaymentMethod.objects.filter(user=request.user)
     if request.method == 'POST':
         form_type = request.POST.get('form_type')
         if form_type == "payment_method":
                 form = PaymentMethodForm(request.POST)
                 payment_method_name = form['name'].value()
                 print(payment_method_name)
-                if PaymentMethod.objects.filter(name=payment_method_name, user=request.user, deleted=0).exists():
+                if PaymentMethod.objects.filter(name=payment_method_name, user=request.user).exists():
                     messages.error(request, "This payment method already exists.")
                     return redirect('payment_method_list')
                 else:
@@ -249,7 +253,7 @@ def payment_method_add(request):
         if form.is_valid():
             payment_method_name = form.cleaned_data['name']
             user = request.user
-            if PaymentMethod.objects.filter(name=payment_method_name, user=user, deleted=0).exists():
+            if PaymentMethod.objects.filter(name=payment_method_name, user=user).exists():
                 messages.error(request, "This payment method already exists.")
                 return redirect('payment_method_add')
             else:
@@ -263,12 +267,12 @@ def payment_method_add(request):
 
 @login_required
 def payment_method_update(request, payment_method_id):
-    payment_method = get_object_or_404(PaymentMethod, pk=payment_method_id, user=request.user, deleted=0)
+    payment_method = get_object_or_404(PaymentMethod, pk=payment_method_id, user=request.user)
     if request.method == 'POST':
         form = PaymentMethodForm(request.POST, instance=payment_method)
         if form.is_valid():
             edited_payment_method = form.save(commit=False)
-            if PaymentMethod.objects.filter(name=edited_payment_method.name, user=request.user, deleted=0).exists():
+            if PaymentMethod.objects.filter(name=edited_payment_method.name, user=request.user).exists():
                 messages.error(request, "This payment method already exists. Try different name.")
                 return redirect('payment_method_update', payment_method_id=payment_method_id)
             else:
@@ -281,7 +285,7 @@ def payment_method_update(request, payment_method_id):
 
 @login_required
 def payment_method_delete(request, payment_method_id):
-    payment_method = get_object_or_404(PaymentMethod, pk=payment_method_id, user=request.user, deleted=0)
+    payment_method = get_object_or_404(PaymentMethod, pk=payment_method_id, user=request.user)
     if request.method == 'POST':
         payment_method.deleted = True
         payment_method.save()
@@ -289,42 +293,31 @@ def payment_method_delete(request, payment_method_id):
         return redirect('payment_method_list')
     return render(request, 'payment_method_confirm_delete.html', {'payment_method': payment_method})
 
-from django.db.models import Sum
-
 @login_required
 def spending(request):
     # Get the start and end date from the request parameters
     start_date = request.GET.get('start_date', '')
     end_date = request.GET.get('end_date', '')
 
-    # Filter expenses by user and optional date range
-    expenses = Expenses.objects.filter(user=request.user, deleted=0)
-
-    # If start_date is provided, filter the expenses from that date
-    if start_date:
-        start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
-        expenses = expenses.filter(created_at__gte=start_date_obj)
-    
-    # If end_date is provided, filter the expenses up to that date
-    if end_date:
-        end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
-        expenses = expenses.filter(created_at__lte=end_date_obj)
+    # Optional date range. The range has always run up to midnight at the start
+    # of end_date, so that day itself isn't counted; the rollups keep it that way.
+    start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+    end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date() - timedelta(days=1) if end_date else None
 
-    # Calculate total expense
-    total_expense = expenses.aggregate(Sum('price'))['price__sum'] or 0
+    # Totals come from the daily rollups, not from scanning every expense
+    summary = rollups.spending_summary(request.user, start_date_obj, end_date_obj)
+    total_expense = summary['total']
 
     # Category-wise Aggregation
-    category_data = expenses.values('category__name').annotate(total=Sum('price'))
     total_expense_category = {
-        (item['category__name'] if item['category__name'] else 'Category Not Selected'): item['total'] 
-        for item in category_data
+        (name if name else 'Category Not Selected'): total
+        for name, total in summary['by_category'].items()
     }
-    
+
     # Payment Method-wise Aggregation
-    payment_method_data = expenses.values('payment_method__name').annotate(total=Sum('price'))
     total_expense_payment_method = {
-        (item['payment_method__name'] if item['payment_method__name'] else 'Payment Method Not Selected'): item['total'] 
-        for item in payment_method_data
+        (name if name else 'Payment Method Not Selected'): total
+        for name, total in summary['by_payment_method'].items()
     }
 
     # These totals are mathematically identical to total_expense logic-wise
@@ -345,3 +338,73 @@ def spending(request):
             'end_date': end_date
         }
     )
+
+
+@login_required
+def spending_series(request):
+    """
+    JSON time series of the user's spending, e.g.
+    ?bucket=month&group_by=category&start_date=2025-01-01&end_date=2025-12-31&category=3
+    """
+    bucket = request.GET.get('bucket', 'month')
+    group_by = request.GET.get('group_by', 'category')
+    if bucket not in series.BUCKETS:
+        return JsonResponse({'error': f"bucket must be one of {', '.join(series.BUCKETS)}"}, status=400)
+    if group_by not in series.GROUP_BY:
+        return JsonResponse({'error': f"group_by must be one of {', '.join(series.GROUP_BY)}"}, status=400)
+    try:
+        start = datetime.strptime(request.GET['start_date'], '%Y-%m-%d').date() if request.GET.get('start_date') else None
+        end = datetime.strptime(request.GET['end_date'], '%Y-%m-%d').date() if request.GET.get('end_date') else None
+        max_points = int(request.GET['max_points']) if request.GET.get('max_points') else None
+    except ValueError:
+        return JsonResponse({'error': "Dates must be YYYY-MM-DD and max_points a number"}, status=400)
+    if max_points is not None and max_points < 1:
+        return JsonResponse({'error': "max_points must be at least 1"}, status=400)
+    if start and end and start > end:
+        return JsonResponse({'error': "start_date must not be after end_date"}, status=400)
+
+    category = request.GET.get('category', '')
+    payment_method = request.GET.get('payment_method', '')
+    try:
+        data = series.spending_series(
+            request.user, bucket, group_by, start, end,
+            category_id=int(category) if category.isdigit() else None,
+            payment_method_id=int(payment_method) if payment_method.isdigit() else None,
+            max_points=max_points,
+        )
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse(data)
+
+
+@login_required
+def expense_export(request):
+    """Download all of the user's expenses as ?format=csv|jsonl, optionally &gzip=1."""
+    expenses = Expenses.objects.filter(user=request.user)
+    rows = (
+        row[1:]
+        for batch in batched(expenses, ('created_at', 'item', 'price', 'category__name', 'payment_method__name'))
+        for row in batch
+    )
+    response = export_response(request, 'expenses', ['date', 'item', 'price', 'category', 'payment_method'], rows)
+    if response is None:
+        return HttpResponseBadRequest("Unknown export format.")
+    return response
+
+
+@login_required
+def expense_import(request):
+    result = None
+    if request.method == 'POST':
+        form = ExpenseImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            # Decoded while streaming; the upload is never read into memory whole
+            lines = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', errors='replace', newline='')
+            result = importer.import_expenses(request.user, lines)
+            if result.created:
+                messages.success(request, f"Imported {result.created} expense(s).")
+            if result.skipped or not result.created:
+                messages.error(request, f"{result.skipped} row(s) could not be imported.")
+    else:
+        form = ExpenseImportForm()
+    return render(request, 'expense_import.html', {'form': form, 'result': result})
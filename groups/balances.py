@@ -0,0 +1,98 @@
+"""
+Balance service shared by the group views.
+
+Everything here costs a constant number of queries regardless of how many
+members or currencies a group has. Reads come from the materialized
+GroupBalance table (see groups/ledger.py); aggregate_balances() computes the
+same numbers from the raw payments and splits.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+
+from .models import GroupExpense, ExpensePayment, ExpenseSplit, GroupBalance
+
+ZERO = Decimal('0.00')
+TOLERANCE = Decimal('0.01')
+
+
+def _outstanding():
+    return Q(amount__gt=TOLERANCE) | Q(amount__lt=-TOLERANCE)
+
+
+def group_currencies(group):
+    """Currencies with live expenses in the group, USD if there are none."""
+    currencies = list(
+        GroupExpense.objects.filter(group=group).values_list('currency', flat=True).distinct()
+    )
+    return currencies or ['USD']
+
+
+def group_balances(group, members=None):
+    """
+    Net balance of every member in every currency of the group.
+    Returns {currency: {member: Decimal}} from three queries.
+    """
+    if members is None:
+        members = list(group.users.all())
+    stored = {
+        (currency, user_id): amount
+        for currency, user_id, amount in GroupBalance.objects.filter(group=group).values_list('currency', 'user', 'amount')
+    }
+    return {
+        currency: {member: stored.get((currency, member.id), ZERO) for member in members}
+        for currency in group_currencies(group)
+    }
+
+
+def currency_balances(group, currency, members=None):
+    """Net balance of every member in one currency: {member: Decimal}."""
+    if members is None:
+        members = list(group.users.all())
+    stored = dict(
+        GroupBalance.objects.filter(group=group, currency=currency).values_list('user', 'amount')
+    )
+    return {member: stored.get(member.id, ZERO) for member in members}
+
+
+def has_outstanding_balance(group, user=None):
+    """True if the user (or anyone, when user is None) owes or is owed money in the group."""
+    balances = GroupBalance.objects.filter(group=group)
+    if user is not None:
+        balances = balances.filter(user=user)
+    return balances.filter(_outstanding()).exists()
+
+
+def user_group_balances(user, user_groups):
+    """
+    Non-zero balances of one user across many groups in a single query.
+    Returns {group_id: [{'currency': str, 'amount': Decimal}]}.
+    """
+    rows = GroupBalance.objects.filter(
+        group__in=user_groups, user=user
+    ).filter(_outstanding()).order_by('currency').values_list('group', 'currency', 'amount')
+
+    balance_map = defaultdict(list)
+    for group_id, currency, amount in rows:
+        balance_map[group_id].append({'currency': currency, 'amount': amount})
+    return balance_map
+
+
+def aggregate_balances(group_ids=None):
+    """
+    Balances computed from the raw ledger rows with one grouped aggregate over
+    payments and one over splits, keyed by (group_id, currency, user_id).
+    """
+    payments = ExpensePayment.objects.filter(expense__deleted=0)
+    splits = ExpenseSplit.objects.filter(expense__deleted=0)
+    if group_ids is not None:
+        payments = payments.filter(expense__group__in=group_ids)
+        splits = splits.filter(expense__group__in=group_ids)
+
+    balances = defaultdict(Decimal)
+    for row in payments.values('expense__group', 'expense__currency', 'user').annotate(total=Sum('amount')):
+        balances[(row['expense__group'], row['expense__currency'], row['user'])] += row['total']
+    for row in splits.values('expense__group', 'expense__currency', 'user').annotate(total=Sum('amount_owed')):
+        balances[(row['expense__group'], row['expense__currency'], row['user'])] -= row['total']
+    return balances
@@ -0,0 +1,69 @@
+"""
+Home dashboard: a user's totals over all their groups.
+
+Shows what the user is owed and owes in total per currency, the people they
+have the largest net debts with and the latest expenses in their groups.
+Built from five queries and cached per user under a key made of the
+user's live groups and their ledger versions (see groups/ledger.py), so
+joining or leaving a group, or any change to one of its ledgers, gives a
+new key. A cached dashboard costs one query.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, Sum
+
+from .models import groups, GroupBalance, GroupExpense
+from .balances import TOLERANCE, ZERO
+from . import ledger, netting
+
+TOP_COUNTERPARTIES = 5
+RECENT_ACTIVITY = 10
+
+
+def dashboard(user):
+    """{'totals', 'counterparties', 'activity', 'groups_count'} for user, cached until one of their ledgers changes."""
+    group_ids = sorted(groups.objects.filter(users=user, deleted=False).values_list('id', flat=True))
+    versions = ledger.ledger_versions(group_ids)
+    scope = ','.join(f'{group_id}:{versions[group_id]}' for group_id in group_ids)
+    key = 'groups:dashboard:{}:{}'.format(user.pk, hashlib.md5(scope.encode()).hexdigest())
+    result = cache.get(key)
+    if result is None:
+        result = _build(user, group_ids)
+        cache.set(key, result, getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 3600))
+    return result
+
+
+def _build(user, group_ids):
+    totals = GroupBalance.objects.filter(group__in=group_ids, user=user).values('currency').annotate(
+        owed=Sum('amount', filter=Q(amount__gt=TOLERANCE)),
+        owing=Sum('amount', filter=Q(amount__lt=-TOLERANCE)),
+    ).order_by('currency')
+
+    counterparties = [
+        {
+            'id': position['counterparty'].id,
+            'username': position['counterparty'].username,
+            'currency': position['currency'],
+            'amount': position['amount'],
+            'groups': position['groups'],
+        }
+        for position in netting.net_positions(user) if position['amount']
+    ][:TOP_COUNTERPARTIES]
+
+    activity = GroupExpense.objects.filter(group__in=group_ids).order_by('-created_at', '-id').values(
+        'id', 'description', 'amount', 'currency', 'created_at', 'group_id', 'group__name', 'paid_by__username',
+    )[:RECENT_ACTIVITY]
+
+    # Plain values only, so the cached dashboard doesn't carry model instances around
+    return {
+        'totals': [
+            {'currency': row['currency'], 'owed': ledger.to_cents(row['owed'] or ZERO),
+             'owing': ledger.to_cents(-(row['owing'] or ZERO))}
+            for row in totals if row['owed'] or row['owing']
+        ],
+        'counterparties': counterparties,
+        'activity': list(activity),
+        'groups_count': len(group_ids),
+    }
@@ -43,3 +43,8 @@ class GroupExpenseForm(forms.ModelForm):
             'description': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'What was this for?'}),
             'currency': forms.Select(attrs={'class': 'form-select'}),
         }
+
+
+class GroupImportForm(forms.Form):
+    file = forms.FileField(label="CSV file", help_text="A Splitwise export: Date, Description, Category, Cost, Currency and one column per member.",
+                           widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'}))
@@ -0,0 +1,257 @@
+"""
+Bulk import of a group's ledger from a Splitwise-style CSV export.
+
+The expected layout is the one Splitwise exports:
+
+    Date,Description,Category,Cost,Currency,<member>,<member>,...
+
+where each member column holds that member's net share of the expense
+(positive: lent, negative: owes). Member columns are matched to the group's
+members by username, full name or first name.
+
+Nets don't say who paid how much, so an expense is booked as: every member
+with a positive net paid that net, every member with a negative net owes it,
+and the largest lender also paid (and owes) the rest of the cost - their own
+share. Balances come out exactly as in the source.
+
+The whole file is validated before anything is written, so a ledger is
+imported completely or not at all. Rows are then written in bulk batches in
+one transaction, the balances are updated once at the end and every member
+gets a single summary notification instead of one per expense.
+"""
+import csv
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from notifications.models import Notification
+from notifications import counters
+from .models import GroupExpense, ExpensePayment, ExpenseSplit
+from . import ledger
+
+FIXED_COLUMNS = ('date', 'description', 'category', 'cost', 'currency')
+REQUIRED = ('date', 'description', 'cost')
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%m/%d/%Y')
+MAX_AMOUNT = Decimal('10') ** 8  # amount columns are max_digits=10, decimal_places=2
+TOLERANCE = Decimal('0.05')  # Same slack add_group_expense allows between splits and amount
+CURRENCIES = {code for code, _ in GroupExpense._meta.get_field('currency').choices}
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.skipped = 0  # Rows that move no balance (e.g. a member's own expense)
+        self.failed = 0
+        self.errors = []  # [(line number, message)], the first max_errors of them
+
+
+def _member_ids(group, names):
+    """
+    {column index: user_id} for the member columns, the names that match
+    nobody and the names that match more than one member.
+    """
+    members = list(group.users.all())
+    # Usernames are unique and win; first and full names only fill the gaps
+    lookup = {user.username.strip().lower(): {user.id} for user in members}
+    by_name = defaultdict(set)
+    for user in members:
+        for name in (user.first_name, user.get_full_name()):
+            name = name.strip().lower()
+            if name and name not in lookup:
+                by_name[name].add(user.id)
+    lookup.update(by_name)
+
+    found = {}
+    unknown = []
+    ambiguous = []
+    for index, name in names:
+        user_ids = lookup.get(name.strip().lower())
+        if not user_ids:
+            unknown.append(name)
+        elif len(user_ids) > 1:
+            ambiguous.append(name)
+        else:
+            found[index] = next(iter(user_ids))
+    return found, unknown, ambiguous
+
+
+def _parse_date(value):
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(value, fmt)
+            break
+        except ValueError:
+            continue
+    else:
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"Unrecognised date '{value}'.") from None
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def _parse_amount(value, what):
+    value = value.strip() or '0'
+    try:
+        amount = ledger.to_cents(Decimal(value.replace(',', '')))
+    except InvalidOperation:
+        raise ValueError(f"{what} '{value}' is not a number.") from None
+    if not amount.is_finite() or abs(amount) >= MAX_AMOUNT:
+        raise ValueError(f"{what} '{value}' is out of range.")
+    return amount
+
+
+def split_nets(cost, nets):
+    """
+    ({user_id: paid}, {user_id: owed}, payer) for an expense of cost given
+    each member's net share, or None if nobody's balance moves.
+    """
+    lenders = {user_id: net for user_id, net in nets.items() if net > 0}
+    if not lenders:
+        return None
+    payer = max(lenders, key=lambda user_id: (lenders[user_id], -user_id))
+    payments = dict(lenders)
+    splits = {user_id: -net for user_id, net in nets.items() if net < 0}
+    own_share = cost - sum(lenders.values())
+    if own_share > 0:
+        payments[payer] += own_share
+        splits[payer] = own_share
+    return payments, splits, payer
+
+
+def _parse(group, reader, result, max_errors):
+    """Validate every row; returns [(created_at, description, cost, currency, payments, splits, payer)]."""
+    header = [name.strip() for name in next(reader, None) or []]
+    columns = {name.lower(): index for index, name in reversed(list(enumerate(header)))}
+    missing = [name for name in REQUIRED if name not in columns]
+    if missing:
+        result.errors.append((1, f"Missing column(s): {', '.join(missing)}."))
+        return []
+    members, unknown, ambiguous = _member_ids(group, [
+        (index, name) for index, name in enumerate(header) if name and name.lower() not in FIXED_COLUMNS
+    ])
+    if unknown:
+        result.errors.append((1, f"Not a member of this group: {', '.join(unknown)}."))
+        return []
+    if ambiguous:
+        result.errors.append((1, f"Ambiguous column(s), more than one member has that name: {', '.join(ambiguous)}."))
+        return []
+    if not members:
+        result.errors.append((1, "No member columns."))
+        return []
+
+    def cell(row, name):
+        index = columns.get(name)
+        return row[index] if index is not None and index < len(row) else ''
+
+    def error(line, message):
+        result.failed += 1
+        if len(result.errors) < max_errors:
+            result.errors.append((line, message))
+
+    rows = []
+    for line, row in enumerate(reader, start=2):
+        if not any(value.strip() for value in row):
+            continue
+        if not cell(row, 'date').strip() and cell(row, 'description').strip().lower() == 'total balance':
+            continue  # Splitwise's summary line
+        try:
+            description = cell(row, 'description').strip()
+            if not description:
+                raise ValueError("Description is empty.")
+            if len(description) > 255:
+                raise ValueError("Description is longer than 255 characters.")
+            created_at = _parse_date(cell(row, 'date'))
+            currency = cell(row, 'currency').strip().upper() or 'USD'
+            if currency not in CURRENCIES:
+                raise ValueError(f"Unsupported currency '{currency}'.")
+            cost = _parse_amount(cell(row, 'cost'), "Cost")
+            nets = defaultdict(Decimal)
+            for index, user_id in members.items():
+                nets[user_id] += _parse_amount(row[index] if index < len(row) else '', "Share")
+            if abs(sum(nets.values())) > TOLERANCE:
+                raise ValueError(f"Shares add up to {sum(nets.values())}, not 0.")
+            if cost < sum(net for net in nets.values() if net > 0):
+                raise ValueError(f"Cost {cost} is less than what is owed.")
+        except ValueError as exc:
+            error(line, str(exc))
+            continue
+        booked = split_nets(cost, nets)
+        if booked is None:
+            result.skipped += 1
+            continue
+        rows.append((created_at, description, cost, currency) + booked)
+    return rows
+
+
+def _create_expenses(expenses):
+    if connection.features.can_return_rows_from_bulk_insert:
+        GroupExpense.objects.bulk_create(expenses)
+    else:
+        # MySQL doesn't hand back the ids of bulk inserted rows, and the
+        # payments and splits need them
+        for expense in expenses:
+            expense.save()
+
+
+def _write(group, rows, deltas):
+    expenses = [
+        GroupExpense(group=group, description=description, amount=cost, currency=currency, paid_by_id=payer)
+        for _, description, cost, currency, _, _, payer in rows
+    ]
+    _create_expenses(expenses)
+    # created_at is auto_now_add, so the original dates go in afterwards
+    for expense, row in zip(expenses, rows):
+        expense.created_at = row[0]
+    GroupExpense.objects.bulk_update(expenses, ['created_at'])
+
+    payments = []
+    splits = []
+    for expense, (_, _, _, currency, paid, owed, _) in zip(expenses, rows):
+        for user_id, amount in paid.items():
+            payments.append(ExpensePayment(expense=expense, user_id=user_id, amount=amount))
+            deltas[(group.id, currency, user_id)] += amount
+        for user_id, amount in owed.items():
+            splits.append(ExpenseSplit(expense=expense, user_id=user_id, amount_owed=amount))
+            deltas[(group.id, currency, user_id)] -= amount
+    ExpensePayment.objects.bulk_create(payments)
+    ExpenseSplit.objects.bulk_create(splits)
+
+
+def import_group_expenses(group, lines, actor=None, batch_size=None, max_errors=1000):
+    """
+    Import CSV text lines (any iterable of str, e.g. an open text file) into
+    group's ledger. Nothing is written if any row is invalid. Returns an
+    ImportResult.
+    """
+    batch_size = batch_size or getattr(settings, 'GROUP_IMPORT_BATCH_SIZE', 500)
+    result = ImportResult()
+    rows = _parse(group, csv.reader(lines), result, max_errors)
+    if result.failed or result.errors or not rows:
+        return result
+
+    with transaction.atomic():
+        # Bulk writes skip the balance signals; the deltas are applied once at the end
+        deltas = defaultdict(Decimal)
+        for start in range(0, len(rows), batch_size):
+            _write(group, rows[start:start + batch_size], deltas)
+        ledger.apply_deltas(deltas)
+        result.created = len(rows)
+
+        by = f" by {actor.username}" if actor is not None else ""
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                user=member,
+                message=f"{result.created} expense(s) imported into '{group.name}'{by}.",
+                notification_type='EXPENSE_ADD',
+                related_link=f"/groups/{group.id}/"
+            )
+            for member in group.users.all() if member != actor
+        ])
+        counters.notifications_created(notifications)
+    return result
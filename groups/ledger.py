@@ -0,0 +1,254 @@
+"""
+Materialized per-member balances for groups.
+
+GroupBalance stores the net (paid - owed) of every (group, currency, user),
+and DebtEdge the simplified debts between members derived from it.
+Single-row writes are picked up by the signal handlers in groups/signals.py;
+bulk writes that bypass signals must call apply_deltas() themselves.
+
+Every group also has a ledger version in the cache, bumped whenever its
+ledger changes; views cache what they compute from it under keys that
+include the version.
+"""
+import time
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import groups, GroupBalance, DebtEdge, ExpensePayment, ExpenseSplit
+from .balances import aggregate_balances
+from .simplify import simplify_debts
+
+CENT = Decimal('0.01')
+# A currency whose balances are further off zero than this is flagged by
+# group_detail as a ledger error and gets no debts
+LEDGER_TOLERANCE = Decimal('0.05')
+
+
+def to_cents(value):
+    """Round a value the same way it is stored in the 2-decimal amount columns."""
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def row_delta(row):
+    """Balance contribution of a single ExpensePayment (+) or ExpenseSplit (-)."""
+    if isinstance(row, ExpensePayment):
+        return to_cents(row.amount)
+    return -to_cents(row.amount_owed)
+
+
+def version_key(group_id):
+    return f'groups:ledger:version:{group_id}'
+
+
+def ledger_versions(group_ids):
+    """{group_id: version} from one cache lookup; a version changes whenever that group's ledger does."""
+    keys = {version_key(group_id): group_id for group_id in group_ids}
+    found = cache.get_many(keys)
+    # Seeded from the clock so an evicted version never reuses an old number
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {group_id: found[key] for key, group_id in keys.items()}
+
+
+def _bump(group_ids):
+    # incr is atomic on Redis and Memcached, but FileBasedCache (and the
+    # database cache) does a get and a set: two concurrent bumps can land on
+    # the same version. Bumping again on commit covers most of that window.
+    for group_id in group_ids:
+        try:
+            cache.incr(version_key(group_id))
+        except ValueError:
+            # Not cached yet: nothing cached under the old version can exist either
+            pass
+
+
+def bump_versions(group_ids):
+    group_ids = set(group_ids)
+    _bump(group_ids)
+    # A request may have cached the old ledger under the new version before we commit
+    transaction.on_commit(lambda: _bump(group_ids))
+
+
+def apply_deltas(deltas):
+    """
+    Add {(group_id, currency, user_id): Decimal} to the stored balances.
+
+    Costs a fixed handful of statements however many members are touched:
+    missing rows are created at zero first (ignoring races with concurrent
+    writers) and every row is then incremented in one bulk UPDATE.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        rows = _balance_rows(deltas)
+        missing = [key for key in deltas if key not in rows]
+        if missing:
+            GroupBalance.objects.bulk_create([
+                GroupBalance(group_id=group_id, currency=currency, user_id=user_id, amount=0)
+                for group_id, currency, user_id in missing
+            ], ignore_conflicts=True)
+            rows = _balance_rows(deltas)
+        for key, row in rows.items():
+            row.amount = F('amount') + deltas[key]
+        GroupBalance.objects.bulk_update(rows.values(), ['amount'], batch_size=500)
+        refresh_edges({(group_id, currency) for group_id, currency, _ in deltas})
+    bump_versions(group_id for group_id, _, _ in deltas)
+
+
+def refresh_edges(pairs):
+    """
+    Recompute the DebtEdge rows of the given (group_id, currency) pairs from
+    the stored balances: one read, one DELETE and one INSERT. Call it inside
+    the transaction that changed the balances.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return
+    nets = defaultdict(dict)
+    rows = GroupBalance.objects.filter(
+        group_id__in={group_id for group_id, _ in pairs}, currency__in={currency for _, currency in pairs}
+    ).order_by('user_id').values_list('group_id', 'currency', 'user_id', 'amount')
+    for group_id, currency, user_id, amount in rows:
+        if (group_id, currency) in pairs:
+            nets[(group_id, currency)][user_id] = amount
+
+    edges = []
+    for (group_id, currency), balances in nets.items():
+        if abs(sum(balances.values())) > LEDGER_TOLERANCE:
+            continue
+        for debt in simplify_debts(balances):
+            edges.append(DebtEdge(group_id=group_id, currency=currency, debtor_id=debt['debtor'],
+                                  creditor_id=debt['creditor'], amount=debt['amount']))
+    scope = Q()
+    for group_id, currency in pairs:
+        scope |= Q(group_id=group_id, currency=currency)
+    DebtEdge.objects.filter(scope).delete()
+    DebtEdge.objects.bulk_create(edges, batch_size=500)
+
+
+def rebuild_edges(group_ids=None, batch_size=500):
+    """Recompute every DebtEdge (of group_ids), e.g. after the balances were fixed by hand."""
+    balances = GroupBalance.objects.all()
+    edges = DebtEdge.objects.all()
+    if group_ids is not None:
+        balances = balances.filter(group__in=group_ids)
+        edges = edges.filter(group__in=group_ids)
+    pairs = sorted(set(balances.values_list('group_id', 'currency').distinct())
+                   | set(edges.values_list('group_id', 'currency').distinct()))
+    for start in range(0, len(pairs), batch_size):
+        with transaction.atomic():
+            batch = pairs[start:start + batch_size]
+            refresh_edges(batch)
+            bump_versions(group_id for group_id, _ in batch)
+
+
+def _balance_rows(keys):
+    group_ids = {group_id for group_id, _, _ in keys}
+    currencies = {currency for _, currency, _ in keys}
+    user_ids = {user_id for _, _, user_id in keys}
+    candidates = GroupBalance.objects.filter(
+        group_id__in=group_ids, currency__in=currencies, user_id__in=user_ids
+    ).only('id', 'group_id', 'currency', 'user_id')
+    rows = {}
+    for row in candidates:
+        key = (row.group_id, row.currency, row.user_id)
+        if key in keys:
+            rows[key] = row
+    return rows
+
+
+def expense_deltas(expense, group_id=None, currency=None, sign=1):
+    """
+    Contribution of the live payments and splits of an expense, booked under
+    (group_id, currency) which default to the expense's own.
+    """
+    group_id = group_id or expense.group_id
+    currency = currency or expense.currency
+    deltas = defaultdict(Decimal)
+    for user_id, amount in ExpensePayment.objects.filter(expense=expense).values_list('user_id', 'amount'):
+        deltas[(group_id, currency, user_id)] += sign * amount
+    for user_id, amount in ExpenseSplit.objects.filter(expense=expense).values_list('user_id', 'amount_owed'):
+        deltas[(group_id, currency, user_id)] -= sign * amount
+    return deltas
+
+
+def compute_balances(group_ids=None):
+    """
+    Recompute balances from the raw ledger rows, rounded like the stored ones.
+    Returns {(group_id, currency, user_id): Decimal}.
+    """
+    return {key: to_cents(amount) for key, amount in aggregate_balances(group_ids).items()}
+
+
+def _drift(stored, expected):
+    """Sorted (key, stored, expected) for every balance that differs."""
+    drift = []
+    for key in set(expected) | set(stored):
+        have = stored.get(key, Decimal('0.00'))
+        want = expected.get(key, Decimal('0.00'))
+        if have != want:
+            drift.append((key, have, want))
+    drift.sort()
+    return drift
+
+
+def rebuild(group_ids=None, dry_run=False):
+    """
+    Compare the stored balances with the raw ledger and fix any drift.
+    Returns a list of (key, stored, expected) for every mismatching entry.
+    """
+    expected = compute_balances(group_ids)
+    stored_rows = GroupBalance.objects.all()
+    if group_ids is not None:
+        stored_rows = stored_rows.filter(group__in=group_ids)
+    stored = {
+        (row['group'], row['currency'], row['user']): row['amount']
+        for row in stored_rows.values('group', 'currency', 'user', 'amount')
+    }
+
+    drift = _drift(stored, expected)
+
+    if drift and not dry_run:
+        with transaction.atomic():
+            for (group_id, currency, user_id), _, want in drift:
+                GroupBalance.objects.update_or_create(
+                    group_id=group_id, currency=currency, user_id=user_id,
+                    defaults={'amount': want},
+                )
+            refresh_edges({(group_id, currency) for (group_id, currency, _), _, _ in drift})
+        bump_versions(group_id for (group_id, _, _), _, _ in drift)
+    return drift
+
+
+def check(first_id, last_id, tolerance=Decimal('0.05')):
+    """
+    Integrity check of groups first_id..last_id in three grouped aggregates.
+
+    Returns (imbalanced, drifted): the (group_id, currency, net) whose
+    payments and splits don't cancel out within tolerance (rounded equal
+    splits leave a cent here and there), and the (key, stored, expected)
+    balances that differ from the raw ledger.
+    """
+    group_ids = groups.objects.filter(pk__range=(first_id, last_id)).values('pk')
+    expected = compute_balances(group_ids)
+    stored = {
+        (group_id, currency, user_id): amount
+        for group_id, currency, user_id, amount in GroupBalance.objects.filter(
+            group__in=group_ids
+        ).values_list('group', 'currency', 'user', 'amount')
+    }
+
+    nets = defaultdict(Decimal)
+    for (group_id, currency, _), amount in expected.items():
+        nets[(group_id, currency)] += amount
+    imbalanced = sorted(
+        (group_id, currency, net) for (group_id, currency), net in nets.items() if abs(net) > tolerance
+    )
+    return imbalanced, _drift(stored, expected)
@@ -0,0 +1,39 @@
+"""
+Worker processes of `manage.py check_ledger --workers N`.
+
+Nothing here imports a model at import time, so this module can be loaded
+by a worker started with any multiprocessing start method: forked workers
+inherit a set-up Django, while spawned or forkserver ones (the Windows,
+macOS and Python 3.14+ defaults) start from a bare interpreter. init() sets
+Django up in the worker before the first model is imported.
+"""
+import django
+
+
+def database_names():
+    """{alias: NAME} of the parent's databases, for init(); a test run renames them."""
+    from django.db import connections
+    return {alias: connections[alias].settings_dict['NAME'] for alias in connections}
+
+
+def init(names):
+    from django.conf import settings
+    # DJANGO_SETTINGS_MODULE comes with the environment, but not what the
+    # parent changed at runtime, e.g. the test database names
+    for alias, name in names.items():
+        settings.DATABASES[alias]['NAME'] = name
+    django.setup()
+
+    from django.db import connections
+    # Forked workers must not share the parent's database connections
+    connections.close_all()
+
+
+def check_range(args):
+    from django.db import connections
+    from groups import ledger
+    first_id, last_id, tolerance = args
+    try:
+        return ledger.check(first_id, last_id, tolerance)
+    finally:
+        connections.close_all()
@@ -0,0 +1,68 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Max, Min
+
+from groups import ledger, ledger_workers
+from groups.models import groups
+
+
+class Command(BaseCommand):
+    help = ("Check that every group's ledger balances per currency and that the stored balances match "
+            "the raw payments and splits. Prints a JSON report and exits with status 1 when anything is off.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--range-size', type=int, default=5000,
+                            help="Groups per checked id range (default: 5000).")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Ranges checked in parallel, one process each (default: CPU count).")
+        parser.add_argument('--tolerance', type=Decimal, default=Decimal('0.05'),
+                            help="Largest net a group may be off by from rounding (default: 0.05).")
+
+    def handle(self, *args, **options):
+        bounds = groups.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        size = max(options['range_size'], 1)
+        ranges = []
+        if bounds['first'] is not None:
+            ranges = [
+                (start, min(start + size - 1, bounds['last']), options['tolerance'])
+                for start in range(bounds['first'], bounds['last'] + 1, size)
+            ]
+
+        workers = min(options['workers'], len(ranges))
+        if workers > 1:
+            names = ledger_workers.database_names()
+            connections.close_all()
+            # The workers run groups/ledger_workers.py, which sets Django up itself,
+            # so the platform's default start method will do
+            with ProcessPoolExecutor(max_workers=workers, initializer=ledger_workers.init,
+                                     initargs=(names,)) as pool:
+                results = list(pool.map(ledger_workers.check_range, ranges))
+        else:
+            results = [ledger.check(*args) for args in ranges]
+
+        imbalanced = [
+            {'group': group_id, 'currency': currency, 'net': net}
+            for found, _ in results for group_id, currency, net in found
+        ]
+        drifted = [
+            {'group': group_id, 'currency': currency, 'user': user_id, 'stored': stored, 'expected': expected}
+            for _, found in results for (group_id, currency, user_id), stored, expected in found
+        ]
+        report = {
+            'ranges': len(ranges),
+            'imbalanced_groups': sorted({row['group'] for row in imbalanced}),
+            'drifted_groups': sorted({row['group'] for row in drifted}),
+            'imbalanced': imbalanced,
+            'drifted': drifted,
+        }
+        self.stdout.write(json.dumps(report, cls=DjangoJSONEncoder, indent=2))
+        if imbalanced or drifted:
+            raise CommandError(
+                f"{len(imbalanced)} imbalanced ledger(s), {len(drifted)} drifted balance(s).", returncode=1
+            )
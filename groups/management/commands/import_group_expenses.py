@@ -0,0 +1,38 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from groups import importer
+from groups.models import groups
+
+
+class Command(BaseCommand):
+    help = "Import a group's expenses from a Splitwise-style CSV export."
+
+    def add_arguments(self, parser):
+        parser.add_argument('group_id', type=int)
+        parser.add_argument('path', help="CSV file to import.")
+        parser.add_argument('--as', dest='username',
+                            help="Member the import is made by (named in the summary notification, which they don't get).")
+        parser.add_argument('--batch-size', type=int,
+                            help="Expenses per bulk INSERT (default: GROUP_IMPORT_BATCH_SIZE).")
+
+    def handle(self, *args, **options):
+        group = groups.objects.filter(pk=options['group_id'], deleted=0).first()
+        if group is None:
+            raise CommandError(f"Group {options['group_id']} does not exist.")
+        actor = None
+        if options['username']:
+            actor = User.objects.filter(username=options['username']).first()
+            if actor is None:
+                raise CommandError(f"User '{options['username']}' does not exist.")
+
+        with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+            result = importer.import_group_expenses(group, lines, actor, batch_size=options['batch_size'])
+
+        for line, message in result.errors:
+            self.stdout.write(f"line {line}: {message}")
+        if result.errors:
+            raise CommandError(f"Nothing imported: {max(result.failed, len(result.errors))} problem(s) found.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} expense(s) into '{group.name}', skipped {result.skipped}."
+        ))
@@ -0,0 +1,72 @@
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from groups import ledger
+from groups.models import BackfillCheckpoint, ExpensePayment, GroupExpense
+
+CHECKPOINT = 'migrate_payments'
+
+
+class Command(BaseCommand):
+    help = ("Create the ExpensePayment row (paid_by paid the full amount) for live group expenses that "
+            "have none. Works in batches and resumes where an interrupted run stopped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Expenses per batch (default: 1000).")
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignore the saved checkpoint and scan from the first expense.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Count the expenses missing a payment without creating anything.")
+
+    def handle(self, *args, **options):
+        checkpoint = BackfillCheckpoint.objects.filter(name=CHECKPOINT).first()
+        last_id = checkpoint.last_id if checkpoint and not options['restart'] else 0
+        # Anti-join; retired (soft-deleted) payments count too, so edited expenses are left alone
+        pending = GroupExpense.objects.filter(
+            ~Exists(ExpensePayment.all_objects.filter(expense=OuterRef('pk'))), pk__gt=last_id
+        )
+        if last_id:
+            self.stdout.write(f"Resuming after expense {last_id}.")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{pending.count()} expense(s) have no payment."))
+            return
+
+        if checkpoint is None:
+            checkpoint = BackfillCheckpoint.objects.create(name=CHECKPOINT)
+        started = time.monotonic()
+        created = 0
+        while True:
+            batch = list(
+                pending.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', 'group_id', 'currency', 'paid_by_id', 'amount')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            with transaction.atomic():
+                # bulk_create skips the balance signals, so book the payments here
+                deltas = defaultdict(Decimal)
+                ExpensePayment.objects.bulk_create([
+                    ExpensePayment(expense_id=pk, user_id=paid_by_id, amount=amount)
+                    for pk, _, _, paid_by_id, amount in batch
+                ])
+                for _, group_id, currency, paid_by_id, amount in batch:
+                    deltas[(group_id, currency, paid_by_id)] += ledger.to_cents(amount)
+                ledger.apply_deltas(deltas)
+                last_id = batch[-1][0]
+                BackfillCheckpoint.objects.filter(pk=checkpoint.pk).update(last_id=last_id)
+            created += len(batch)
+            self.stdout.write(f"{created} payment(s) created, up to expense {last_id} ({self._rate(created, started)}).")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created} payment(s) in {time.monotonic() - started:.1f}s ({self._rate(created, started)})."
+        ))
+
+    def _rate(self, count, started):
+        return f"{count / max(time.monotonic() - started, 1e-6):.0f}/s"
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_balances(apps, schema_editor):
+    ExpensePayment = apps.get_model('groups', 'ExpensePayment')
+    ExpenseSplit = apps.get_model('groups', 'ExpenseSplit')
+    GroupBalance = apps.get_model('groups', 'GroupBalance')
+
+    balances = {}
+    payments = ExpensePayment.objects.filter(deleted=False, expense__deleted=False)
+    for row in payments.values('expense__group', 'expense__currency', 'user').annotate(total=Sum('amount')):
+        key = (row['expense__group'], row['expense__currency'], row['user'])
+        balances[key] = balances.get(key, 0) + row['total']
+    splits = ExpenseSplit.objects.filter(deleted=False, expense__deleted=False)
+    for row in splits.values('expense__group', 'expense__currency', 'user').annotate(total=Sum('amount_owed')):
+        key = (row['expense__group'], row['expense__currency'], row['user'])
+        balances[key] = balances.get(key, 0) - row['total']
+
+    GroupBalance.objects.bulk_create([
+        GroupBalance(group_id=group_id, currency=currency, user_id=user_id, amount=amount)
+        for (group_id, currency, user_id), amount in balances.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0007_remove_expensesplit_paid_remove_groups_updated_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='groups.groups')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group_balances', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'group'], name='groupbalance_user_group_idx')],
+                'constraints': [models.UniqueConstraint(fields=('group', 'currency', 'user'), name='unique_group_balance')],
+            },
+        ),
+        migrations.RunPython(populate_balances, migrations.RunPython.noop),
+    ]
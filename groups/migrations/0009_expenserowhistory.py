@@ -0,0 +1,30 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0008_groupbalance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseRowHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('PAYMENT', 'Payment'), ('SPLIT', 'Split')], max_length=10)),
+                ('action', models.CharField(choices=[('ADDED', 'Added'), ('CHANGED', 'Changed'), ('REMOVED', 'Removed')], max_length=10)),
+                ('old_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('new_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('expense', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='row_history', to='groups.groupexpense')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
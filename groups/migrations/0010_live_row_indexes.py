@@ -0,0 +1,35 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0009_expenserowhistory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expensepayment',
+            index=models.Index(fields=['expense', 'deleted'], name='payment_expense_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expensesplit',
+            index=models.Index(fields=['expense', 'deleted'], name='split_expense_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupexpense',
+            index=models.Index(fields=['group', 'deleted', '-created_at'], name='gexpense_group_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupexpense',
+            index=models.Index(fields=['group', 'deleted', 'currency'], name='gexpense_group_currency_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupexpense',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['group', '-created_at'], name='gexpense_live_group_idx'),
+        ),
+    ]
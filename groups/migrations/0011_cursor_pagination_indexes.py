@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 17:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0010_live_row_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='groupexpense',
+            name='gexpense_live_group_idx',
+        ),
+        migrations.AddIndex(
+            model_name='groupexpense',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['group', '-created_at', '-id'], name='gexpense_live_group_idx'),
+        ),
+    ]
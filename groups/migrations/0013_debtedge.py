@@ -0,0 +1,53 @@
+# Generated by Django 5.1.5 on 2026-10-18 18:15
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from groups.simplify import simplify_debts
+
+
+def populate_edges(apps, schema_editor):
+    GroupBalance = apps.get_model('groups', 'GroupBalance')
+    DebtEdge = apps.get_model('groups', 'DebtEdge')
+    nets = {}
+    for group_id, currency, user_id, amount in GroupBalance.objects.order_by('user_id').values_list(
+        'group_id', 'currency', 'user_id', 'amount'
+    ):
+        nets.setdefault((group_id, currency), {})[user_id] = amount
+    edges = []
+    for (group_id, currency), balances in nets.items():
+        if abs(sum(balances.values())) > Decimal('0.05'):
+            continue
+        for debt in simplify_debts(balances):
+            edges.append(DebtEdge(group_id=group_id, currency=currency, debtor_id=debt['debtor'],
+                                  creditor_id=debt['creditor'], amount=debt['amount']))
+    DebtEdge.objects.bulk_create(edges, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0012_backfillcheckpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DebtEdge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('creditor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='debts_due', to=settings.AUTH_USER_MODEL)),
+                ('debtor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='debts_owed', to=settings.AUTH_USER_MODEL)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='debt_edges', to='groups.groups')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('group', 'currency', 'debtor', 'creditor'), name='unique_debt_edge')],
+            },
+        ),
+        migrations.RunPython(populate_edges, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def backfill_deleted_at(apps, schema_editor):
+    # Archiving used to count from the expense's created_at; keep that for rows already deleted
+    GroupExpense = apps.get_model('groups', 'GroupExpense')
+    GroupExpense._base_manager.filter(deleted=True).update(deleted_at=F('created_at'))
+    created_at = Subquery(GroupExpense._base_manager.filter(pk=OuterRef('expense_id')).values('created_at')[:1])
+    for name in ('ExpenseSplit', 'ExpensePayment'):
+        apps.get_model('groups', name)._base_manager.filter(deleted=True).update(deleted_at=created_at)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0013_debtedge'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expensepayment',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='expensesplit',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='groupexpense',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='expensepayment',
+            name='expense',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='groups.groupexpense'),
+        ),
+        migrations.AlterField(
+            model_name='expensesplit',
+            name='expense',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='splits', to='groups.groupexpense'),
+        ),
+        migrations.RunPython(backfill_deleted_at, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from project.softdelete import SoftDeleteModel
 
 # Create your models here.
 
@@ -14,36 +15,109 @@ class groups(models.Model):
     def __str__(self):
         return self.name
 
-class GroupExpense(models.Model):
+class GroupExpense(SoftDeleteModel):
     group = models.ForeignKey(groups, on_delete=models.CASCADE, related_name='expenses')
     description = models.CharField(max_length=255)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=10, choices=[('USD', 'USD'), ('EUR', 'EUR'), ('INR', 'INR'), ('GBP', 'GBP')], default='USD')
     paid_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='paid_expenses')
     created_at = models.DateTimeField(auto_now_add=True)
-    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # group_detail: live expenses of a group, newest first
+            models.Index(fields=['group', 'deleted', '-created_at'], name='gexpense_group_created_idx'),
+            # Currencies in use by a group
+            models.Index(fields=['group', 'deleted', 'currency'], name='gexpense_group_currency_idx'),
+            # Only live rows, for backends with partial indexes (not MySQL)
+            models.Index(fields=['group', '-created_at', '-id'], condition=models.Q(deleted=False), name='gexpense_live_group_idx'),
+        ]
 
     def __str__(self):
         return f"{self.description} - {self.amount} {self.currency}"
 
-class ExpenseSplit(models.Model):
-    expense = models.ForeignKey(GroupExpense, on_delete=models.CASCADE, related_name='splits')
+class ExpenseSplit(SoftDeleteModel):
+    # split_expense_deleted_idx starts with expense, so the foreign key needs no index of its own
+    expense = models.ForeignKey(GroupExpense, on_delete=models.CASCADE, related_name='splits', db_index=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     amount_owed = models.DecimalField(max_digits=10, decimal_places=2)
-    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expense', 'deleted'], name='split_expense_deleted_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} owes {self.amount_owed}"
 
-class ExpensePayment(models.Model):
-    expense = models.ForeignKey(GroupExpense, on_delete=models.CASCADE, related_name='payments')
+class ExpensePayment(SoftDeleteModel):
+    # payment_expense_deleted_idx starts with expense, so the foreign key needs no index of its own
+    expense = models.ForeignKey(GroupExpense, on_delete=models.CASCADE, related_name='payments', db_index=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
-    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expense', 'deleted'], name='payment_expense_deleted_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} paid {self.amount}"
 
+class ExpenseRowHistory(models.Model):
+    # Audit trail of payment/split changes made by expense edits. Kept out of
+    # the hot ExpensePayment/ExpenseSplit tables so balance queries stay small.
+    KINDS = (('PAYMENT', 'Payment'), ('SPLIT', 'Split'))
+    ACTIONS = (('ADDED', 'Added'), ('CHANGED', 'Changed'), ('REMOVED', 'Removed'))
+
+    expense = models.ForeignKey(GroupExpense, on_delete=models.CASCADE, related_name='row_history')
+    kind = models.CharField(max_length=10, choices=KINDS)
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    old_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    new_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_action_display()} {self.kind.lower()} of {self.user.username}: {self.old_amount} -> {self.new_amount}"
+
+class GroupBalance(models.Model):
+    # Running net balance (total paid - total owed) of a member in one currency.
+    # Maintained by groups/ledger.py, rebuild with `manage.py rebuild_group_balances`.
+    group = models.ForeignKey(groups, on_delete=models.CASCADE, related_name='balances')
+    currency = models.CharField(max_length=10)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='group_balances')
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'currency', 'user'], name='unique_group_balance'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'group'], name='groupbalance_user_group_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.amount} {self.currency}"
+
+class DebtEdge(models.Model):
+    # Simplified "who owes whom" of a group in one currency, derived from
+    # GroupBalance and refreshed by groups/ledger.py whenever balances change.
+    group = models.ForeignKey(groups, on_delete=models.CASCADE, related_name='debt_edges')
+    currency = models.CharField(max_length=10)
+    debtor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='debts_owed')
+    creditor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='debts_due')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'currency', 'debtor', 'creditor'], name='unique_debt_edge'),
+        ]
+
+    def __str__(self):
+        return f"{self.debtor.username} owes {self.creditor.username} {self.amount} {self.currency}"
+
 class GroupInvitation(models.Model):
     group = models.ForeignKey(groups, on_delete=models.CASCADE, related_name='invitations')
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_invitations')
@@ -53,3 +127,13 @@ class GroupInvitation(models.Model):
 
     def __str__(self):
         return f"Invitation from {self.sender} to {self.receiver} for {self.group}"
+
+class BackfillCheckpoint(models.Model):
+    # How far a resumable data backfill (e.g. `manage.py migrate_payments`) got:
+    # the last primary key it finished, committed together with that batch.
+    name = models.CharField(max_length=100, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_id}"
@@ -0,0 +1,94 @@
+"""
+Cross-group netting: what a user and each counterparty owe each other over
+all the groups they share, per currency.
+
+Computed from the DebtEdge rows the ledger keeps up to date, with one grouped
+aggregate for all groups, and settled in one transaction that writes a
+settlement expense in every group involved.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from notifications.models import Notification
+from .models import DebtEdge, GroupExpense, ExpensePayment, ExpenseSplit
+from . import ledger
+
+
+def _edges_between(user, counterparty=None):
+    pair = Q(debtor=user) | Q(creditor=user)
+    if counterparty is not None:
+        pair = Q(debtor=user, creditor=counterparty) | Q(debtor=counterparty, creditor=user)
+    return DebtEdge.objects.filter(pair, group__deleted=False)
+
+
+def net_positions(user):
+    """
+    [{'counterparty', 'currency', 'amount', 'groups'}] for every person user
+    has debts with, netted over all shared groups: amount > 0 means they owe
+    user, < 0 that user owes them. Biggest amounts first; two queries.
+    """
+    nets = defaultdict(lambda: [Decimal('0.00'), 0])
+    rows = _edges_between(user).values('debtor', 'creditor', 'currency').annotate(
+        total=Sum('amount'), groups=Count('group', distinct=True)
+    ).order_by()
+    for row in rows:
+        if row['creditor'] == user.id:
+            net = nets[(row['debtor'], row['currency'])]
+            net[0] += row['total']
+        else:
+            net = nets[(row['creditor'], row['currency'])]
+            net[0] -= row['total']
+        net[1] += row['groups']
+
+    people = User.objects.in_bulk({user_id for user_id, _ in nets})
+    positions = [
+        {'counterparty': people[user_id], 'currency': currency, 'amount': amount, 'groups': groups}
+        for (user_id, currency), (amount, groups) in nets.items()
+    ]
+    positions.sort(key=lambda p: (-abs(p['amount']), p['counterparty'].username, p['currency']))
+    return positions
+
+
+@transaction.atomic
+def settle_all(user, counterparty, currency):
+    """
+    Settle every debt between user and counterparty in currency, in every
+    shared group, as if user paid counterparty the net amount. Returns
+    (net paid, number of groups), or None if user is owed money overall or
+    there is nothing to settle.
+    """
+    edges = list(_edges_between(user, counterparty).filter(currency=currency).select_for_update().order_by('group_id'))
+    net = sum((edge.amount if edge.debtor_id == user.id else -edge.amount for edge in edges), Decimal('0.00'))
+    if not edges or net < 0:
+        return None
+
+    payments = []
+    splits = []
+    deltas = defaultdict(Decimal)
+    for edge in edges:
+        debtor, creditor = (user, counterparty) if edge.debtor_id == user.id else (counterparty, user)
+        expense = GroupExpense.objects.create(
+            group_id=edge.group_id, description=f"Settlement to {creditor.username}",
+            amount=edge.amount, currency=currency, paid_by=debtor,
+        )
+        payments.append(ExpensePayment(expense=expense, user=debtor, amount=edge.amount))
+        splits.append(ExpenseSplit(expense=expense, user=creditor, amount_owed=edge.amount))
+        deltas[(edge.group_id, currency, debtor.id)] += edge.amount
+        deltas[(edge.group_id, currency, creditor.id)] -= edge.amount
+    # Bulk rows skip the balance signals; the balances (and edges) are updated once
+    ExpensePayment.objects.bulk_create(payments)
+    ExpenseSplit.objects.bulk_create(splits)
+    ledger.apply_deltas(deltas)
+
+    groups_count = len({edge.group_id for edge in edges})
+    Notification.objects.create(
+        user=counterparty,
+        message=f"{user.username} settled up {currency} {net} with you across {groups_count} group(s).",
+        notification_type='SETTLEMENT',
+        related_link="/groups/balances/",
+    )
+    return net, groups_count
@@ -0,0 +1,159 @@
+"""
+Write path for group expenses.
+
+Payments, splits, balance updates and notifications for an expense are
+written with bulk statements inside one transaction, so a failure halfway
+can never leave a ledger that does not balance.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+
+from notifications.models import Notification
+from notifications import counters
+from .models import GroupExpense, ExpensePayment, ExpenseSplit, ExpenseRowHistory
+from . import ledger
+
+
+def equal_splits(amount, members):
+    """
+    {user_id: share} in whole cents adding up to exactly amount: the cents
+    that don't divide evenly go one each to the members with the lowest ids,
+    so the same expense always splits the same way.
+    """
+    members = sorted(members, key=lambda member: member.id)
+    cents = int(ledger.to_cents(amount) * 100)
+    share, remainder = divmod(cents, len(members))
+    return {
+        member.id: Decimal(share + (1 if index < remainder else 0)).scaleb(-2)
+        for index, member in enumerate(members)
+    }
+
+
+def _write_rows(expense, payments, splits):
+    """Bulk insert payments/splits given as {user_id: amount} and book them in the balances."""
+    payment_rows = ExpensePayment.objects.bulk_create([
+        ExpensePayment(expense=expense, user_id=user_id, amount=ledger.to_cents(amount))
+        for user_id, amount in payments.items()
+    ])
+    split_rows = ExpenseSplit.objects.bulk_create([
+        ExpenseSplit(expense=expense, user_id=user_id, amount_owed=ledger.to_cents(amount))
+        for user_id, amount in splits.items()
+    ])
+    deltas = defaultdict(Decimal)
+    for row in payment_rows + split_rows:
+        deltas[(expense.group_id, expense.currency, row.user_id)] += ledger.row_delta(row)
+    ledger.apply_deltas(deltas)
+
+
+@transaction.atomic
+def create_group_expense(expense, payments, splits, actor, members):
+    """
+    Save an unsaved GroupExpense with its payments and splits ({user_id: amount})
+    and notify the other members.
+    """
+    expense.save()
+    _write_rows(expense, payments, splits)
+
+    notifications = Notification.objects.bulk_create([
+        Notification(
+            user=member,
+            message=f"New expense '{expense.description}' added in '{expense.group.name}' by {actor.username}.",
+            notification_type='EXPENSE_ADD',
+            related_link=f"/groups/{expense.group_id}/"
+        )
+        for member in members if member != actor
+    ])
+    counters.notifications_created(notifications)
+    return expense
+
+
+@transaction.atomic
+def settle_up(group, debtor, creditor, currency, amount):
+    """Record debtor paying creditor amount as a settlement expense and notify the creditor."""
+    expense = GroupExpense(group=group, description=f"Settlement to {creditor.username}",
+                           amount=amount, currency=currency, paid_by=debtor)
+    expense.save()
+    _write_rows(expense, {debtor.id: amount}, {creditor.id: amount})
+    Notification.objects.create(
+        user=creditor,
+        message=f"{debtor.username} settled up {currency} {amount} with you.",
+        notification_type='SETTLEMENT',
+        related_link=f"/groups/{group.id}/"
+    )
+    return expense
+
+
+def _diff_rows(expense, model, wanted, actor):
+    """
+    Bring the live rows of one kind in line with wanted ({user_id: amount}).
+    Only changed rows are touched, in bulk; retired rows are removed from the
+    hot table and every change is logged in ExpenseRowHistory instead.
+    Returns the balance deltas.
+    """
+    field = 'amount' if model is ExpensePayment else 'amount_owed'
+    kind = 'PAYMENT' if model is ExpensePayment else 'SPLIT'
+    sign = 1 if model is ExpensePayment else -1
+    key = lambda user_id: (expense.group_id, expense.currency, user_id)
+
+    existing = {}
+    retired = []
+    for row in model.objects.filter(expense=expense).order_by('id'):
+        if row.user_id in existing:
+            retired.append(row) # Leftover duplicate from older edits
+        else:
+            existing[row.user_id] = row
+
+    wanted = {user_id: ledger.to_cents(amount) for user_id, amount in wanted.items()}
+    changed = []
+    created = []
+    history = []
+    deltas = defaultdict(Decimal)
+
+    for user_id, row in existing.items():
+        old = getattr(row, field)
+        if user_id not in wanted:
+            retired.append(row)
+        elif wanted[user_id] != old:
+            setattr(row, field, wanted[user_id])
+            changed.append(row)
+            deltas[key(user_id)] += sign * (wanted[user_id] - old)
+            history.append(ExpenseRowHistory(expense=expense, kind=kind, action='CHANGED', user_id=user_id,
+                                             old_amount=old, new_amount=wanted[user_id], changed_by=actor))
+    for user_id, amount in wanted.items():
+        if user_id not in existing:
+            created.append(model(expense=expense, user_id=user_id, **{field: amount}))
+            deltas[key(user_id)] += sign * amount
+            history.append(ExpenseRowHistory(expense=expense, kind=kind, action='ADDED', user_id=user_id,
+                                             new_amount=amount, changed_by=actor))
+    for row in retired:
+        deltas[key(row.user_id)] -= sign * getattr(row, field)
+        history.append(ExpenseRowHistory(expense=expense, kind=kind, action='REMOVED', user_id=row.user_id,
+                                         old_amount=getattr(row, field), changed_by=actor))
+
+    if changed:
+        model.objects.bulk_update(changed, [field])
+    if created:
+        model.objects.bulk_create(created)
+    if retired:
+        # Flag first so the post_delete handler knows the balances are already handled
+        retired_rows = model.all_objects.filter(pk__in=[row.pk for row in retired])
+        retired_rows.update(deleted=True)
+        retired_rows.delete()
+    ExpenseRowHistory.objects.bulk_create(history)
+    return deltas
+
+
+@transaction.atomic
+def update_group_expense(expense, payments, splits, actor=None):
+    """
+    Save an edited GroupExpense and update, add or retire only the payments
+    and splits that differ from the new {user_id: amount} sets.
+    """
+    expense.save()
+    deltas = _diff_rows(expense, ExpensePayment, payments, actor)
+    for key, delta in _diff_rows(expense, ExpenseSplit, splits, actor).items():
+        deltas[key] += delta
+    ledger.apply_deltas(deltas)
+    return expense
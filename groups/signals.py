@@ -0,0 +1,127 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.contrib.auth.models import User
+from django.dispatch import receiver
+
+from .models import groups, GroupExpense, ExpenseSplit, ExpensePayment
+from . import ledger
+
+# Keep GroupBalance in step with single-row writes to the ledger tables.
+# Queryset .update(), bulk_create() and bulk_update() skip these handlers and must go
+# through groups.ledger instead.
+
+
+def _row_key(row, expense):
+    return (expense.group_id, expense.currency, row.user_id)
+
+
+def _is_live(row, expense):
+    return not row.deleted and not expense.deleted
+
+
+def _apply(deltas, group_ids):
+    # apply_deltas bumps the ledger versions itself; a write that moves no
+    # balance (a description, a re-saved row) still changes what is shown
+    if any(deltas.values()):
+        ledger.apply_deltas(deltas)
+    else:
+        ledger.bump_versions(group_ids)
+
+
+@receiver(pre_save, sender=ExpensePayment)
+@receiver(pre_save, sender=ExpenseSplit)
+@receiver(pre_save, sender=GroupExpense)
+def remember_previous_state(sender, instance, raw=False, **kwargs):
+    instance._ledger_previous = None
+    if instance.pk and not raw:
+        qs = sender.all_objects.filter(pk=instance.pk)
+        if sender is not GroupExpense:
+            qs = qs.select_related('expense')
+        instance._ledger_previous = qs.first()
+
+
+@receiver(post_save, sender=ExpensePayment)
+@receiver(post_save, sender=ExpenseSplit)
+def update_balance_for_row(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = defaultdict(Decimal)
+    previous = getattr(instance, '_ledger_previous', None)
+    if previous is not None and _is_live(previous, previous.expense):
+        deltas[_row_key(previous, previous.expense)] -= ledger.row_delta(previous)
+    if _is_live(instance, instance.expense):
+        deltas[_row_key(instance, instance.expense)] += ledger.row_delta(instance)
+    _apply(deltas, [instance.expense.group_id])
+
+
+@receiver(post_delete, sender=ExpensePayment)
+@receiver(post_delete, sender=ExpenseSplit)
+def remove_balance_for_row(sender, instance, **kwargs):
+    if instance.deleted:
+        return
+    expense = GroupExpense.all_objects.filter(pk=instance.expense_id).first()
+    if expense is not None:
+        live = _is_live(instance, expense)
+        _apply({_row_key(instance, expense): -ledger.row_delta(instance)} if live else {}, [expense.group_id])
+
+
+@receiver(post_save, sender=GroupExpense)
+def update_balance_for_expense(sender, instance, created, raw=False, **kwargs):
+    # Soft-deleting, restoring or moving an expense to another currency/group
+    # moves all of its rows at once.
+    previous = getattr(instance, '_ledger_previous', None)
+    if raw:
+        return
+    deltas = defaultdict(Decimal)
+    group_ids = {instance.group_id}
+    if not created and previous is not None:
+        group_ids.add(previous.group_id)
+        was = (not previous.deleted, previous.group_id, previous.currency)
+        now = (not instance.deleted, instance.group_id, instance.currency)
+        if was != now:
+            if not previous.deleted:
+                for key, delta in ledger.expense_deltas(instance, previous.group_id, previous.currency, sign=-1).items():
+                    deltas[key] += delta
+            if not instance.deleted:
+                for key, delta in ledger.expense_deltas(instance).items():
+                    deltas[key] += delta
+    _apply(deltas, group_ids)
+
+
+@receiver(post_delete, sender=GroupExpense)
+def bump_version_for_deleted_expense(sender, instance, **kwargs):
+    ledger.bump_versions([instance.group_id])
+
+
+@receiver(post_save, sender=groups)
+def bump_version_for_group(sender, instance, raw=False, **kwargs):
+    # The group's name shows in cached views
+    if not raw:
+        ledger.bump_versions([instance.pk])
+
+
+@receiver(post_delete, sender=groups)
+def bump_version_for_deleted_group(sender, instance, **kwargs):
+    # Should the id ever be reused, nothing cached for the old group matches
+    ledger.bump_versions([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def bump_version_for_user(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Usernames show in the cached balance section and dashboard; logins only touch last_login
+    if raw or created or (update_fields is not None and 'username' not in update_fields):
+        return
+    ledger.bump_versions(instance.user_groups.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=groups.users.through)
+def bump_version_for_members(sender, instance, action, reverse, pk_set, **kwargs):
+    # Members without a balance still show in the balance section
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        ledger.bump_versions([instance.pk])
+    elif pk_set:
+        ledger.bump_versions(pk_set)
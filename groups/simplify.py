@@ -0,0 +1,179 @@
+"""
+Debt simplification: turn net balances into a list of "who pays whom".
+
+Engines work on integer minor units (cents) so the inner loops never touch
+Decimal. Each engine takes {key: cents} (positive = is owed money, negative =
+owes money) and returns [(debtor_key, creditor_key, cents)]. Keys are opaque
+(the views pass User objects); ties are broken by input order, so the same
+balances always give the same transfers.
+
+Pick the engine with settings.GROUP_DEBT_SIMPLIFIER ('greedy' or 'optimal').
+"""
+from decimal import Decimal
+
+from django.conf import settings
+
+# Balances within a cent either way count as settled
+TOLERANCE_CENTS = 1
+
+
+def to_minor_units(amount):
+    return int((Decimal(amount) * 100).to_integral_value())
+
+
+def from_minor_units(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+def _split(balances):
+    """Debtors and creditors as [key, cents] lists, largest amounts first."""
+    debtors = [[key, -cents] for key, cents in balances.items() if cents < -TOLERANCE_CENTS]
+    creditors = [[key, cents] for key, cents in balances.items() if cents > TOLERANCE_CENTS]
+    debtors.sort(key=lambda x: x[1], reverse=True)
+    creditors.sort(key=lambda x: x[1], reverse=True)
+    return debtors, creditors
+
+
+def _match(debtors, creditors):
+    """Settle the largest debtor against the largest creditor until one side runs out."""
+    transfers = []
+    i = 0
+    j = 0
+    while i < len(debtors) and j < len(creditors):
+        amount = min(debtors[i][1], creditors[j][1])
+        transfers.append((debtors[i][0], creditors[j][0], amount))
+        debtors[i][1] -= amount
+        creditors[j][1] -= amount
+        if debtors[i][1] < TOLERANCE_CENTS: i += 1
+        if creditors[j][1] < TOLERANCE_CENTS: j += 1
+    return transfers
+
+
+class Simplifier:
+    name = None
+
+    def simplify(self, balances):
+        raise NotImplementedError
+
+
+class GreedySimplifier(Simplifier):
+    """Largest debtor pays largest creditor. O(n log n), at most n - 1 transfers."""
+    name = 'greedy'
+
+    def simplify(self, balances):
+        return _match(*_split(balances))
+
+
+class OptimalSimplifier(Simplifier):
+    """
+    Minimum number of transfers.
+
+    A group whose balances split into k zero-sum subsets can be settled with
+    n - k transfers, so we look for the partition with the most zero-sum
+    subsets (bitmask DP over members with a non-zero balance) and settle each
+    subset on its own. That is exponential, so above max_members the engine
+    falls back to pairing exact matches first and greedy for the rest.
+    """
+    name = 'optimal'
+
+    def __init__(self, max_members=12):
+        self.max_members = max_members
+
+    def simplify(self, balances):
+        debtors, creditors = _split(balances)
+        if len(debtors) + len(creditors) > self.max_members:
+            return self._heuristic(debtors, creditors)
+
+        people = [(key, -cents) for key, cents in debtors] + creditors
+        transfers = []
+        for subset in self._zero_sum_subsets([cents for _, cents in people]):
+            sub_debtors = [[people[i][0], -people[i][1]] for i in subset if people[i][1] < 0]
+            sub_creditors = [[people[i][0], people[i][1]] for i in subset if people[i][1] > 0]
+            transfers.extend(_match(sub_debtors, sub_creditors))
+        return transfers
+
+    def _zero_sum_subsets(self, amounts):
+        n = len(amounts)
+        full = (1 << n) - 1
+        sums = [0] * (1 << n)
+        for mask in range(1, 1 << n):
+            low = mask & -mask
+            sums[mask] = sums[mask ^ low] + amounts[low.bit_length() - 1]
+
+        # best[mask]: most zero-sum groups the members in mask can be split into.
+        # The full set always closes a group, which absorbs rounding residue.
+        best = [0] * (1 << n)
+        for mask in range(1, 1 << n):
+            m = mask
+            top = 0
+            while m:
+                low = m & -m
+                value = best[mask ^ low]
+                if value > top:
+                    top = value
+                m ^= low
+            best[mask] = top + (1 if sums[mask] == 0 or mask == full else 0)
+
+        # Walk back from the full set removing one member at a time along an
+        # optimal path; every zero-sum set we pass through closes a group.
+        subsets = []
+        group = []
+        mask = full
+        while mask:
+            closes = 1 if sums[mask] == 0 or mask == full else 0
+            m = mask
+            while m:
+                low = m & -m
+                if best[mask ^ low] == best[mask] - closes:
+                    break
+                m ^= low
+            group.append(low.bit_length() - 1)
+            mask ^= low
+            if not mask or sums[mask] == 0:
+                subsets.append(group)
+                group = []
+        return subsets
+
+    def _heuristic(self, debtors, creditors):
+        transfers = []
+        open_creditors = {}
+        for index, (key, cents) in enumerate(creditors):
+            open_creditors.setdefault(cents, []).append(index)
+        for debtor in debtors:
+            matches = open_creditors.get(debtor[1])
+            if matches:
+                creditor = creditors[matches.pop(0)]
+                transfers.append((debtor[0], creditor[0], debtor[1]))
+                debtor[1] = 0
+                creditor[1] = 0
+        transfers.extend(_match(
+            [d for d in debtors if d[1] >= TOLERANCE_CENTS],
+            [c for c in creditors if c[1] >= TOLERANCE_CENTS],
+        ))
+        return transfers
+
+
+ENGINES = {
+    GreedySimplifier.name: GreedySimplifier,
+    OptimalSimplifier.name: OptimalSimplifier,
+}
+
+
+def get_simplifier(name=None):
+    name = name or getattr(settings, 'GROUP_DEBT_SIMPLIFIER', 'greedy')
+    if name == OptimalSimplifier.name:
+        return OptimalSimplifier(getattr(settings, 'GROUP_DEBT_OPTIMAL_MAX_MEMBERS', 12))
+    return ENGINES[name]()
+
+
+def simplify_debts(net_balances, simplifier=None):
+    """
+    Who owes whom for {member: Decimal} net balances.
+    Returns [{'debtor', 'creditor', 'amount'}] with Decimal amounts.
+    """
+    simplifier = simplifier or get_simplifier()
+    cents = {member: to_minor_units(balance) for member, balance in net_balances.items()}
+    return [
+        {'debtor': debtor, 'creditor': creditor, 'amount': from_minor_units(amount)}
+        for debtor, creditor, amount in simplifier.simplify(cents)
+    ]
@@ -0,0 +1,62 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from io import StringIO
+from decimal import Decimal
+from unittest import mock
+from .models import groups, GroupExpense, ExpensePayment, GroupBalance, BackfillCheckpoint
+from . import ledger
+
+class MigratePaymentsTests(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='user1', password='password')
+        self.user2 = User.objects.create_user(username='user2', password='password')
+        self.group = groups.objects.create(name="Old Group")
+        self.group.users.add(self.user1, self.user2)
+        # Expenses from before payments existed
+        GroupExpense.objects.bulk_create([
+            GroupExpense(group=self.group, description=f"Old {i}", amount=Decimal('10.00'), paid_by=self.user1 if i % 2 else self.user2)
+            for i in range(25)
+        ])
+        paid = GroupExpense.objects.create(group=self.group, description="Paid", amount=Decimal('5.00'), paid_by=self.user1)
+        ExpensePayment.objects.create(expense=paid, user=self.user2, amount=Decimal('5.00'))
+
+    def test_backfills_in_batches(self):
+        out = StringIO()
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('migrate_payments', '--batch-size', '10', stdout=out)
+        self.assertIn("Created 25 payment(s)", out.getvalue())
+        self.assertEqual(ExpensePayment.objects.count(), 26)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "groups_expensepayment"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(GroupBalance.objects.get(group=self.group, user=self.user1).amount, Decimal('120.00'))
+        self.assertEqual(ledger.rebuild(dry_run=True), [])
+
+        # Nothing left to do on a second run
+        out = StringIO()
+        call_command('migrate_payments', '--restart', stdout=out)
+        self.assertIn("Created 0 payment(s)", out.getvalue())
+
+    def test_dry_run_writes_nothing(self):
+        out = StringIO()
+        call_command('migrate_payments', '--dry-run', stdout=out)
+        self.assertIn("25 expense(s) have no payment", out.getvalue())
+        self.assertEqual(ExpensePayment.objects.count(), 1)
+        self.assertFalse(BackfillCheckpoint.objects.exists())
+
+    def test_resumes_from_checkpoint(self):
+        # Interrupted after the first batch
+        with mock.patch.object(ledger, 'apply_deltas', side_effect=[None, KeyboardInterrupt]):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('migrate_payments', '--batch-size', '10', stdout=StringIO())
+        self.assertEqual(ExpensePayment.objects.count(), 11)
+        checkpoint = BackfillCheckpoint.objects.get(name='migrate_payments')
+        self.assertEqual(checkpoint.last_id, GroupExpense.objects.order_by('pk')[9].pk)
+
+        out = StringIO()
+        call_command('migrate_payments', '--batch-size', '10', stdout=out)
+        self.assertIn(f"Resuming after expense {checkpoint.last_id}", out.getvalue())
+        self.assertIn("Created 15 payment(s)", out.getvalue())
+        self.assertEqual(ExpensePayment.objects.count(), 26)
@@ -0,0 +1,166 @@
+from unittest import mock
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from decimal import Decimal
+from .models import groups, GroupExpense, ExpenseSplit, ExpensePayment
+from . import balances, ledger
+
+class BalanceServiceTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='password')
+        self.client = Client()
+        self.client.login(username='owner', password='password')
+
+    def make_group(self, name, size):
+        group = groups.objects.create(name=name)
+        members = [self.owner] + [
+            User.objects.create(username=f'{name}-member{i}') for i in range(size - 1)
+        ]
+        group.users.add(*members)
+        # One expense per currency: owner pays, everyone splits equally
+        for currency in ['USD', 'EUR', 'INR']:
+            expense = GroupExpense.objects.create(group=group, amount=Decimal(size * 10), currency=currency, paid_by=self.owner)
+            ExpensePayment.objects.create(expense=expense, user=self.owner, amount=Decimal(size * 10))
+            for member in members:
+                ExpenseSplit.objects.create(expense=expense, user=member, amount_owed=Decimal('10.00'))
+        return group
+
+    def test_group_balances_values(self):
+        group = self.make_group('small', 3)
+        result = balances.group_balances(group)
+        self.assertEqual(set(result), {'USD', 'EUR', 'INR'})
+        self.assertEqual(result['USD'][self.owner], Decimal('20.00'))
+        self.assertEqual(sum(result['EUR'].values()), Decimal('0.00'))
+
+    def test_group_balances_query_count_is_constant(self):
+        small = self.make_group('small', 3)
+        large = self.make_group('large', 30)
+        with self.assertNumQueries(3):
+            balances.group_balances(small)
+        with self.assertNumQueries(3):
+            balances.group_balances(large)
+
+    def test_currency_balances_query_count(self):
+        group = self.make_group('large', 30)
+        with self.assertNumQueries(2):
+            result = balances.currency_balances(group, 'USD')
+        self.assertEqual(len(result), 30)
+
+    def test_user_group_balances_single_query(self):
+        first = self.make_group('first', 3)
+        second = self.make_group('second', 5)
+        with self.assertNumQueries(1):
+            result = balances.user_group_balances(self.owner, groups.objects.filter(users=self.owner))
+        self.assertEqual(len(result[first.id]), 3)
+        self.assertEqual(result[second.id][0]['amount'], Decimal('40.00'))
+
+    def test_aggregate_matches_stored(self):
+        group = self.make_group('small', 4)
+        aggregated = balances.aggregate_balances([group.id])
+        stored = balances.group_balances(group)
+        for (group_id, currency, user_id), amount in aggregated.items():
+            member = User.objects.get(pk=user_id)
+            self.assertEqual(stored[currency][member], amount)
+
+    def test_group_detail_query_count_independent_of_members(self):
+        small = self.make_group('small', 3)
+        large = self.make_group('large', 30)
+        # Same number of expenses, ten times the members: the balance section
+        # must not add queries per member.
+        # Warm the cached navbar notification count first (but not the balance section)
+        self.client.get(reverse('groups'))
+        def count(group):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('group_detail', args=[group.id]))
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries)
+        self.assertEqual(count(small), count(large))
+
+
+class BalanceFragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='password')
+        self.bob = User.objects.create_user(username='bob', password='password')
+        self.group = groups.objects.create(name='Trip')
+        self.group.users.add(self.alice, self.bob)
+        self.client = Client()
+        self.client.login(username='alice', password='password')
+        self.url = reverse('group_detail', args=[self.group.id])
+
+    def add_expense(self, amount, payer, ower):
+        expense = GroupExpense.objects.create(group=self.group, amount=Decimal(amount), currency='USD', paid_by=payer)
+        ExpensePayment.objects.create(expense=expense, user=payer, amount=Decimal(amount))
+        ExpenseSplit.objects.create(expense=expense, user=ower, amount_owed=Decimal(amount))
+        return expense
+
+    def balance_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        reads = [q for q in ctx.captured_queries
+                 if 'groups_groupbalance' in q['sql'] or 'groups_debtedge' in q['sql']]
+        return response, len(reads)
+
+    def test_repeat_views_use_the_cached_fragment(self):
+        self.add_expense('30.00', self.alice, self.bob)
+        response, reads = self.balance_queries()
+        self.assertGreater(reads, 0)
+        self.assertContains(response, '30.00 USD')
+
+        response, reads = self.balance_queries()
+        self.assertEqual(reads, 0)
+        self.assertIsNone(response.context['balances_by_currency'])
+        self.assertContains(response, '30.00 USD')
+
+    def test_every_kind_of_write_bumps_the_version(self):
+        def version():
+            return ledger.ledger_versions([self.group.id])[self.group.id]
+
+        seen = [version()]
+        expense = self.add_expense('30.00', self.alice, self.bob)
+        seen.append(version())
+        payment = expense.payments.get()
+        payment.save()  # Even a write that moves no balance
+        seen.append(version())
+        carol = User.objects.create_user(username='carol')
+        self.group.users.add(carol)
+        seen.append(version())
+        carol.user_groups.remove(self.group)
+        seen.append(version())
+        expense.deleted = True
+        expense.save()
+        seen.append(version())
+        self.bob.username = 'robert'
+        self.bob.save()
+        seen.append(version())
+        self.assertEqual(len(set(seen)), len(seen))
+
+        # Logging in saves only last_login
+        self.client.login(username='alice', password='password')
+        self.assertEqual(version(), seen[-1])
+
+    def test_a_row_write_bumps_once(self):
+        expense = self.add_expense('30.00', self.alice, self.bob)
+        payment = expense.payments.get()
+        for amount in ('40.00', '40.00'):  # Moves a balance, then moves none
+            with mock.patch.object(ledger, '_bump', wraps=ledger._bump) as bump:
+                with self.captureOnCommitCallbacks(execute=True):
+                    payment.amount = Decimal(amount)
+                    payment.save()
+            # Once right away and once on commit, not once per signal handler
+            self.assertEqual(bump.call_count, 2)
+
+    def test_settlement_is_never_served_stale(self):
+        self.add_expense('30.00', self.alice, self.bob)
+        self.assertNotContains(self.client.get(self.url), 'Settled up.')
+
+        self.client.login(username='bob', password='password')
+        self.assertContains(self.client.get(self.url), 'Pay')
+        self.client.get(reverse('settle_up', args=[self.group.id, self.alice.id, 'USD']))
+
+        self.client.login(username='alice', password='password')
+        self.assertContains(self.client.get(self.url), 'Settled up.')
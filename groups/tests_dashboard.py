@@ -0,0 +1,72 @@
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from decimal import Decimal
+from .models import groups, GroupExpense
+from .dashboard import dashboard
+from . import services
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='password')
+        self.bob = User.objects.create_user(username='bob', password='password')
+        self.carol = User.objects.create_user(username='carol', password='password')
+        self.trip = groups.objects.create(name="Trip")
+        self.flat = groups.objects.create(name="Flat")
+        self.trip.users.add(self.alice, self.bob, self.carol)
+        self.flat.users.add(self.alice, self.bob)
+        self.client = Client()
+        self.client.login(username='alice', password='password')
+
+    def expense(self, group, payer, ower, amount, currency='USD', description='Thing'):
+        expense = GroupExpense(group=group, description=description, amount=Decimal(amount), currency=currency, paid_by=payer)
+        services.create_group_expense(expense, {payer.id: Decimal(amount)}, {ower.id: Decimal(amount)}, payer, [])
+        return expense
+
+    def test_totals_counterparties_and_activity(self):
+        self.expense(self.trip, self.bob, self.alice, '30.00', description='Hotel')
+        self.expense(self.flat, self.alice, self.bob, '10.00', description='Rent')
+        self.expense(self.trip, self.alice, self.carol, '7.00', description='Taxi')
+        self.expense(self.flat, self.alice, self.bob, '4.00', 'EUR', description='Bread')
+        # alice is owed 10.00 in Flat and owes 23.00 in Trip; only the totals per group net out
+
+        with self.assertNumQueries(5):
+            data = dashboard(self.alice)
+        self.assertEqual(
+            [(t['currency'], t['owed'], t['owing']) for t in data['totals']],
+            [('EUR', Decimal('4.00'), Decimal('0.00')), ('USD', Decimal('10.00'), Decimal('23.00'))],
+        )
+        self.assertEqual(
+            [(c['username'], c['currency'], c['amount']) for c in data['counterparties']],
+            # Trip's debts simplify to carol paying bob directly
+            [('bob', 'USD', Decimal('-13.00')), ('bob', 'EUR', Decimal('4.00'))],
+        )
+        self.assertEqual([a['description'] for a in data['activity']], ['Bread', 'Taxi', 'Rent', 'Hotel'])
+        self.assertEqual(data['groups_count'], 2)
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'You owe 13.00 USD')
+        self.assertContains(response, 'Taxi')
+
+    def test_cached_until_a_ledger_changes(self):
+        self.expense(self.trip, self.bob, self.alice, '30.00')
+        dashboard(self.alice)
+        with self.assertNumQueries(1):
+            cached = dashboard(self.alice)
+        self.assertEqual(cached['totals'][0]['owing'], Decimal('30.00'))
+
+        # A write in a group alice shares, made by someone else
+        self.expense(self.trip, self.carol, self.bob, '5.00', description='Snacks')
+        self.assertEqual(dashboard(self.alice)['activity'][0]['description'], 'Snacks')
+
+        expense = self.expense(self.flat, self.alice, self.bob, '10.00')
+        self.assertEqual(dashboard(self.alice)['totals'][0]['owed'], Decimal('10.00'))
+        expense.deleted = True
+        expense.save()
+        self.assertEqual(dashboard(self.alice)['totals'][0]['owed'], Decimal('0.00'))
+
+        # Leaving a group changes the set of groups, and so the key
+        self.flat.users.remove(self.alice)
+        self.assertEqual(dashboard(self.alice)['groups_count'], 1)
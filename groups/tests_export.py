@@ -0,0 +1,56 @@
+import csv
+import gzip
+import io
+import json
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.urls import reverse
+from decimal import Decimal
+from .models import groups, GroupExpense, ExpenseSplit, ExpensePayment
+
+class GroupExportTests(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='user1', password='password')
+        self.user2 = User.objects.create_user(username='user2', password='password')
+        self.outsider = User.objects.create_user(username='outsider', password='password')
+        self.group = groups.objects.create(name="Export Group")
+        self.group.users.add(self.user1, self.user2)
+        expense = GroupExpense.objects.create(group=self.group, description="Dinner", amount=Decimal('30.00'), paid_by=self.user1)
+        ExpensePayment.objects.create(expense=expense, user=self.user1, amount=Decimal('30.00'))
+        ExpenseSplit.objects.create(expense=expense, user=self.user1, amount_owed=Decimal('15.00'))
+        ExpenseSplit.objects.create(expense=expense, user=self.user2, amount_owed=Decimal('15.00'))
+        # Soft-deleted expenses and rows are not part of the ledger
+        gone = GroupExpense.objects.create(group=self.group, description="Gone", amount=Decimal('5.00'), paid_by=self.user1, deleted=True)
+        ExpensePayment.objects.create(expense=gone, user=self.user1, amount=Decimal('5.00'))
+        self.client = Client()
+        self.client.login(username='user1', password='password')
+
+    def export(self, **params):
+        response = self.client.get(reverse('group_export', args=[self.group.id]), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_export(self):
+        response, body = self.export(format='csv')
+        self.assertIn('group-', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(rows[0], ['expense_id', 'date', 'entry', 'description', 'currency', 'user', 'amount'])
+        self.assertEqual([(row[2], row[5], row[6]) for row in rows[1:]], [
+            ('expense', 'user1', '30.00'),
+            ('payment', 'user1', '30.00'),
+            ('split', 'user1', '15.00'),
+            ('split', 'user2', '15.00'),
+        ])
+
+    def test_gzipped_jsonl_export(self):
+        response, body = self.export(format='jsonl', gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[0]['description'], 'Dinner')
+        self.assertEqual(lines[3]['amount'], '15.00')
+
+    def test_members_only(self):
+        self.client.login(username='outsider', password='password')
+        response = self.client.get(reverse('group_export', args=[self.group.id]))
+        self.assertEqual(response.status_code, 404)
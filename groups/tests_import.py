@@ -0,0 +1,126 @@
+import io
+import os
+import tempfile
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from decimal import Decimal
+from notifications.models import Notification
+from . import importer, ledger
+from .models import groups, GroupExpense, ExpenseSplit, ExpensePayment, GroupBalance
+
+SPLITWISE = """Date,Description,Category,Cost,Currency,Alice Smith,bob,Carol
+2023-01-05,Dinner,Dining out,90.00,USD,60.00,-30.00,-30.00
+2023-01-06,Taxi,Taxi,20.00,EUR,-10.00,10.00,0.00
+2023-01-07,Groceries,Groceries,30.00,USD,20.00,-10.00,-10.00
+2023-01-08,Own lunch,General,12.00,USD,0.00,0.00,0.00
+
+,Total balance,,,USD,80.00,-40.00,-40.00
+"""
+
+
+class GroupImportTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='password', first_name='Alice', last_name='Smith')
+        self.bob = User.objects.create_user(username='bob', password='password')
+        self.carol = User.objects.create_user(username='carol', password='password', first_name='Carol')
+        self.group = groups.objects.create(name="Trip")
+        self.group.users.add(self.alice, self.bob, self.carol)
+        self.client = Client()
+        self.client.login(username='alice', password='password')
+
+    def balance(self, user, currency='USD'):
+        return GroupBalance.objects.get(group=self.group, user=user, currency=currency).amount
+
+    def test_import_books_balances_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            result = importer.import_group_expenses(self.group, io.StringIO(SPLITWISE), self.alice)
+        self.assertEqual((result.created, result.skipped, result.errors), (3, 1, []))
+
+        dinner = GroupExpense.objects.get(description='Dinner')
+        self.assertEqual((dinner.amount, dinner.paid_by, dinner.created_at.date().isoformat()),
+                         (Decimal('90.00'), self.alice, '2023-01-05'))
+        self.assertEqual(ExpensePayment.objects.get(expense=dinner).amount, Decimal('90.00'))
+        self.assertEqual({s.user_id: s.amount_owed for s in ExpenseSplit.objects.filter(expense=dinner)},
+                         {self.alice.id: Decimal('30.00'), self.bob.id: Decimal('30.00'), self.carol.id: Decimal('30.00')})
+
+        self.assertEqual(self.balance(self.alice), Decimal('80.00'))
+        self.assertEqual(self.balance(self.bob), Decimal('-40.00'))
+        self.assertEqual(self.balance(self.bob, 'EUR'), Decimal('10.00'))
+        self.assertEqual(ledger.rebuild(dry_run=True), [])
+
+        # One summary notification per other member, no per-expense ones
+        self.assertEqual(sorted(Notification.objects.values_list('user__username', flat=True)), ['bob', 'carol'])
+        self.assertIn("3 expense(s) imported into 'Trip' by alice", Notification.objects.first().message)
+        # Bulk statements: the balances are touched in one go, not per row
+        updates = [q for q in ctx.captured_queries if 'groups_groupbalance' in q['sql'] and q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+
+    def test_large_import_uses_bulk_statements(self):
+        lines = ["Date,Description,Cost,Currency,alice,bob,carol"]
+        lines += [f"2023-02-01,Item {i},3.00,USD,2.00,-1.00,-1.00" for i in range(1000)]
+        with CaptureQueriesContext(connection) as ctx:
+            result = importer.import_group_expenses(self.group, lines, batch_size=250)
+        self.assertEqual(result.created, 1000)
+        # A handful of statements per batch (SQLite splits big INSERTs), none per expense
+        self.assertLess(len(ctx.captured_queries), 100)
+        self.assertEqual(self.balance(self.alice), Decimal('2000.00'))
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_invalid_row_imports_nothing(self):
+        data = SPLITWISE.replace('20.00,EUR', '20.00,XYZ').replace('-10.00,-10.00', '-10.00,-11.00')
+        result = importer.import_group_expenses(self.group, io.StringIO(data))
+        self.assertEqual(result.created, 0)
+        self.assertEqual([line for line, _ in result.errors], [3, 4])
+        self.assertFalse(GroupExpense.objects.exists())
+        self.assertFalse(GroupBalance.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+
+    def test_unknown_member_column(self):
+        result = importer.import_group_expenses(self.group, io.StringIO("Date,Description,Cost,alice,dave\n"))
+        self.assertEqual(result.errors, [(1, "Not a member of this group: dave.")])
+
+    def test_username_wins_over_names_and_shared_names_are_ambiguous(self):
+        # Another member whose first name is bob's username
+        bobby = User.objects.create_user(username='rsmith', first_name='Bob', last_name='Smith')
+        dana = User.objects.create_user(username='dana1', first_name='Dana')
+        other_dana = User.objects.create_user(username='dana2', first_name='Dana')
+        self.group.users.add(bobby, dana, other_dana)
+
+        data = "Date,Description,Cost,alice,bob,Bob Smith\n2023-01-05,Dinner,30.00,20.00,-10.00,-10.00\n"
+        result = importer.import_group_expenses(self.group, io.StringIO(data))
+        self.assertEqual(result.errors, [])
+        self.assertEqual(self.balance(self.bob), Decimal('-10.00'))
+        self.assertEqual(GroupBalance.objects.get(group=self.group, user=bobby).amount, Decimal('-10.00'))
+
+        result = importer.import_group_expenses(self.group, io.StringIO("Date,Description,Cost,alice,Dana\n"))
+        self.assertEqual(result.errors, [(1, "Ambiguous column(s), more than one member has that name: Dana.")])
+
+    def test_upload(self):
+        upload = SimpleUploadedFile('splitwise.csv', SPLITWISE.encode(), content_type='text/csv')
+        response = self.client.post(reverse('group_import', args=[self.group.id]), {'file': upload})
+        self.assertRedirects(response, reverse('group_detail', args=[self.group.id]))
+        self.assertEqual(GroupExpense.objects.filter(group=self.group).count(), 3)
+
+    def test_upload_requires_membership(self):
+        other = groups.objects.create(name="Other")
+        upload = SimpleUploadedFile('splitwise.csv', SPLITWISE.encode(), content_type='text/csv')
+        response = self.client.post(reverse('group_import', args=[other.id]), {'file': upload})
+        self.assertEqual(response.status_code, 404)
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write(SPLITWISE)
+        self.addCleanup(os.remove, handle.name)
+        out = io.StringIO()
+        call_command('import_group_expenses', self.group.id, handle.name, '--as', 'bob', stdout=out)
+        self.assertIn("Imported 3 expense(s)", out.getvalue())
+        self.assertEqual(sorted(Notification.objects.values_list('user__username', flat=True)), ['alice', 'carol'])
+
+        with self.assertRaises(CommandError):
+            call_command('import_group_expenses', 999, handle.name, stdout=io.StringIO())
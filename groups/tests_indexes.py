@@ -0,0 +1,32 @@
+from unittest import skipUnless
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import connection
+from .models import groups, GroupExpense, ExpenseSplit, ExpensePayment
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN output is backend specific")
+class GroupIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user1', password='password')
+        self.group = groups.objects.create(name="Index Group")
+        self.group.users.add(self.user)
+
+    def test_group_detail_expenses_use_live_index(self):
+        plan = GroupExpense.objects.filter(group=self.group).order_by('-created_at', '-id').explain()
+        self.assertIn('gexpense_live_group_idx', plan)
+        self.assertNotIn('ORDER BY', plan)
+
+    def test_group_currencies_use_covering_index(self):
+        plan = GroupExpense.objects.filter(group=self.group).values_list('currency', flat=True).distinct().explain()
+        self.assertIn('COVERING INDEX gexpense_group_currency_idx', plan)
+
+    def test_expense_rows_use_expense_index(self):
+        # The prefetch in group_detail: live rows of a page of expenses
+        self.assertIn('split_expense_deleted_idx', ExpenseSplit.objects.filter(expense_id__in=[1, 2]).explain())
+        self.assertIn('payment_expense_deleted_idx', ExpensePayment.objects.filter(expense_id__in=[1, 2]).explain())
+
+    def test_soft_deleted_rows_hidden_by_default(self):
+        expense = GroupExpense.objects.create(group=self.group, description="Gone", amount=10, paid_by=self.user, deleted=True)
+        self.assertFalse(GroupExpense.objects.filter(pk=expense.pk).exists())
+        self.assertTrue(GroupExpense.all_objects.filter(pk=expense.pk).exists())
+        self.assertEqual(list(self.group.expenses.all()), [])
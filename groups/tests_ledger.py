@@ -0,0 +1,205 @@
+import json
+import multiprocessing
+from unittest import skipIf
+from django.test import TestCase, TransactionTestCase, Client
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from io import StringIO
+from decimal import Decimal
+from .models import groups, GroupExpense, ExpenseSplit, ExpensePayment, GroupBalance, DebtEdge
+from . import ledger, services
+
+class GroupBalanceLedgerTests(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='user1', password='password')
+        self.user2 = User.objects.create_user(username='user2', password='password')
+        self.client = Client()
+        self.client.login(username='user1', password='password')
+
+        self.group = groups.objects.create(name="Ledger Group")
+        self.group.users.add(self.user1, self.user2)
+
+    def balance(self, user, currency='USD'):
+        row = GroupBalance.objects.filter(group=self.group, user=user, currency=currency).first()
+        return row.amount if row else Decimal('0.00')
+
+    def add_expense(self, amount='100.00', currency='USD'):
+        return self.client.post(reverse('add_group_expense', args=[self.group.id]), {
+            'description': 'Dinner',
+            'amount': amount,
+            'currency': currency,
+            'paid_by': self.user1.id,
+            'split_type': 'EQUAL',
+            'payment_type': 'SINGLE',
+        })
+
+    def test_add_expense_updates_balances(self):
+        self.add_expense()
+        self.assertEqual(self.balance(self.user1), Decimal('50.00'))
+        self.assertEqual(self.balance(self.user2), Decimal('-50.00'))
+
+    def test_edit_expense_moves_balances(self):
+        self.add_expense()
+        expense = GroupExpense.objects.get(group=self.group)
+        self.client.post(reverse('edit_group_expense', args=[expense.id]), {
+            'description': 'Dinner',
+            'amount': '60.00',
+            'currency': 'EUR',
+            'paid_by': self.user2.id,
+            'split_type': 'EQUAL',
+            'payment_type': 'SINGLE',
+        })
+        self.assertEqual(self.balance(self.user1), Decimal('0.00'))
+        self.assertEqual(self.balance(self.user2), Decimal('0.00'))
+        self.assertEqual(self.balance(self.user1, 'EUR'), Decimal('-30.00'))
+        self.assertEqual(self.balance(self.user2, 'EUR'), Decimal('30.00'))
+
+    def test_delete_expense_clears_balances(self):
+        self.add_expense()
+        expense = GroupExpense.objects.get(group=self.group)
+        self.client.post(reverse('delete_group_expense', args=[expense.id]))
+        self.assertEqual(self.balance(self.user1), Decimal('0.00'))
+        self.assertEqual(self.balance(self.user2), Decimal('0.00'))
+
+    def test_settle_up_clears_balances(self):
+        self.add_expense()
+        self.client.login(username='user2', password='password')
+        self.client.get(reverse('settle_up', args=[self.group.id, self.user1.id, 'USD']))
+        self.assertEqual(self.balance(self.user1), Decimal('0.00'))
+        self.assertEqual(self.balance(self.user2), Decimal('0.00'))
+
+    def test_rebuild_reports_and_fixes_drift(self):
+        self.add_expense()
+        GroupBalance.objects.filter(user=self.user1).update(amount=Decimal('7.00'))
+
+        out = StringIO()
+        call_command('rebuild_group_balances', '--dry-run', stdout=out)
+        self.assertIn('stored 7.00, expected 50.00', out.getvalue())
+        self.assertEqual(self.balance(self.user1), Decimal('7.00'))
+
+        call_command('rebuild_group_balances', stdout=StringIO())
+        self.assertEqual(self.balance(self.user1), Decimal('50.00'))
+        self.assertEqual(ledger.rebuild(), [])
+
+    def test_check_ledger_reports_json_and_fails_on_drift(self):
+        self.add_expense()
+        out = StringIO()
+        call_command('check_ledger', '--workers', '1', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['imbalanced'], [])
+
+        # A split with no matching payment unbalances the ledger, a hand-edited row drifts
+        expense = GroupExpense.objects.get(group=self.group)
+        ExpenseSplit.objects.bulk_create([ExpenseSplit(expense=expense, user=self.user2, amount_owed=Decimal('1.00'))])
+        GroupBalance.objects.filter(user=self.user1).update(amount=Decimal('7.00'))
+        other = groups.objects.create(name="Clean Group")
+
+        out = StringIO()
+        with self.assertRaises(CommandError) as ctx:
+            call_command('check_ledger', '--workers', '1', '--range-size', '1', stdout=out)
+        self.assertEqual(ctx.exception.returncode, 1)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['ranges'], other.id - self.group.id + 1)
+        self.assertEqual(report['imbalanced'], [{'group': self.group.id, 'currency': 'USD', 'net': '-1.00'}])
+        self.assertEqual(report['imbalanced_groups'], [self.group.id])
+        self.assertEqual(sorted((row['user'], row['stored'], row['expected']) for row in report['drifted']),
+                         [(self.user1.id, '7.00', '50.00'), (self.user2.id, '-50.00', '-51.00')])
+
+    def edges(self, currency='USD'):
+        return list(DebtEdge.objects.filter(group=self.group, currency=currency)
+                    .order_by('id').values_list('debtor', 'creditor', 'amount'))
+
+    def test_debt_edges_follow_every_ledger_write(self):
+        self.add_expense()
+        self.assertEqual(self.edges(), [(self.user2.id, self.user1.id, Decimal('50.00'))])
+
+        expense = GroupExpense.objects.get(group=self.group)
+        self.client.post(reverse('edit_group_expense', args=[expense.id]), {
+            'description': 'Dinner', 'amount': '60.00', 'currency': 'EUR', 'paid_by': self.user2.id,
+            'split_type': 'EQUAL', 'payment_type': 'SINGLE',
+        })
+        self.assertEqual(self.edges(), [])
+        self.assertEqual(self.edges('EUR'), [(self.user1.id, self.user2.id, Decimal('30.00'))])
+
+        self.client.post(reverse('delete_group_expense', args=[expense.id]))
+        self.assertFalse(DebtEdge.objects.exists())
+
+    def test_group_detail_and_settle_up_read_the_edges(self):
+        self.add_expense()
+        response = self.client.get(reverse('group_detail', args=[self.group.id]))
+        debt = response.context['balances_by_currency']['USD']['debts'][0]
+        self.assertEqual((debt['debtor'], debt['creditor'], debt['amount']), (self.user2, self.user1, Decimal('50.00')))
+
+        self.client.login(username='user2', password='password')
+        self.client.get(reverse('group_detail', args=[self.group.id]))  # Warm the notification count cache
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('settle_up', args=[self.group.id, self.user1.id, 'USD']))
+        balance_reads = [q for q in ctx.captured_queries
+                         if q['sql'].startswith('SELECT') and 'groups_groupbalance' in q['sql']]
+        # The edge lookup replaces recomputing everyone's balance; the ledger reads balances once to refresh
+        self.assertEqual(len(balance_reads), 2)
+        self.assertFalse(DebtEdge.objects.exists())
+        self.assertEqual(self.balance(self.user2), Decimal('0.00'))
+
+    def test_equal_splits_leave_no_rounding_residue(self):
+        user3 = User.objects.create_user(username='user3', password='password')
+        self.group.users.add(user3)
+        members = [user3, self.user2, self.user1]
+        self.assertEqual(services.equal_splits(Decimal('100.00'), members),
+                         {self.user1.id: Decimal('33.34'), self.user2.id: Decimal('33.33'), user3.id: Decimal('33.33')})
+        # Rounding every share down used to leave a cent per expense, until the
+        # ledger counted as broken and lost its debts
+        for _ in range(6):
+            expense = GroupExpense(group=self.group, description='Dinner', amount=Decimal('100.00'), currency='USD', paid_by=self.user1)
+            services.create_group_expense(expense, {self.user1.id: Decimal('100.00')},
+                                          services.equal_splits(expense.amount, members), self.user1, members)
+        self.assertEqual(sum(GroupBalance.objects.values_list('amount', flat=True)), Decimal('0.00'))
+        self.assertEqual(self.edges(), [(self.user2.id, self.user1.id, Decimal('199.98')),
+                                        (user3.id, self.user1.id, Decimal('199.98'))])
+        call_command('check_ledger', '--workers', '1', stdout=StringIO())  # Doesn't fail
+
+        response = self.client.get(reverse('group_detail', args=[self.group.id]))
+        data = response.context['balances_by_currency']['USD']
+        self.assertFalse(data['ledger_error'])
+        self.assertEqual(len(data['debts']), 2)
+
+        self.client.login(username='user2', password='password')
+        self.client.get(reverse('settle_up', args=[self.group.id, self.user1.id, 'USD']))
+        self.assertEqual(self.balance(self.user2), Decimal('0.00'))
+
+    def test_rebuild_recomputes_edges(self):
+        self.add_expense()
+        DebtEdge.objects.all().delete()
+        call_command('rebuild_group_balances', stdout=StringIO())
+        self.assertEqual(self.edges(), [(self.user2.id, self.user1.id, Decimal('50.00'))])
+
+
+@skipIf(connection.vendor == 'sqlite' and connection.is_in_memory_db(),
+        "Worker processes can't see an in-memory test database")
+class CheckLedgerWorkersTests(TransactionTestCase):
+    def test_parallel_workers_whatever_the_start_method(self):
+        user1 = User.objects.create_user(username='user1')
+        user2 = User.objects.create_user(username='user2')
+        for name in ('First', 'Second', 'Third'):
+            group = groups.objects.create(name=name)
+            expense = GroupExpense.objects.create(group=group, amount=Decimal('10.00'), paid_by=user1)
+            ExpensePayment.objects.create(expense=expense, user=user1, amount=Decimal('10.00'))
+            ExpenseSplit.objects.create(expense=expense, user=user2, amount_owed=Decimal('10.00'))
+        GroupBalance.objects.filter(group=group, user=user1).update(amount=Decimal('7.00'))
+
+        previous = multiprocessing.get_start_method(allow_none=True)
+        for method in multiprocessing.get_all_start_methods():
+            with self.subTest(method=method):
+                multiprocessing.set_start_method(method, force=True)
+                try:
+                    out = StringIO()
+                    with self.assertRaises(CommandError):
+                        call_command('check_ledger', '--workers', '2', '--range-size', '1', stdout=out)
+                finally:
+                    multiprocessing.set_start_method(previous, force=True)
+                report = json.loads(out.getvalue())
+                self.assertEqual(report['ranges'], 3)
+                self.assertEqual(report['drifted_groups'], [group.id])
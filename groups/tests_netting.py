@@ -0,0 +1,71 @@
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from decimal import Decimal
+from notifications.models import Notification
+from .models import groups, GroupExpense, GroupBalance, DebtEdge
+from . import ledger, netting, services
+
+class CrossGroupNettingTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='password')
+        self.bob = User.objects.create_user(username='bob', password='password')
+        self.carol = User.objects.create_user(username='carol', password='password')
+        self.trip = groups.objects.create(name="Trip")
+        self.flat = groups.objects.create(name="Flat")
+        self.club = groups.objects.create(name="Club")
+        for group in (self.trip, self.flat, self.club):
+            group.users.add(self.alice, self.bob, self.carol)
+        self.client = Client()
+        self.client.login(username='alice', password='password')
+
+    def expense(self, group, payer, ower, amount, currency='USD'):
+        expense = GroupExpense(group=group, description='Thing', amount=Decimal(amount), currency=currency, paid_by=payer)
+        services.create_group_expense(expense, {payer.id: Decimal(amount)}, {ower.id: Decimal(amount)}, payer, [])
+
+    def test_nets_across_groups_per_currency(self):
+        self.expense(self.trip, self.bob, self.alice, '30.00')   # alice owes bob 30
+        self.expense(self.flat, self.alice, self.bob, '10.00')   # bob owes alice 10
+        self.expense(self.club, self.bob, self.alice, '5.00', 'EUR')
+        self.expense(self.club, self.alice, self.carol, '7.00')
+        self.club.deleted = True
+        self.club.save()
+        self.expense(self.flat, self.alice, self.carol, '7.00')
+
+        with self.assertNumQueries(2):
+            positions = netting.net_positions(self.alice)
+        self.assertEqual(
+            [(p['counterparty'], p['currency'], p['amount'], p['groups']) for p in positions],
+            [(self.bob, 'USD', Decimal('-20.00'), 2), (self.carol, 'USD', Decimal('7.00'), 1)],
+        )
+
+        response = self.client.get(reverse('cross_group_balances_api'))
+        self.assertEqual(response.json()['balances'][0],
+                         {'counterparty_id': self.bob.id, 'counterparty': 'bob', 'currency': 'USD', 'amount': '-20.00', 'groups': 2})
+        self.assertContains(self.client.get(reverse('cross_group_balances')), 'You owe 20.00 USD')
+
+    def test_settle_all_writes_every_group_in_one_transaction(self):
+        self.expense(self.trip, self.bob, self.alice, '30.00')
+        self.expense(self.flat, self.alice, self.bob, '10.00')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('settle_all', args=[self.bob.id, 'USD']))
+        # One balance update for both groups, not one per settlement row
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "groups_groupbalance"')]
+        self.assertEqual(len(updates), 1)
+        self.assertRedirects(response, reverse('cross_group_balances'))
+
+        self.assertEqual(GroupExpense.objects.filter(description__startswith='Settlement').count(), 2)
+        self.assertFalse(GroupBalance.objects.exclude(amount=0).exists())
+        self.assertFalse(DebtEdge.objects.exists())
+        self.assertEqual(ledger.rebuild(dry_run=True), [])
+        self.assertIn("settled up USD 20.00 with you across 2 group(s)",
+                      Notification.objects.get(user=self.bob, notification_type='SETTLEMENT').message)
+
+    def test_settle_all_refuses_when_owed(self):
+        self.expense(self.trip, self.alice, self.bob, '30.00')
+        self.client.post(reverse('settle_all', args=[self.bob.id, 'USD']))
+        self.assertFalse(GroupExpense.objects.filter(description__startswith='Settlement').exists())
+        self.assertEqual(self.client.get(reverse('settle_all', args=[self.bob.id, 'USD'])).status_code, 405)
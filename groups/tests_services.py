@@ -0,0 +1,95 @@
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from unittest import mock
+from decimal import Decimal
+from notifications.models import Notification
+from .models import groups, GroupExpense, ExpenseSplit, ExpensePayment, GroupBalance
+
+class GroupExpenseWritePathTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='password')
+        self.members = [self.owner] + [User.objects.create(username=f'member{i}') for i in range(49)]
+        self.client = Client()
+        self.client.login(username='owner', password='password')
+
+        self.group = groups.objects.create(name="Big Group")
+        self.group.users.add(*self.members)
+
+    def post_expense(self, **extra):
+        data = {
+            'description': 'Trip',
+            'amount': '500.00',
+            'currency': 'USD',
+            'paid_by': self.owner.id,
+            'split_type': 'EQUAL',
+            'payment_type': 'SINGLE',
+        }
+        data.update(extra)
+        return self.client.post(reverse('add_group_expense', args=[self.group.id]), data)
+
+    def test_add_expense_uses_bulk_statements(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post_expense()
+        self.assertEqual(response.status_code, 302)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT')]
+        # expense, payments, splits, new balance rows, debt edges, notifications, missing unread counters
+        self.assertEqual(len(inserts), 7)
+        self.assertLess(len(ctx.captured_queries), 30)
+
+        self.assertEqual(ExpenseSplit.objects.filter(expense__group=self.group).count(), 50)
+        self.assertEqual(Notification.objects.filter(notification_type='EXPENSE_ADD').count(), 49)
+        self.assertEqual(GroupBalance.objects.get(group=self.group, user=self.owner).amount, Decimal('490.00'))
+
+    def test_failure_rolls_back_everything(self):
+        with mock.patch.object(Notification.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.post_expense()
+        self.assertFalse(GroupExpense.objects.exists())
+        self.assertFalse(ExpensePayment.objects.exists())
+        self.assertFalse(ExpenseSplit.objects.exists())
+        self.assertFalse(GroupBalance.objects.exclude(amount=0).exists())
+
+    def test_edit_expense_replaces_rows_atomically(self):
+        self.post_expense()
+        expense = GroupExpense.objects.get(group=self.group)
+        data = {
+            'description': 'Trip', 'amount': '100.00', 'currency': 'USD', 'paid_by': self.owner.id,
+            'split_type': 'EXACT', 'payment_type': 'SINGLE',
+            f'split_amount_{self.members[1].id}': '100.00',
+        }
+        self.client.post(reverse('edit_group_expense', args=[expense.id]), data)
+        self.assertEqual(GroupBalance.objects.get(group=self.group, user=self.owner).amount, Decimal('100.00'))
+        self.assertEqual(GroupBalance.objects.get(group=self.group, user=self.members[1]).amount, Decimal('-100.00'))
+        self.assertEqual(GroupBalance.objects.get(group=self.group, user=self.members[2]).amount, Decimal('0.00'))
+
+    def test_edit_expense_only_touches_changed_rows(self):
+        self.post_expense(amount='100.00', split_type='EXACT', **{
+            f'split_amount_{self.members[1].id}': '60.00',
+            f'split_amount_{self.members[2].id}': '40.00',
+        })
+        expense = GroupExpense.objects.get(group=self.group)
+        untouched = ExpenseSplit.objects.get(expense=expense, user=self.members[1])
+
+        self.client.post(reverse('edit_group_expense', args=[expense.id]), {
+            'description': 'Trip', 'amount': '100.00', 'currency': 'USD', 'paid_by': self.owner.id,
+            'split_type': 'EXACT', 'payment_type': 'SINGLE',
+            f'split_amount_{self.members[1].id}': '60.00',
+            f'split_amount_{self.members[3].id}': '40.00',
+        })
+
+        # Unchanged split kept its row, the retired one left the hot table entirely
+        splits = ExpenseSplit.objects.filter(expense=expense)
+        self.assertEqual(splits.count(), 2)
+        self.assertTrue(splits.filter(pk=untouched.pk).exists())
+        self.assertFalse(ExpenseSplit.all_objects.filter(deleted=True).exists())
+        self.assertFalse(ExpensePayment.all_objects.filter(deleted=True).exists())
+
+        history = expense.row_history.order_by('action')
+        self.assertEqual([(h.action, h.user) for h in history],
+                         [('ADDED', self.members[3]), ('REMOVED', self.members[2])])
+        self.assertEqual(history.get(action='REMOVED').old_amount, Decimal('40.00'))
+        self.assertEqual(GroupBalance.objects.get(group=self.group, user=self.members[2]).amount, Decimal('0.00'))
+        self.assertEqual(GroupBalance.objects.get(group=self.group, user=self.members[3]).amount, Decimal('-40.00'))
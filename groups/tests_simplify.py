@@ -0,0 +1,50 @@
+from django.test import SimpleTestCase, override_settings
+from decimal import Decimal
+from .simplify import GreedySimplifier, OptimalSimplifier, get_simplifier, simplify_debts
+
+def settle(balances, transfers):
+    """Apply transfers to a copy of the balances."""
+    result = dict(balances)
+    for debtor, creditor, amount in transfers:
+        result[debtor] += amount
+        result[creditor] -= amount
+    return result
+
+class SimplifierTests(SimpleTestCase):
+    # Greedy needs 4 transfers here, the optimum is 3: {c2, d2} and {c1, d1, d3}
+    BALANCES = {'c1': 700, 'c2': 300, 'd1': -500, 'd2': -300, 'd3': -200}
+
+    def test_greedy_settles_everyone(self):
+        transfers = GreedySimplifier().simplify(self.BALANCES)
+        self.assertEqual(len(transfers), 4)
+        self.assertTrue(all(v == 0 for v in settle(self.BALANCES, transfers).values()))
+
+    def test_optimal_uses_fewer_transfers(self):
+        transfers = OptimalSimplifier().simplify(self.BALANCES)
+        self.assertEqual(len(transfers), 3)
+        self.assertIn(('d2', 'c2', 300), transfers)
+        self.assertTrue(all(v == 0 for v in settle(self.BALANCES, transfers).values()))
+
+    def test_optimal_absorbs_rounding_residue(self):
+        # 100.00 split three ways leaves the ledger a cent out
+        balances = {'payer': 6667, 'a': -3333, 'b': -3333}
+        transfers = OptimalSimplifier().simplify(balances)
+        self.assertEqual(sorted(transfers), [('a', 'payer', 3333), ('b', 'payer', 3333)])
+
+    def test_optimal_falls_back_above_member_limit(self):
+        transfers = OptimalSimplifier(max_members=4).simplify(self.BALANCES)
+        self.assertTrue(all(v == 0 for v in settle(self.BALANCES, transfers).values()))
+        # Exact matches are paired before the greedy pass
+        self.assertIn(('d2', 'c2', 300), transfers)
+
+    def test_large_group(self):
+        balances = {f'u{i}': (i % 7 - 3) * 150 for i in range(700)}
+        balances['u0'] -= sum(balances.values())
+        transfers = get_simplifier('optimal').simplify(balances)
+        self.assertLess(len(transfers), len(balances))
+        self.assertTrue(all(abs(v) <= 1 for v in settle(balances, transfers).values()))
+
+    @override_settings(GROUP_DEBT_SIMPLIFIER='greedy')
+    def test_simplify_debts_uses_decimal_amounts(self):
+        debts = simplify_debts({'alice': Decimal('50.00'), 'bob': Decimal('-50.00')})
+        self.assertEqual(debts, [{'debtor': 'bob', 'creditor': 'alice', 'amount': Decimal('50.00')}])
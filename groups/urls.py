@@ -4,10 +4,16 @@ from . import views
 urlpatterns = [
     path('', views.group_list, name='groups'),
     path('add/', views.group_add, name='group_add'),
+    path('balances/', views.cross_group_balances, name='cross_group_balances'),
+    path('balances/api/', views.cross_group_balances_api, name='cross_group_balances_api'),
+    path('balances/settle/<int:user_id>/<str:currency>/', views.settle_all, name='settle_all'),
     path('<int:group_id>/edit/', views.group_edit, name='group_edit'),
     path('<int:group_id>/delete/', views.group_delete, name='group_delete'),
     path('<int:group_id>/', views.group_detail, name='group_detail'),
     path('<int:group_id>/leave/', views.leave_group, name='leave_group'),
+    path('<int:group_id>/audit/', views.group_audit, name='group_audit'),
+    path('<int:group_id>/export/', views.group_export, name='group_export'),
+    path('<int:group_id>/import/', views.group_import, name='group_import'),
     path('invitation/<int:invitation_id>/accept/', views.accept_invitation, name='accept_invitation'),
     path('invitation/<int:invitation_id>/decline/', views.decline_invitation, name='decline_invitation'),
     path('<int:group_id>/settle-up/<int:user_id>/<str:currency>/', views.settle_up, name='settle_up'),
@@ -1,17 +1,27 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.utils import timezone
-from .models import groups, GroupExpense, ExpenseSplit, ExpensePayment, GroupInvitation
-from .forms import GroupExpenseForm, GroupForm
+from .models import groups, GroupExpense, ExpenseSplit, ExpensePayment, GroupInvitation, ExpenseRowHistory, DebtEdge
+from .forms import GroupExpenseForm, GroupForm, GroupImportForm
 from django.core.exceptions import ValidationError
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponseBadRequest
+from django.views.decorators.http import require_POST
 from django.contrib import messages
-from django.db.models import Sum
+from django.db.models import Prefetch
 from notifications.models import Notification
+from project.pagination import paginate_request
+from project.streaming import batched, export_response
+from archive.reader import archived_rows
+from . import balances, dashboard as dashboards, importer, ledger, netting, services
 
 # Create your views here.
 
+import io
+from collections import defaultdict
 from decimal import Decimal
 
 # Helper function to check member debt
@@ -19,100 +29,62 @@ def get_user_balance_in_group(user, group):
     """
     Returns True if the user has a non-zero balance (owe or owed) in ANY currency.
     """
-    currencies = GroupExpense.objects.filter(group=group, deleted=0).values_list('currency', flat=True).distinct()
-    for currency in currencies:
-        # Filter ExpensePayment and ExpenseSplit by deleted=0 as well for robustness
-        paid = ExpensePayment.objects.filter(
-            expense__group=group, 
-            expense__currency=currency, 
-            user=user, 
-            expense__deleted=0,
-            deleted=0
-        ).aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
-        
-        owed = ExpenseSplit.objects.filter(
-            expense__group=group, 
-            expense__currency=currency, 
-            user=user, 
-            expense__deleted=0,
-            deleted=0
-        ).aggregate(Sum('amount_owed'))['amount_owed__sum'] or Decimal('0.00')
-        
-        if abs(paid - owed) > Decimal('0.01'):
-            return True # User has outstanding balance
-    return False
+    return balances.has_outstanding_balance(group, user)
+
+@login_required
+def dashboard(request):
+    return render(request, 'dashboard.html', dashboards.dashboard(request.user))
 
 @login_required
 def group_list(request):
     user = request.user
     groups_data = []
-    user_groups = groups.objects.filter(users=user, deleted=0)
+    user_groups = groups.objects.filter(users=user, deleted=0).only('id', 'name')
     
-    # --- Bulk Fetch Balances to fix N+1 Query Issue ---
-    
-    # 1. Fetch total paid by user per (group, currency)
-    payments = ExpensePayment.objects.filter(
-        expense__group__in=user_groups,
-        user=user,
-        expense__deleted=0,
-        deleted=0
-    ).values('expense__group', 'expense__currency').annotate(total_paid=Sum('amount'))
-    
-    # Map: (group_id, currency) -> amount
-    payment_map = {}
-    for p in payments:
-        k = (p['expense__group'], p['expense__currency'])
-        payment_map[k] = p['total_paid']
-
-    # 2. Fetch total owed by user per (group, currency)
-    splits = ExpenseSplit.objects.filter(
-        expense__group__in=user_groups,
-        user=user,
-        expense__deleted=0,
-        deleted=0
-    ).values('expense__group', 'expense__currency').annotate(total_owed=Sum('amount_owed'))
-    
-    # Map: (group_id, currency) -> amount
-    split_map = {}
-    for s in splits:
-        k = (s['expense__group'], s['expense__currency'])
-        split_map[k] = s['total_owed']
-        
-    # 3. Identify all unique currencies per group to display
-    # This is a bit tricky since we need currencies even if balance is 0?
-    # Usually we only care about non-zero balances or active currencies.
-    # Let's fetch all currencies used in these groups.
-    group_currencies = GroupExpense.objects.filter(
-        group__in=user_groups, 
-        deleted=0
-    ).values_list('group', 'currency').distinct()
-    
-    currency_map = {} # group_id -> set(currencies)
-    for g_id, curr in group_currencies:
-        if g_id not in currency_map: currency_map[g_id] = set()
-        currency_map[g_id].add(curr)
+    # One query for the user's balances across all groups
+    balance_map = balances.user_group_balances(user, user_groups)
 
     for group in user_groups:
-        balances = []
-        # Get currencies for this group, default to USD if none
-        currencies = currency_map.get(group.id, {'USD'})
-        if not currencies: currencies = {'USD'} # Fallback if set is empty
-        
-        for currency in currencies:
-            paid = payment_map.get((group.id, currency), Decimal('0.00'))
-            owed = split_map.get((group.id, currency), Decimal('0.00'))
-            
-            net = paid - owed
-            if abs(net) > Decimal('0.01'):
-                balances.append({'currency': currency, 'amount': net})
-        
         groups_data.append({
             'group': group,
-            'balances': balances 
+            'balances': balance_map.get(group.id, [])
         })
         
     return render(request, 'group_list.html', {'groups_data': groups_data})
 
+@login_required
+def cross_group_balances(request):
+    """What the user and each person they share groups with owe each other, over all groups."""
+    return render(request, 'cross_group_balances.html', {'positions': netting.net_positions(request.user)})
+
+
+@login_required
+def cross_group_balances_api(request):
+    return JsonResponse({'balances': [
+        {
+            'counterparty_id': position['counterparty'].id,
+            'counterparty': position['counterparty'].username,
+            'currency': position['currency'],
+            'amount': position['amount'],
+            'groups': position['groups'],
+        }
+        for position in netting.net_positions(request.user)
+    ]})
+
+
+@login_required
+@require_POST
+def settle_all(request, user_id, currency):
+    counterparty = get_object_or_404(User, pk=user_id)
+    settled = netting.settle_all(request.user, counterparty, currency)
+    if settled is None:
+        messages.error(request, f"You do not owe {counterparty.username} anything in {currency}.")
+    else:
+        amount, groups_count = settled
+        messages.success(request, f"Settled up {currency} {amount} with {counterparty.username} across {groups_count} group(s)!")
+    return redirect('cross_group_balances')
+
+
 @login_required
 def group_add(request):
     if request.method == 'POST':
@@ -273,11 +245,9 @@ def group_delete(request, group_id):
     if request.method == 'POST':
         # Check if anyone in the group has a balance
         # If any user in the group has a non-zero balance in any currency, cannot delete.
-        members = group.users.all()
-        for member in members:
-            if get_user_balance_in_group(member, group):
-                messages.error(request, "Cannot delete group because there are unsettled debts.")
-                return redirect('group_detail', group_id=group.id)
+        if balances.has_outstanding_balance(group):
+            messages.error(request, "Cannot delete group because there are unsettled debts.")
+            return redirect('group_detail', group_id=group.id)
 
         group.deleted = True
         group.save()
@@ -286,93 +256,59 @@ def group_delete(request, group_id):
     
     return render(request, 'group_confirm_delete.html', {'group': group})
 
-@login_required
-def group_detail(request, group_id):
-    group = get_object_or_404(groups, pk=group_id, users=request.user, deleted=0)
-    # Filter only non-deleted expenses
-    group_expenses = GroupExpense.objects.filter(group=group, deleted=0).order_by('-created_at')
-    
-    # Identify currencies used in this group
-    currencies = GroupExpense.objects.filter(group=group, deleted=0).values_list('currency', flat=True).distinct()
-    if not currencies:
-        currencies = ['USD'] # Default if no expenses
-
+def _balances_by_currency(group):
+    """{currency: {'net_balances', 'debts', 'ledger_error'}} for the balance section of group_detail."""
     balances_by_currency = {}
-    
-    members = group.users.all()
-
-    for currency in currencies:
-        # 1. Calculate net balance for everyone in this currency
-        net_balances = {}
-        for member in members:
-            # Filter by currency
-             # Add deleted=0 filter
-            paid = ExpensePayment.objects.filter(
-                expense__group=group, 
-                expense__currency=currency, 
-                user=member, 
-                expense__deleted=0,
-                deleted=0
-            ).aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
-            
-            owed = ExpenseSplit.objects.filter(
-                expense__group=group, 
-                expense__currency=currency, 
-                user=member, 
-                expense__deleted=0,
-                deleted=0
-            ).aggregate(Sum('amount_owed'))['amount_owed__sum'] or Decimal('0.00')
-            
-            net_balances[member] = paid - owed
-        
+    # "Who owes whom" is kept up to date by the ledger in DebtEdge
+    debts = defaultdict(list)
+    for edge in DebtEdge.objects.filter(group=group).select_related('debtor', 'creditor').order_by('id'):
+        debts[edge.currency].append({'debtor': edge.debtor, 'creditor': edge.creditor, 'amount': edge.amount})
+
+    # All members' balances in all currencies from a constant number of queries
+    for currency, net_balances in balances.group_balances(group).items():
         # Check Ledger Integrity
         total_system_balance = sum(net_balances.values())
-        ledger_error = abs(total_system_balance) > Decimal('0.05')
-        
-        debts = []
-        if not ledger_error:
-             # Calculate debts "Who Owes Whom"
-            debtors = []
-            creditors = []
-            for member, balance in net_balances.items():
-                if balance < Decimal('-0.01'):
-                    debtors.append({'user': member, 'amount': abs(balance)})
-                elif balance > Decimal('0.01'):
-                    creditors.append({'user': member, 'amount': balance})
-            
-            debtors.sort(key=lambda x: x['amount'], reverse=True)
-            creditors.sort(key=lambda x: x['amount'], reverse=True)
+        ledger_error = abs(total_system_balance) > ledger.LEDGER_TOLERANCE
 
-            i = 0 
-            j = 0 
-
-            while i < len(debtors) and j < len(creditors):
-                debtor = debtors[i]
-                creditor = creditors[j]
-                amount = min(debtor['amount'], creditor['amount'])
-                
-                debts.append({
-                    'debtor': debtor['user'],
-                    'creditor': creditor['user'],
-                    'amount': round(amount, 2)
-                })
-                
-                debtor['amount'] -= amount
-                creditor['amount'] -= amount
-                
-                if debtor['amount'] < Decimal('0.01'): i += 1
-                if creditor['amount'] < Decimal('0.01'): j += 1
-        
         balances_by_currency[currency] = {
             'net_balances': net_balances,
-            'debts': debts,
+            'debts': [] if ledger_error else debts[currency],
             'ledger_error': ledger_error
         }
+    return balances_by_currency
+
+
+@login_required
+def group_detail(request, group_id):
+    group = get_object_or_404(groups, pk=group_id, users=request.user, deleted=0)
+    # Filter only non-deleted expenses
+    group_expenses = paginate_request(request, GroupExpense.objects.filter(group=group).prefetch_related(
+        Prefetch('payments', queryset=ExpensePayment.objects.select_related('user')),
+        Prefetch('splits', queryset=ExpenseSplit.objects.select_related('user')),
+    ), per_page=20)
+    
+    # The balance section only changes with the ledger: it is cached under the
+    # group's ledger version, and the rendered HTML per viewer (it has their
+    # "Pay" buttons), so a repeat view costs one version lookup
+    version = ledger.ledger_versions([group.id])[group.id]
+    timeout = getattr(settings, 'GROUP_BALANCES_CACHE_TIMEOUT', 3600)
+    fragment_key = f'groups:balances:html:{group.id}:{version}:{request.user.pk}'
+    balances_html = cache.get(fragment_key)
+    balances_by_currency = None
+    if balances_html is None:
+        balances_by_currency = cache.get_or_set(
+            f'groups:balances:{group.id}:{version}', lambda: _balances_by_currency(group), timeout
+        )
+        balances_html = render_to_string('group_balances.html', {
+            'group': group, 'balances_by_currency': balances_by_currency,
+        }, request)
+        cache.set(fragment_key, balances_html, timeout)
 
     return render(request, 'group_detail.html', {
         'group': group,
         'expenses': group_expenses,
-        'balances_by_currency': balances_by_currency,
+        'balances_html': balances_html,
+        'balances_by_currency': balances_by_currency,  # Only when the HTML wasn't cached
         # 'debts': debts, # Deprecated
         # 'ledger_error': ledger_error, # Deprecated
         # 'net_balances': net_balances # Deprecated
@@ -380,10 +316,78 @@ def group_detail(request, group_id):
     
 
 
+def _ledger_export_rows(group):
+    """One row per expense followed by its payments and splits, read in batches."""
+    expenses = GroupExpense.objects.filter(group=group)
+    for batch in batched(expenses, ('created_at', 'description', 'currency', 'amount', 'paid_by__username')):
+        ids = [row[0] for row in batch]
+        lines = defaultdict(list)
+        for model, entry, field in ((ExpensePayment, 'payment', 'amount'), (ExpenseSplit, 'split', 'amount_owed')):
+            for expense_id, username, amount in (
+                model.objects.filter(expense_id__in=ids).order_by('pk').values_list('expense_id', 'user__username', field)
+            ):
+                lines[expense_id].append((entry, username, amount))
+        for pk, created_at, description, currency, amount, paid_by in batch:
+            yield (pk, created_at, 'expense', description, currency, paid_by, amount)
+            for entry, username, line_amount in lines[pk]:
+                yield (pk, created_at, entry, description, currency, username, line_amount)
+
+
+@login_required
+def group_export(request, group_id):
+    """Download the group's ledger as ?format=csv|jsonl, optionally &gzip=1."""
+    group = get_object_or_404(groups, pk=group_id, users=request.user, deleted=0)
+    header = ['expense_id', 'date', 'entry', 'description', 'currency', 'user', 'amount']
+    response = export_response(request, f'group-{group.id}-ledger', header, _ledger_export_rows(group))
+    if response is None:
+        return HttpResponseBadRequest("Unknown export format.")
+    return response
+
+
+@login_required
+def group_import(request, group_id):
+    group = get_object_or_404(groups, pk=group_id, users=request.user, deleted=0)
+    result = None
+    if request.method == 'POST':
+        form = GroupImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            lines = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', errors='replace', newline='')
+            result = importer.import_group_expenses(group, lines, request.user)
+            if result.errors:
+                messages.error(request, "Nothing was imported, please fix the rows below.")
+            elif result.created:
+                messages.success(request, f"Imported {result.created} expense(s).")
+                return redirect('group_detail', group_id=group.id)
+            else:
+                messages.error(request, "The file has no expenses to import.")
+    else:
+        form = GroupImportForm()
+    return render(request, 'group_import.html', {'group': group, 'form': form, 'result': result})
+
+
+@login_required
+def group_audit(request, group_id):
+    group = get_object_or_404(groups, pk=group_id, users=request.user, deleted=0)
+
+    # Soft-deleted expenses still in the hot table, plus the ones already archived
+    deleted_expenses = GroupExpense.all_objects.removed().filter(group=group).order_by('-created_at')
+    archived_expenses = archived_rows(GroupExpense, group_id=group.id)
+    history = ExpenseRowHistory.objects.filter(expense__group=group).select_related(
+        'expense', 'user', 'changed_by'
+    ).order_by('-changed_at')[:100]
+
+    return render(request, 'group_audit.html', {
+        'group': group,
+        'deleted_expenses': deleted_expenses,
+        'archived_expenses': archived_expenses,
+        'history': history,
+    })
+
+
 @login_required
 def add_group_expense(request, group_id):
     group = get_object_or_404(groups, pk=group_id, users=request.user, deleted=0)
-    members = group.users.all()
+    members = list(group.users.all())
 
     if request.method == 'POST':
         form = GroupExpenseForm(request.POST, group=group)
@@ -448,60 +452,21 @@ def add_group_expense(request, group_id):
                         'members': members
                     })
             
-            # --- SAVE EXPENSE ---
-            expense = form.save(commit=False)
-            expense.group = group
-            expense.save() 
-            # Note: expense.paid_by might be set if SINGLE, but we can ignore it or keep it as "primary".
-            
-            # Create ExpensePayment records
-            if payment_type == 'MULTIPLE':
-                 for member in members:
-                    if member.id in payment_data:
-                        ExpensePayment.objects.create(
-                            expense=expense,
-                            user=member,
-                            amount=payment_data[member.id]
-                        )
-            else: # SINGLE
+            if payment_type != 'MULTIPLE': # SINGLE
                 # Use the user from the form
-                payer = form.cleaned_data['paid_by']
-                ExpensePayment.objects.create(
-                    expense=expense,
-                    user=payer,
-                    amount=amount
-                )
+                payment_data = {form.cleaned_data['paid_by'].id: amount}
 
             # --- SPLIT LOGIC ---
             if split_type == 'EQUAL':
-                split_amount = amount / Decimal(involved_members.count())
-                for member in involved_members:
-                    ExpenseSplit.objects.create(
-                        expense=expense,
-                        user=member,
-                        amount_owed=split_amount
-                    )
-            elif split_type == 'EXACT':
-                for member in involved_members:
-                    if member.id in split_data:
-                         ExpenseSplit.objects.create(
-                            expense=expense,
-                            user=member,
-                            amount_owed=split_data[member.id]
-                        )
+                split_data = services.equal_splits(amount, involved_members)
 
-            messages.success(request, 'Expense added successfully!')
-            
-            # Notify group members
-            for member in group.users.all():
-                if member != request.user:
-                    Notification.objects.create(
-                        user=member,
-                        message=f"New expense '{expense.description}' added in '{group.name}' by {request.user.username}.",
-                        notification_type='EXPENSE_ADD',
-                        related_link=f"/groups/{group.id}/"
-                    )
+            # --- SAVE EXPENSE ---
+            # Expense, payments, splits, balances and notifications in one transaction
+            expense = form.save(commit=False)
+            expense.group = group
+            services.create_group_expense(expense, payment_data, split_data, request.user, members)
 
+            messages.success(request, 'Expense added successfully!')
             return redirect('group_detail', group_id=group.id)
     else:
         # Pre-select current user as default
@@ -515,7 +480,7 @@ def add_group_expense(request, group_id):
 
 @login_required
 def edit_group_expense(request, expense_id):
-    expense = get_object_or_404(GroupExpense, pk=expense_id, deleted=0)
+    expense = get_object_or_404(GroupExpense, pk=expense_id)
     group = expense.group
     
     # Check if user is member of the group
@@ -523,7 +488,7 @@ def edit_group_expense(request, expense_id):
          messages.error(request, "You do not have permission to edit this expense.")
          return redirect('group_detail', group_id=group.id)
 
-    members = group.users.all()
+    members = list(group.users.all())
 
     if request.method == 'POST':
         form = GroupExpenseForm(request.POST, instance=expense, group=group)
@@ -582,50 +547,14 @@ def edit_group_expense(request, expense_id):
                         'expense': expense
                     })
 
-            # Save Expense
-            expense = form.save()
-
-            # Update Payments (SOFT DELETE Old, Create New)
-            # Use update(deleted=True) instead of delete()
-            ExpensePayment.objects.filter(expense=expense).update(deleted=True)
-            
-            if payment_type == 'MULTIPLE':
-                 for member in members:
-                    if member.id in payment_data:
-                        ExpensePayment.objects.create(
-                            expense=expense,
-                            user=member,
-                            amount=payment_data[member.id]
-                        )
-            else: # SINGLE
-                payer = form.cleaned_data['paid_by']
-                ExpensePayment.objects.create(
-                    expense=expense,
-                    user=payer,
-                    amount=amount
-                )
-
-            # Re-Calculate Splits (SOFT DELETE Old)
-            # Crude approach: Delete all existing splits and recreate
-            # In a better app, we might try to update existing ones, but recreation is safer for consistency
-            ExpenseSplit.objects.filter(expense=expense).update(deleted=True)
+            if payment_type != 'MULTIPLE': # SINGLE
+                payment_data = {form.cleaned_data['paid_by'].id: amount}
 
             if split_type == 'EQUAL':
-                split_amount = amount / Decimal(involved_members.count())
-                for member in involved_members:
-                    ExpenseSplit.objects.create(
-                        expense=expense,
-                        user=member,
-                        amount_owed=split_amount
-                    )
-            elif split_type == 'EXACT':
-                 for member in involved_members:
-                    if member.id in split_data:
-                         ExpenseSplit.objects.create(
-                            expense=expense,
-                            user=member,
-                            amount_owed=split_data[member.id]
-                        )
+                split_data = services.equal_splits(amount, involved_members)
+
+            # Save Expense and apply only the changed payments and splits in one transaction
+            expense = services.update_group_expense(form.save(commit=False), payment_data, split_data, request.user)
             
             messages.success(request, 'Expense updated successfully!')
             return redirect('group_detail', group_id=group.id)
@@ -643,7 +572,7 @@ def edit_group_expense(request, expense_id):
 
 @login_required
 def delete_group_expense(request, expense_id):
-    expense = get_object_or_404(GroupExpense, pk=expense_id, deleted=0)
+    expense = get_object_or_404(GroupExpense, pk=expense_id)
     group = expense.group
     
     if request.user not in group.users.all():
@@ -689,119 +618,24 @@ def leave_group(request, group_id):
 @login_required
 def settle_up(request, group_id, user_id, currency):
     group = get_object_or_404(groups, pk=group_id, users=request.user, deleted=0)
-    target_user = get_object_or_404(User, pk=user_id)
-    
-    if target_user not in group.users.all():
-        messages.error(request, "Target user is not in this group.")
-        return redirect('group_detail', group_id=group.id)
 
-    # 1. Calculate exactly how much is owed to this user in this currency
-    # We need to reuse the calculation logic or replicate it carefully.
-    # Reuse filter logic from group_detail
-    
-    paid = ExpensePayment.objects.filter(
-        expense__group=group, 
-        expense__currency=currency, 
-        user=request.user, 
-        expense__deleted=0,
-        deleted=0
-    ).aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
-    
-    owed = ExpenseSplit.objects.filter(
-        expense__group=group, 
-        expense__currency=currency, 
-        user=request.user, 
-        expense__deleted=0,
-        deleted=0
-    ).aggregate(Sum('amount_owed'))['amount_owed__sum'] or Decimal('0.00')
-    
-    net_self = paid - owed # If negative, I owe money.
-    
-    # But wait, this is MY total balance. I need to know how much I owe specifically to target_user?
-    # The current system calculates "Who Owes Whom" based on minimizing transactions locally in `group_detail`.
-    # It does NOT track bilateral debts persistently.
-    # So "Settle Up" with a specific user is actually "Pay off my debt to the system, and giving it to User X".
-    # In a centralized debt simplification (which we implemented in group_detail), 
-    # if I show up as "Owe User B $50", it means I should pay User B $50.
-    
-    # However, since we don't store bilateral debt, we can't easily verify "I owe B $50" from the DB alone 
-    # without re-running the simplification algorithm.
-    # For now, let's assume the UI button is only shown if the Simplification Alg says I owe B.
-    # But for safety, we should re-run the algo here? Or just trust the request amount?
-    # Trusting request amount is dangerous.
-    # Let's re-run the algo simply to find the matched debt.
-    
-    # --- Re-run Simplification for this currency ---
-    members = group.users.all()
-    net_balances = {}
-    for member in members:
-        p = ExpensePayment.objects.filter(expense__group=group, expense__currency=currency, user=member, expense__deleted=0, deleted=0).aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
-        o = ExpenseSplit.objects.filter(expense__group=group, expense__currency=currency, user=member, expense__deleted=0, deleted=0).aggregate(Sum('amount_owed'))['amount_owed__sum'] or Decimal('0.00')
-        net_balances[member] = p - o
-
-    debtors = []
-    creditors = []
-    for member, balance in net_balances.items():
-        if balance < Decimal('-0.01'): debtors.append({'user': member, 'amount': abs(balance)})
-        elif balance > Decimal('0.01'): creditors.append({'user': member, 'amount': balance})
-    
-    debtors.sort(key=lambda x: x['amount'], reverse=True)
-    creditors.sort(key=lambda x: x['amount'], reverse=True)
-
-    amount_to_pay = Decimal('0.00')
-    
-    # Run matching
-    i = 0; j = 0
-    while i < len(debtors) and j < len(creditors):
-        debtor = debtors[i]
-        creditor = creditors[j]
-        amount = min(debtor['amount'], creditor['amount'])
-        
-        # Check if this match is ME -> Target
-        if debtor['user'] == request.user and creditor['user'] == target_user:
-            amount_to_pay = amount
-            break # Found the match. 
-            # Note: In complex scenarios, I might owe multiple people. 
-            # This simplistic greedy algo is deterministic, so if it showed up in UI, it should show up here.
-        
-        debtor['amount'] -= amount
-        creditor['amount'] -= amount
-        if debtor['amount'] < Decimal('0.01'): i += 1
-        if creditor['amount'] < Decimal('0.01'): j += 1
-    
-    if amount_to_pay < Decimal('0.01'):
-         messages.error(request, f"You do not seem to owe {target_user.username} anything in {currency}.")
-         return redirect('group_detail', group_id=group.id)
+    # How much I owe this user in this currency is the stored debt edge, the
+    # same one group_detail showed. Trusting an amount from the request would
+    # be dangerous.
+    edge = DebtEdge.objects.filter(
+        group=group, currency=currency, debtor=request.user, creditor_id=user_id
+    ).select_related('creditor').first()
+    if edge is None or edge.amount < Decimal('0.01'):
+        target_user = get_object_or_404(User, pk=user_id)
+        if not group.users.filter(pk=target_user.pk).exists():
+            messages.error(request, "Target user is not in this group.")
+        else:
+            messages.error(request, f"You do not seem to owe {target_user.username} anything in {currency}.")
+        return redirect('group_detail', group_id=group.id)
 
-    # 2. Create Settlement Expense
-    expense = GroupExpense.objects.create(
-        group=group,
-        description=f"Settlement to {target_user.username}",
-        amount=amount_to_pay,
-        currency=currency,
-        paid_by=request.user,
-        # We can mark it as a special type if we had one, but Description is fine for now.
-    )
-    
-    # 3. Create Payment (I PAID)
-    # Wait, "Settlement" means I paid money to Target.
-    # So in the system: I Paid X, Target Gets X (or Split is X?)
-    # If I record an expense "Settlement":
-    #   Determined Payer: ME (Amount X) -> Adds +X to my balance
-    #   Split: TARGET (Amount X) -> Subtracts -X from target's balance
-    # Result: My Net Balance (+X), Target Net Balance (-X).
-    # Since I was (-X) and Target was (+X), this neutralizes both! Correct.
-    
-    ExpensePayment.objects.create(expense=expense, user=request.user, amount=amount_to_pay)
-    ExpenseSplit.objects.create(expense=expense, user=target_user, amount_owed=amount_to_pay)
-    
-    # 4. Notify Target
-    Notification.objects.create(
-        user=target_user,
-        message=f"{request.user.username} settled up {currency} {amount_to_pay} with you.",
-        notification_type='SETTLEMENT',
-        related_link=f"/groups/{group.id}/"
-    )
+    target_user = edge.creditor
+    amount_to_pay = edge.amount
+    services.settle_up(group, request.user, target_user, currency, amount_to_pay)
 
     messages.success(request, f"Settled up {currency} {amount_to_pay} with {target_user.username}!")
     return redirect('group_detail', group_id=group.id)
@@ -1,7 +1,6 @@
-from .models import Notification
+from .counters import unread_count
 
 def notification_count(request):
     if request.user.is_authenticated:
-        count = Notification.objects.filter(user=request.user, is_read=False).count()
-        return {'unread_notification_count': count}
+        return {'unread_notification_count': unread_count(request.user)}
     return {'unread_notification_count': 0}
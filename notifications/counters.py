@@ -0,0 +1,90 @@
+"""
+Unread notification counters.
+
+UnreadCounter holds the number of unread notifications per user and is
+cached, so the context processor usually doesn't hit the database at all.
+Single-row saves and deletes are kept in step by notifications/signals.py;
+bulk_create() and queryset .update() skip the signals and must call
+adjust() (or notifications_created()) themselves.
+"""
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Notification, UnreadCounter
+
+
+def cache_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def _forget(user_ids):
+    keys = [cache_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    # A request may have re-cached the old value before we commit
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def adjust(deltas):
+    """
+    Add {user_id: delta} to the counters with one UPDATE per distinct delta.
+    Missing counters are only created for increments, so decrements during a
+    user's cascade delete don't resurrect the row.
+    """
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        by_delta[delta].append(user_id)
+    with transaction.atomic():
+        UnreadCounter.objects.bulk_create(
+            [UnreadCounter(user_id=user_id) for user_id, delta in deltas.items() if delta > 0],
+            ignore_conflicts=True,
+        )
+        for delta, user_ids in by_delta.items():
+            UnreadCounter.objects.filter(user_id__in=user_ids).update(count=F('count') + delta)
+    _forget(deltas)
+
+
+def notifications_created(notifications):
+    """Count freshly bulk-created notifications."""
+    adjust(Counter(n.user_id for n in notifications if not n.is_read))
+
+
+def unread_count(user):
+    key = cache_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = UnreadCounter.objects.filter(user=user).values_list('count', flat=True).first() or 0
+        cache.set(key, count, getattr(settings, 'NOTIFICATION_COUNT_CACHE_TIMEOUT', 300))
+    return count
+
+
+def reconcile(user_ids=None, dry_run=False):
+    """
+    Compare the counters with the notifications table and fix any drift.
+    Returns a list of (user_id, stored, expected) for every mismatch.
+    """
+    unread = Notification.objects.filter(is_read=False)
+    counters = UnreadCounter.objects.all()
+    if user_ids is not None:
+        unread = unread.filter(user__in=user_ids)
+        counters = counters.filter(user__in=user_ids)
+    expected = dict(unread.values('user').annotate(n=Count('id')).values_list('user', 'n'))
+    stored = dict(counters.values_list('user', 'count'))
+
+    drift = sorted(
+        (user_id, stored.get(user_id, 0), expected.get(user_id, 0))
+        for user_id in set(expected) | set(stored)
+        if stored.get(user_id, 0) != expected.get(user_id, 0)
+    )
+    if drift and not dry_run:
+        with transaction.atomic():
+            for user_id, _, want in drift:
+                UnreadCounter.objects.update_or_create(user_id=user_id, defaults={'count': want})
+        _forget([user_id for user_id, _, _ in drift])
+    return drift
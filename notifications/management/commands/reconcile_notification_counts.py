@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from notifications import counters
+
+
+class Command(BaseCommand):
+    help = "Recount unread notifications per user and repair counters that have drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Only reconcile this user id (can be repeated).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report drift without fixing it.")
+
+    def handle(self, *args, **options):
+        drift = counters.reconcile(options['user_ids'], dry_run=options['dry_run'])
+
+        for user_id, stored, expected in drift:
+            self.stdout.write(f"user={user_id}: stored {stored}, expected {expected}")
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("No drift found."))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} counter(s) drifted."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} drifted counter(s)."))
@@ -23,3 +23,17 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # notification_list: cursor pagination over a user's notifications
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_created_idx'),
+        ]
+
+class UnreadCounter(models.Model):
+    # Denormalised number of unread notifications per user, so the navbar
+    # badge doesn't need a COUNT(*) on every page. Maintained by
+    # notifications/counters.py, repair with `manage.py reconcile_notification_counts`.
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='unread_counter')
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.count} unread"
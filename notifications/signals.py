@@ -0,0 +1,32 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Notification
+from . import counters
+
+# Keep UnreadCounter in step with single-row writes. bulk_create() and
+# queryset .update() skip these handlers and must go through counters.adjust().
+
+
+@receiver(pre_save, sender=Notification)
+def remember_previous_read_state(sender, instance, raw=False, **kwargs):
+    instance._was_unread = None
+    if instance.pk and not raw:
+        is_read = sender.objects.filter(pk=instance.pk).values_list('is_read', flat=True).first()
+        instance._was_unread = is_read is False
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_count(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    was_unread = not created and getattr(instance, '_was_unread', False)
+    now_unread = not instance.is_read
+    if was_unread != now_unread:
+        counters.adjust({instance.user_id: 1 if now_unread else -1})
+
+
+@receiver(post_delete, sender=Notification)
+def remove_unread_count(sender, instance, **kwargs):
+    if not instance.is_read:
+        counters.adjust({instance.user_id: -1})
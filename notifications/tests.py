@@ -1,10 +1,18 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, RequestFactory
 from django.contrib.auth.models import User
-from notifications.models import Notification
-from groups.models import groups
+from django.core.cache import cache
+from django.core.management import call_command
+from io import StringIO
+from decimal import Decimal
+from notifications.models import Notification, UnreadCounter
+from notifications.context_processors import notification_count
+from notifications import counters
+from groups.models import groups, GroupExpense
+from groups import services
 
 class NotificationTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.user1 = User.objects.create_user(username='user1', password='password')
         self.user2 = User.objects.create_user(username='user2', password='password')
         self.client = Client()
@@ -27,6 +35,15 @@ class NotificationTests(TestCase):
         # Verify Mark as Read button link is present
         self.assertContains(response, f'/notifications/mark-read/{n.id}/')
 
+    def test_notification_list_is_paginated(self):
+        Notification.objects.bulk_create([Notification(user=self.user1, message=f"Msg {i}") for i in range(45)])
+        response = self.client.get('/notifications/')
+        page = response.context['notifications']
+        self.assertEqual(len(page), 20)
+        self.assertTrue(page.has_next)
+        response = self.client.get('/notifications/', {'after': page.next_cursor})
+        self.assertEqual(len(response.context['notifications']), 20)
+
     def test_mark_as_read(self):
         notification = Notification.objects.create(user=self.user1, message="To Read")
         response = self.client.get(f'/notifications/mark-read/{notification.id}/')
@@ -61,3 +78,76 @@ class NotificationTests(TestCase):
         response = self.client.get('/expenses/') # Any page that renders layout
         self.assertIn('unread_notification_count', response.context)
         self.assertEqual(response.context['unread_notification_count'], 1)
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(username='user1', password='password')
+        self.user2 = User.objects.create_user(username='user2', password='password')
+        self.client = Client()
+        self.client.login(username='user1', password='password')
+
+    def stored(self, user):
+        return UnreadCounter.objects.filter(user=user).values_list('count', flat=True).first() or 0
+
+    def test_counter_follows_single_row_writes(self):
+        first = Notification.objects.create(user=self.user1, message="One")
+        Notification.objects.create(user=self.user1, message="Two")
+        Notification.objects.create(user=self.user1, message="Already read", is_read=True)
+        self.assertEqual(self.stored(self.user1), 2)
+
+        first.is_read = True
+        first.save()
+        first.save() # Saving an already read notification changes nothing
+        self.assertEqual(self.stored(self.user1), 1)
+
+        Notification.objects.filter(user=self.user1, is_read=False).get().delete()
+        self.assertEqual(self.stored(self.user1), 0)
+
+    def test_mark_views_update_counter(self):
+        for i in range(3):
+            Notification.objects.create(user=self.user1, message=f"Msg {i}")
+        notification = Notification.objects.filter(user=self.user1).first()
+        self.client.get(f'/notifications/mark-read/{notification.id}/')
+        self.assertEqual(self.stored(self.user1), 2)
+        self.client.get('/notifications/mark-all-read/')
+        self.assertEqual(self.stored(self.user1), 0)
+
+    def test_bulk_fan_out_updates_counters(self):
+        group = groups.objects.create(name="Trip")
+        members = [self.user1, self.user2]
+        group.users.add(*members)
+        expense = GroupExpense(group=group, description="Dinner", amount=Decimal('20.00'), paid_by=self.user1)
+        services.create_group_expense(expense, {self.user1.id: Decimal('20.00')},
+                                      services.equal_splits(Decimal('20.00'), members), self.user1, members)
+        self.assertEqual(self.stored(self.user2), 1)
+        self.assertEqual(self.stored(self.user1), 0)
+
+    def test_context_processor_uses_cache(self):
+        Notification.objects.create(user=self.user1, message="Cached")
+        request = RequestFactory().get('/')
+        request.user = self.user1
+        with self.assertNumQueries(1):
+            self.assertEqual(notification_count(request)['unread_notification_count'], 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(notification_count(request)['unread_notification_count'], 1)
+        # Changes invalidate the cached value
+        Notification.objects.create(user=self.user1, message="Another")
+        self.assertEqual(notification_count(request)['unread_notification_count'], 2)
+
+    def test_reconcile_command_repairs_drift(self):
+        Notification.objects.create(user=self.user1, message="One")
+        Notification.objects.create(user=self.user2, message="Two")
+        UnreadCounter.objects.filter(user=self.user1).update(count=7)
+        UnreadCounter.objects.filter(user=self.user2).delete()
+
+        out = StringIO()
+        call_command('reconcile_notification_counts', '--dry-run', stdout=out)
+        self.assertIn(f"user={self.user1.id}: stored 7, expected 1", out.getvalue())
+        self.assertEqual(self.stored(self.user1), 7)
+
+        call_command('reconcile_notification_counts', stdout=StringIO())
+        self.assertEqual(self.stored(self.user1), 1)
+        self.assertEqual(self.stored(self.user2), 1)
+        self.assertEqual(counters.reconcile(), [])
@@ -1,12 +1,15 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
+from django.db import transaction
 from .models import Notification
+from . import counters
+from project.pagination import paginate_request
 
 @login_required
 def notification_list(request):
-    # Fetch all notifications for the user
-    notifications = Notification.objects.filter(user=request.user)
+    # One page of the user's notifications, newest first
+    notifications = paginate_request(request, Notification.objects.filter(user=request.user).select_related('invitation'), per_page=20)
     
     # Mark all unread notifications as read when visiting the dashboard
     # Alternatively, we can let user manually mark them. 
@@ -28,5 +31,7 @@ def mark_as_read(request, notification_id):
 
 @login_required
 def mark_all_as_read(request):
-    Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    with transaction.atomic():
+        marked = Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        counters.adjust({request.user.id: -marked})
     return redirect('notifications')
@@ -0,0 +1,171 @@
+"""
+Per-view request metrics.
+
+RequestMetricsMiddleware (opt-in, add it to MIDDLEWARE) times every request
+and counts its SQL queries, their total time and the duplicates among them
+(same statement with the same parameters), keyed by the resolved URL name.
+Each (metric, view) pair is a fixed-bucket histogram - a handful of integers
+- kept in process memory, so every server process reports its own numbers.
+metrics_view serves them in the Prometheus text format.
+
+Requests over the METRICS_BUDGETS limits (METRICS_VIEW_BUDGETS overrides
+them per view) are logged to the 'project.metrics' logger.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger('project.metrics')
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+DUPLICATES = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# name: (help, buckets, budget key, scale from the observed value to the budget's unit)
+METRICS = {
+    'request_latency_seconds': ("Request latency in seconds.", SECONDS, 'latency_ms', 1000),
+    'request_sql_queries': ("SQL queries per request.", QUERIES, 'queries', 1),
+    'request_sql_seconds': ("Time spent in SQL per request, in seconds.", SECONDS, 'sql_ms', 1000),
+    'request_sql_duplicates': ("Repeated identical SQL queries per request.", DUPLICATES, 'duplicates', 1),
+}
+DEFAULT_BUDGETS = {'latency_ms': 500, 'queries': 50, 'sql_ms': 250, 'duplicates': 5}
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last one is +Inf
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+_histograms = {}  # (metric, view) -> Histogram
+_lock = threading.Lock()
+
+
+def observe(view, values):
+    """Record {metric: value} for one request to view."""
+    with _lock:
+        for metric, value in values.items():
+            histogram = _histograms.get((metric, view))
+            if histogram is None:
+                histogram = _histograms[(metric, view)] = Histogram(METRICS[metric][1])
+            histogram.observe(value)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render():
+    """All histograms in the Prometheus text exposition format."""
+    with _lock:
+        snapshot = {key: (list(h.counts), h.sum) for key, h in _histograms.items()}
+    lines = []
+    for metric, (help_text, buckets, _, _) in METRICS.items():
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (name, view), (counts, total) in sorted(snapshot.items()):
+            if name != metric:
+                continue
+            view = _label(view)
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{view="{view}"}} {total}')
+            lines.append(f'{metric}_count{{view="{view}"}} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def budgets(view):
+    limits = dict(DEFAULT_BUDGETS)
+    limits.update(getattr(settings, 'METRICS_BUDGETS', {}))
+    limits.update(getattr(settings, 'METRICS_VIEW_BUDGETS', {}).get(view, {}))
+    return limits
+
+
+class QueryRecorder:
+    """execute_wrapper counting queries, their time and exact repeats."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.duplicates = 0
+        self._seen = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+            key = hash((sql, repr(params)))
+            if key in self._seen:
+                self.duplicates += 1
+            else:
+                self._seen.add(key)
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        latency = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unresolved'
+        values = {
+            'request_latency_seconds': latency,
+            'request_sql_queries': recorder.queries,
+            'request_sql_seconds': recorder.seconds,
+            'request_sql_duplicates': recorder.duplicates,
+        }
+        observe(view, values)
+
+        limits = budgets(view)
+        over = [
+            key for metric, (_, _, key, scale) in METRICS.items()
+            if key in limits and values[metric] * scale > limits[key]
+        ]
+        if over:
+            logger.warning(
+                "Request over budget (%s): view=%s path=%s latency=%.0fms queries=%d sql=%.0fms duplicates=%d",
+                ', '.join(over), view, request.path, latency * 1000, recorder.queries,
+                recorder.seconds * 1000, recorder.duplicates,
+            )
+        return response
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint: staff, or a bearer token matching METRICS_TOKEN."""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    authorized = token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
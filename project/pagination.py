@@ -0,0 +1,93 @@
+"""
+Keyset (cursor) pagination on (created_at, id), newest first.
+
+Unlike Paginator there is no COUNT and no OFFSET: a page is "the next
+per_page rows after this (created_at, id)", which an index on
+(..., created_at, id) answers equally fast on page 1 and page 500.
+Cursors are opaque URL-safe tokens passed back as ?after= / ?before=.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+
+def encode_cursor(obj):
+    raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """(created_at, pk) from a cursor, or None if it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+class CursorPage:
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def paginate(queryset, after=None, before=None, per_page=10):
+    """
+    One page of queryset, newest first. after/before are cursors from a
+    previous page; with neither, the first page is returned.
+    """
+    after = decode_cursor(after)
+    before = decode_cursor(before) if after is None else None
+
+    if before is not None:
+        created_at, pk = before
+        # Walk backwards from the cursor, then flip the rows back into display order
+        rows = list(
+            queryset.filter(created_at__gte=created_at)
+            .exclude(created_at=created_at, pk__lte=pk)
+            .order_by('created_at', 'pk')[:per_page + 1]
+        )
+        more = len(rows) > per_page
+        items = rows[:per_page][::-1]
+        return CursorPage(
+            items,
+            next_cursor=encode_cursor(items[-1]) if items else None,
+            previous_cursor=encode_cursor(items[0]) if more else None,
+        )
+
+    if after is not None:
+        created_at, pk = after
+        # created_at <= cursor keeps this a range scan on the index
+        queryset = queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, pk__gte=pk)
+    rows = list(queryset.order_by('-created_at', '-pk')[:per_page + 1])
+    items = rows[:per_page]
+    return CursorPage(
+        items,
+        next_cursor=encode_cursor(items[-1]) if len(rows) > per_page else None,
+        previous_cursor=encode_cursor(items[0]) if after is not None and items else None,
+    )
+
+
+def paginate_request(request, queryset, per_page=10):
+    return paginate(queryset, request.GET.get('after'), request.GET.get('before'), per_page)
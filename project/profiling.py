@@ -0,0 +1,154 @@
+"""
+On-demand profiling of single requests.
+
+ProfilerMiddleware runs a request under cProfile when it asks for it:
+either ?profile=1 from a staff user, or an X-Profile header holding a
+token from issue_token(username, issued_by) sent by that user - so a slow
+page can be profiled as the person who sees it slow, e.g.
+
+    python manage.py shell -c "from project.profiling import issue_token; print(issue_token('alice', 'admin'))"
+
+Profiling is a staff tool either way: issued_by has to be an active staff
+user, and the token stops working as soon as they no longer are.
+
+Each profiled request leaves two files in PROFILING_DIR: the raw cProfile
+dump (<name>.prof, for pstats/snakeviz) and collapsed stacks (<name>.folded,
+for flamegraph.pl or speedscope). The X-Profile-Dump response header names
+them relative to PROFILING_DIR, so no server paths reach the client. Unless
+PROFILING_ENABLED (defaults to DEBUG) is set the middleware removes itself
+at startup, and without a flag a request pays for one dict lookup per
+marker.
+"""
+import cProfile
+import os
+import pstats
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+SALT = 'project.profiling'
+TOKEN_MAX_AGE = 24 * 3600
+HEADER = 'X-Profile'
+MAX_DEPTH = 200
+MIN_SHARE = 1e-4
+
+
+def _is_staff(username):
+    User = get_user_model()
+    return User._default_manager.filter(
+        **{User.USERNAME_FIELD: username}, is_staff=True, is_active=True
+    ).exists()
+
+
+def issue_token(username, issued_by):
+    """
+    Token for the X-Profile header, valid for TOKEN_MAX_AGE seconds for that
+    user only and only while issued_by is still an active staff user.
+    """
+    if not _is_staff(issued_by):
+        raise ValueError(f"{issued_by!r} is not an active staff user.")
+    return signing.dumps([username, issued_by], salt=SALT)
+
+
+def _token_users(token):
+    """(username, issued_by) from a valid token, else None."""
+    try:
+        users = signing.loads(token, salt=SALT, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    if not isinstance(users, list) or len(users) != 2:
+        return None  # Tokens from before issued_by was recorded
+    return tuple(users)
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name  # Built-ins such as <method 'execute' ...>
+    return f"{os.path.basename(filename)}:{line}:{name}"
+
+
+def collapsed_stacks(stats):
+    """
+    {'root;caller;callee': microseconds} from cProfile stats. cProfile only
+    knows caller/callee pairs, so a callee's time is split among its callers
+    in proportion to what each of them spent in it. Paths under MIN_SHARE of
+    the total time are dropped; the call graph can have a huge number of them.
+    """
+    callees = defaultdict(dict)
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees[caller][func] = cumulative
+    roots = [(func, stat[3]) for func, stat in stats.items() if not stat[4]]
+    cutoff = sum(cumulative for _, cumulative in roots) * MIN_SHARE
+    labels = {func: _label(func) for func in stats}
+    folded = defaultdict(float)
+
+    def walk(func, stack, path, spent):
+        _, _, inline, cumulative, _ = stats[func]
+        if not cumulative or spent <= cutoff:
+            return
+        # Recursive functions report more cumulative time than their callers
+        # spent in them; never hand down more than this frame has
+        scale = min(spent / cumulative, 1)
+        folded[path] += inline * scale * 1e6
+        if len(stack) >= MAX_DEPTH:
+            return
+        children = [(callee, t * scale) for callee, t in callees[func].items() if callee not in stack]
+        available = max(spent - inline * scale, 0)
+        handed = sum(t for _, t in children)
+        if handed > available:
+            children = [(callee, t * available / handed) for callee, t in children]
+        for callee, t in children:
+            walk(callee, stack | {callee}, f"{path};{labels[callee]}", t)
+
+    for func, cumulative in roots:
+        walk(func, {func}, labels[func], cumulative)
+    return {path: round(micros) for path, micros in folded.items() if round(micros) > 0}
+
+
+class ProfilerMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if 'profile' not in request.GET and HEADER not in request.headers:
+            return self.get_response(request)
+        if not self._allowed(request):
+            return self.get_response(request)
+
+        profile = cProfile.Profile()
+        response = profile.runcall(self.get_response, request)
+        response[f'{HEADER}-Dump'] = self._dump(request, profile)
+        return response
+
+    def _allowed(self, request):
+        user = request.user
+        if not user.is_authenticated:
+            return False
+        if HEADER in request.headers:
+            users = _token_users(request.headers[HEADER])
+            return users is not None and users[0] == user.get_username() and _is_staff(users[1])
+        return user.is_staff and request.GET.get('profile') in ('1', 'true', 'yes')
+
+    def _dump(self, request, profile):
+        directory = getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+        os.makedirs(directory, exist_ok=True)
+        match = request.resolver_match
+        view = (match.url_name or 'view') if match else 'unresolved'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{view}-{request.user.pk}-{uuid.uuid4().hex[:8]}"
+        base = os.path.join(directory, name)
+
+        profile.dump_stats(base + '.prof')
+        stacks = collapsed_stacks(pstats.Stats(profile).stats)
+        with open(base + '.folded', 'w') as handle:
+            for stack, micros in sorted(stacks.items()):
+                handle.write(f"{stack} {micros}\n")
+        return f"{name}.prof; {name}.folded"
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'expenses',
     'groups',
     'notifications',
+    'archive',
 ]
 
 MIDDLEWARE = [
@@ -51,6 +52,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Opt-in per-view latency/SQL histograms served at /metrics/ (see project/metrics.py):
+    # 'project.metrics.RequestMetricsMiddleware',
+    # Opt-in slow-query log with EXPLAIN plans, shown at /slow-queries/ (see project/slowlog.py):
+    # 'project.slowlog.SlowQueryMiddleware',
+    # Profiles requests that ask for it; inactive unless PROFILING_ENABLED
+    'project.profiling.ProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'project.urls'
@@ -141,6 +148,61 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# MySQL has no partial indexes; the live-row indexes are skipped there and the
+# composite (..., deleted, ...) indexes do the job instead.
+SILENCED_SYSTEM_CHECKS = ['models.W037']
+
+# Debt simplification for "who owes whom" in groups: 'greedy' or 'optimal'.
+# 'optimal' minimises the number of transfers and falls back to a heuristic
+# when more members than GROUP_DEBT_OPTIMAL_MAX_MEMBERS have a balance.
+GROUP_DEBT_SIMPLIFIER = 'optimal'
+GROUP_DEBT_OPTIMAL_MAX_MEMBERS = 12
+
+# Seconds the navbar's unread notification count stays in the cache. Writes
+# invalidate it, so this only bounds how long a drifted counter is served.
+NOTIFICATION_COUNT_CACHE_TIMEOUT = 300
+
+# Spending charts API: most points per series before neighbouring buckets are
+# merged, and how long a result is cached (it is invalidated on any change).
+SPENDING_SERIES_MAX_POINTS = 120
+# Most buckets a requested date range may span before it is refused
+SPENDING_SERIES_MAX_PERIODS = 10000
+SPENDING_SERIES_CACHE_TIMEOUT = 3600
+
+# Rows per bulk INSERT when importing expenses from CSV
+EXPENSE_IMPORT_BATCH_SIZE = 2000
+
+# Expenses per bulk INSERT when importing a group ledger (each also brings its
+# payments and splits)
+GROUP_IMPORT_BATCH_SIZE = 500
+
+# How long a user's home dashboard is cached (it is invalidated whenever one
+# of their groups' ledgers changes)
+DASHBOARD_CACHE_TIMEOUT = 3600
+
+# How long group_detail's balance section is cached (under the group's ledger
+# version, so a write never leaves it stale)
+GROUP_BALANCES_CACHE_TIMEOUT = 3600
+
+# Request metrics (project.metrics.RequestMetricsMiddleware): requests over any
+# of these budgets are logged to 'project.metrics'; METRICS_VIEW_BUDGETS
+# overrides them per URL name, e.g. {'spending': {'latency_ms': 1000}}.
+# Besides staff, /metrics/ accepts "Authorization: Bearer <METRICS_TOKEN>".
+METRICS_BUDGETS = {'latency_ms': 500, 'queries': 50, 'sql_ms': 250, 'duplicates': 5}
+METRICS_VIEW_BUDGETS = {}
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Per-request profiling (project.profiling.ProfilerMiddleware): ?profile=1 from
+# staff, or an X-Profile token, writes .prof and .folded dumps here.
+PROFILING_ENABLED = DEBUG
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+
+# Slow-query log (project.slowlog.SlowQueryMiddleware): statements taking at
+# least SLOW_QUERY_MS are logged to 'project.slowlog'; the SLOW_QUERY_TOP_N
+# worst fingerprints are kept for /slow-queries/. None turns logging off.
+SLOW_QUERY_MS = 100
+SLOW_QUERY_TOP_N = 50
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
@@ -0,0 +1,168 @@
+"""
+Slow-query log.
+
+SlowQueryMiddleware (opt-in, add it to MIDDLEWARE) wraps every statement a
+request runs and logs those slower than SLOW_QUERY_MS to the
+'project.slowlog' logger, with the statement's fingerprint (the SQL with
+literals and IN lists collapsed, so the same query with other values maps
+to the same entry), the view and the innermost frame of our own code that
+ran it. The first time a fingerprint is seen its SELECT is EXPLAINed
+(EXPLAIN on MySQL, EXPLAIN QUERY PLAN on SQLite) and the plan is kept.
+
+The SLOW_QUERY_TOP_N fingerprints with the most slow time are kept in
+process memory; staff can see them at /slow-queries/.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import DatabaseError, connections
+from django.shortcuts import render
+
+logger = logging.getLogger('project.slowlog')
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_in_lists = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)", re.IGNORECASE)
+_spaces = re.compile(r'\s+')
+_state = threading.local()  # .view, and .explaining while an EXPLAIN runs
+
+
+def normalize(sql):
+    sql = _literals.sub('?', sql)
+    sql = _in_lists.sub('IN (...)', sql)
+    return _spaces.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+class Entry:
+    __slots__ = ('fingerprint', 'sql', 'count', 'total_ms', 'max_ms', 'view', 'frame', 'explain', 'vendor')
+
+    def __init__(self, fingerprint, sql, vendor):
+        self.fingerprint = fingerprint
+        self.sql = sql
+        self.vendor = vendor
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.view = ''
+        self.frame = ''
+        self.explain = None
+
+
+_entries = {}  # fingerprint -> Entry
+_lock = threading.Lock()
+
+
+def top(n=None):
+    """The slow-query entries, most slow time first."""
+    with _lock:
+        entries = sorted(_entries.values(), key=lambda entry: entry.total_ms, reverse=True)
+    return entries[:n] if n else entries
+
+
+def reset():
+    with _lock:
+        _entries.clear()
+
+
+# Our own middleware wraps every request; the frame that matters is further in
+_SKIPPED_FILES = {os.path.join(os.path.dirname(__file__), name) for name in ('metrics.py', 'profiling.py', 'slowlog.py')}
+
+
+def _caller():
+    """Innermost frame of our code (not Django, not the request middleware) on the stack."""
+    root = str(settings.BASE_DIR)
+    for frame in traceback.StackSummary.extract(traceback.walk_stack(None), lookup_lines=False):
+        filename = frame.filename
+        if filename.startswith(root) and 'site-packages' not in filename and filename not in _SKIPPED_FILES:
+            return f"{os.path.relpath(filename, root)}:{frame.lineno} in {frame.name}"
+    return ''
+
+
+def _explain(connection, sql, params):
+    if sql.lstrip()[:6].upper() != 'SELECT' or connection.needs_rollback:
+        return None
+    _state.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+            return '\n'.join('\t'.join(str(value) for value in row) for row in cursor.fetchall())
+    except DatabaseError as error:
+        return f"EXPLAIN failed: {error}"
+    finally:
+        _state.explaining = False
+
+
+def record(connection, sql, params, elapsed_ms):
+    key = fingerprint(sql)
+    view = getattr(_state, 'view', '')
+    frame = _caller()
+    with _lock:
+        entry = _entries.get(key)
+        new = entry is None
+        if new:
+            if len(_entries) >= getattr(settings, 'SLOW_QUERY_TOP_N', 50):
+                del _entries[min(_entries.values(), key=lambda e: e.total_ms).fingerprint]
+            entry = _entries[key] = Entry(key, sql, connection.vendor)
+        entry.count += 1
+        entry.total_ms += elapsed_ms
+        entry.max_ms = max(entry.max_ms, elapsed_ms)
+        entry.view, entry.frame = view, frame
+    if new:
+        # Outside the lock; a racing request may explain the same statement once more
+        entry.explain = _explain(connection, sql, params)
+    logger.warning("Slow query %.0fms [%s] view=%s at %s: %s", elapsed_ms, key, view or '-', frame or '-',
+                   _spaces.sub(' ', sql)[:1000])
+
+
+def slow_query_wrapper(connection):
+    def wrapper(execute, sql, params, many, context):
+        if getattr(_state, 'explaining', False):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            threshold = getattr(settings, 'SLOW_QUERY_MS', None)
+            if threshold is not None and elapsed_ms >= threshold:
+                record(connection, sql, None if many else params, elapsed_ms)
+
+    return wrapper
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.view = request.path
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(slow_query_wrapper(connection)))
+                return self.get_response(request)
+        finally:
+            _state.view = ''
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        _state.view = (match.url_name or match.view_name) if match else request.path
+
+
+@staff_member_required
+def slow_queries_view(request):
+    return render(request, 'slow_queries.html', {
+        'entries': top(),
+        'threshold': getattr(settings, 'SLOW_QUERY_MS', None),
+    })
@@ -0,0 +1,57 @@
+"""
+Soft deletion shared by the expense and group ledger models.
+
+Rows are never removed by the views, they get deleted=True instead. Models
+using SoftDeleteModel hide those rows from `objects`, so queries don't have
+to repeat deleted=0 everywhere; `all_objects` still sees everything (audit
+pages, archiving, ledger bookkeeping). Reverse relations such as
+expense.splits use `objects` too, while forward foreign keys and cascades
+use Django's plain base manager and still reach deleted rows.
+
+deleted_at records when a row was deleted; archiving counts retention from
+it. save() stamps it when deleted flips to True and clears it on restore,
+soft_delete() does the same for a queryset. Rows bulk-created already
+deleted have to pass it themselves.
+"""
+from django.db import models
+from django.utils import timezone
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    def live(self):
+        return self.filter(deleted=False)
+
+    def removed(self):
+        return self.filter(deleted=True)
+
+    def soft_delete(self):
+        return self.update(deleted=True, deleted_at=timezone.now())
+
+
+class LiveManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted=False)
+
+
+AllObjectsManager = models.Manager.from_queryset(SoftDeleteQuerySet)
+
+
+class SoftDeleteModel(models.Model):
+    deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager()
+    all_objects = AllObjectsManager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self.deleted and self.deleted_at is None:
+            self.deleted_at = timezone.now()
+        elif not self.deleted:
+            self.deleted_at = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'deleted' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'deleted_at'}
+        super().save(*args, **kwargs)
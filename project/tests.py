@@ -0,0 +1,168 @@
+import os
+import pstats
+import shutil
+import tempfile
+from django.test import TestCase, Client, override_settings
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db import connection
+from django.urls import reverse
+from decimal import Decimal
+from expenses.models import Expenses
+from . import metrics, profiling, slowlog
+
+METRICS_MIDDLEWARE = settings.MIDDLEWARE + ['project.metrics.RequestMetricsMiddleware']
+
+
+@override_settings(MIDDLEWARE=METRICS_MIDDLEWARE)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.user = User.objects.create_user(username='user1', password='password')
+        self.staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+        Expenses.objects.create(user=self.user, item='Coffee', price=Decimal('3.00'))
+        self.client = Client()
+        self.client.login(username='user1', password='password')
+
+    def test_records_histograms_per_url_name(self):
+        self.client.get(reverse('expenses'))
+        self.client.get(reverse('expenses'))
+        text = metrics.render()
+        self.assertIn('request_latency_seconds_count{view="expenses"} 2', text)
+        self.assertIn('# TYPE request_sql_queries histogram', text)
+        self.assertIn('request_sql_queries_bucket{view="expenses",le="+Inf"} 2', text)
+        self.assertIn('request_sql_duplicates_count{view="expenses"} 2', text)
+
+    def test_counts_duplicate_queries(self):
+        recorder = metrics.QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for _ in range(3):
+                list(Expenses.objects.filter(pk=1))
+            list(Expenses.objects.filter(pk=2))
+        self.assertEqual((recorder.queries, recorder.duplicates), (4, 2))
+
+    def test_logs_requests_over_budget(self):
+        with self.settings(METRICS_VIEW_BUDGETS={'expenses': {'queries': 0}}):
+            with self.assertLogs('project.metrics', 'WARNING') as logs:
+                self.client.get(reverse('expenses'))
+        self.assertIn('Request over budget (queries): view=expenses', logs.output[0])
+
+    def test_endpoint_is_staff_or_token_only(self):
+        self.client.get(reverse('expenses'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with self.settings(METRICS_TOKEN='secret'):
+            response = Client().get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.client.login(username='staff', password='password')
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('request_latency_seconds_count{view="expenses"}', response.content.decode())
+
+
+@override_settings(PROFILING_ENABLED=True)
+class ProfilerTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.user = User.objects.create_user(username='user1', password='password')
+        self.staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+        self.client = Client()
+
+    def get(self, username, *args, **kwargs):
+        self.client.login(username=username, password='password')
+        with self.settings(PROFILING_DIR=self.directory):
+            return self.client.get(*args, **kwargs)
+
+    def test_no_flag_no_profile(self):
+        response = self.get('staff', reverse('expenses'))
+        self.assertNotIn('X-Profile-Dump', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_staff_query_flag_writes_dumps(self):
+        response = self.get('staff', reverse('expenses'), {'profile': '1'})
+        prof, folded = response['X-Profile-Dump'].split('; ')
+        self.assertIn('-expenses-', prof)
+        # File names only, no server paths
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted([prof, folded]))
+        prof, folded = os.path.join(self.directory, prof), os.path.join(self.directory, folded)
+        pstats.Stats(prof)  # Loads
+        with open(folded) as handle:
+            lines = handle.read().splitlines()
+        self.assertTrue(any('views.py' in line and 'expense_list' in line for line in lines))
+        stack, micros = lines[0].rsplit(' ', 1)
+        self.assertGreater(int(micros), 0)
+
+    def test_query_flag_needs_staff(self):
+        response = self.get('user1', reverse('expenses'), {'profile': '1'})
+        self.assertNotIn('X-Profile-Dump', response)
+
+    def test_signed_header_for_that_user(self):
+        token = profiling.issue_token('user1', 'staff')
+        self.assertIn('X-Profile-Dump', self.get('user1', reverse('expenses'), HTTP_X_PROFILE=token))
+        self.assertNotIn('X-Profile-Dump', self.get('staff', reverse('expenses'), HTTP_X_PROFILE=token))
+        self.assertNotIn('X-Profile-Dump', self.get('user1', reverse('expenses'), HTTP_X_PROFILE=token + 'x'))
+
+    def test_header_needs_a_staff_issuer(self):
+        with self.assertRaises(ValueError):
+            profiling.issue_token('user1', 'user1')
+        # Signed by hand, or by an issuer who has since lost staff status
+        forged = signing.dumps(['user1', 'user1'], salt=profiling.SALT)
+        self.assertNotIn('X-Profile-Dump', self.get('user1', reverse('expenses'), HTTP_X_PROFILE=forged))
+        token = profiling.issue_token('user1', 'staff')
+        User.objects.filter(username='staff').update(is_staff=False)
+        self.assertNotIn('X-Profile-Dump', self.get('user1', reverse('expenses'), HTTP_X_PROFILE=token))
+        legacy = signing.dumps('user1', salt=profiling.SALT)
+        self.assertNotIn('X-Profile-Dump', self.get('user1', reverse('expenses'), HTTP_X_PROFILE=legacy))
+
+
+@override_settings(MIDDLEWARE=settings.MIDDLEWARE + ['project.slowlog.SlowQueryMiddleware'], SLOW_QUERY_MS=0)
+class SlowQueryLogTests(TestCase):
+    def setUp(self):
+        slowlog.reset()
+        self.user = User.objects.create_user(username='user1', password='password')
+        self.staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+        Expenses.objects.create(user=self.user, item='Coffee', price=Decimal('3.00'))
+        self.client = Client()
+        self.client.login(username='user1', password='password')
+
+    def test_fingerprint_ignores_values(self):
+        self.assertEqual(slowlog.fingerprint("SELECT * FROM t WHERE id IN (%s, %s) AND name = 'a'"),
+                         slowlog.fingerprint("SELECT *  FROM t WHERE id IN (%s) AND name = 'b'"))
+        self.assertNotEqual(slowlog.fingerprint("SELECT a FROM t"), slowlog.fingerprint("SELECT b FROM t"))
+
+    def test_logs_slow_queries_with_view_frame_and_plan(self):
+        with self.assertLogs('project.slowlog', 'WARNING') as logs:
+            self.client.get(reverse('expenses'))
+        self.assertIn('view=expenses', '\n'.join(logs.output))
+
+        entries = [e for e in slowlog.top() if 'expenses_expenses' in e.sql and e.sql.startswith('SELECT')]
+        self.assertTrue(entries)
+        entry = entries[0]
+        self.assertEqual(entry.view, 'expenses')
+        self.assertRegex(entry.frame, r'\.py:\d+ in \w+$')
+        self.assertTrue(any(e.frame.startswith(os.path.join('expenses', 'views.py')) for e in entries))
+        self.assertIn('expenses_expenses', entry.explain)  # SQLite: EXPLAIN QUERY PLAN names the table
+
+        # A second request adds to the same entries instead of new ones
+        count = len(slowlog.top())
+        with self.assertLogs('project.slowlog', 'WARNING'):
+            self.client.get(reverse('expenses'))
+        self.assertEqual(len(slowlog.top()), count)
+        self.assertEqual(entry.count, 2)
+
+    def test_keeps_top_n(self):
+        with self.settings(SLOW_QUERY_TOP_N=3), self.assertLogs('project.slowlog', 'WARNING'):
+            self.client.get(reverse('expenses'))
+        self.assertEqual(len(slowlog.top()), 3)
+
+    def test_staff_page(self):
+        with self.assertLogs('project.slowlog', 'WARNING'):
+            self.client.get(reverse('expenses'))
+        with self.assertLogs('project.slowlog', 'WARNING'):
+            self.assertEqual(self.client.get(reverse('slow_queries')).status_code, 302)
+        self.client.login(username='staff', password='password')
+        with self.assertLogs('project.slowlog', 'WARNING'):
+            response = self.client.get(reverse('slow_queries'))
+        self.assertContains(response, 'expenses_expenses')
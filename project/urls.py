@@ -16,11 +16,10 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from . import views
+from . import metrics, slowlog, views
 from django.conf import settings
 from django.conf.urls.static import static 
-
-from django.views.generic import RedirectView
+from groups import views as group_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -29,6 +28,8 @@ urlpatterns = [
     path('register/', views.user_registration, name='register'),
     path('groups/', include('groups.urls')),
     path('notifications/', include('notifications.urls')),
-    path('', RedirectView.as_view(url='/expenses/', permanent=False)),
+    path('metrics/', metrics.metrics_view, name='metrics'),
+    path('slow-queries/', slowlog.slow_queries_view, name='slow_queries'),
+    path('', group_views.dashboard, name='dashboard'),
 
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)